@@ -0,0 +1,265 @@
+/**
+ * @file FrameAnalysis.hpp Per-channel analysis kernels working directly on packed WIB2/WIBEth frames
+ *
+ * This is part of the DUNE DAQ , copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+#ifndef RAWDATAUTILS_INCLUDE_FRAMEANALYSIS_HPP_
+#define RAWDATAUTILS_INCLUDE_FRAMEANALYSIS_HPP_
+
+#include "fddetdataformats/WIB2Frame.hpp"
+#include "fddetdataformats/WIBEthFrame.hpp"
+
+#include <algorithm>
+#include <cmath>
+#include <complex>
+#include <cstdint>
+#include <limits>
+#include <stdexcept>
+#include <vector>
+
+namespace dunedaq {
+namespace rawdatautils {
+
+/**
+ * @brief Channel/sample layout of a frame type, so that the kernels below read the ADCs
+ * straight from the frames. Specialize it to support another format.
+ */
+template<typename Frame>
+struct FrameLayout;
+
+template<>
+struct FrameLayout<fddetdataformats::WIB2Frame>
+{
+  static constexpr size_t s_num_channels = 256;
+  static constexpr size_t s_samples_per_frame = 1;
+  static constexpr uint64_t s_sampling_period = 32;
+  static uint16_t get_adc(const fddetdataformats::WIB2Frame& fr, size_t ch, size_t) { return fr.get_adc(ch); }
+};
+
+template<>
+struct FrameLayout<fddetdataformats::WIBEthFrame>
+{
+  static constexpr size_t s_num_channels = fddetdataformats::WIBEthFrame::s_num_channels;
+  static constexpr size_t s_samples_per_frame = fddetdataformats::WIBEthFrame::s_time_samples_per_frame;
+  static constexpr uint64_t s_sampling_period = 32;
+  static uint16_t get_adc(const fddetdataformats::WIBEthFrame& fr, size_t ch, size_t s) { return fr.get_adc(ch, s); }
+};
+
+/**
+ * @brief A stuck code has its 6 least significant bits all 0 or all 1
+ */
+inline bool
+is_stuck_code(uint16_t adc)
+{
+  uint16_t low = adc & 0x3f;
+  return low == 0 || low == 0x3f;
+}
+
+/**
+ * @brief Per-channel sums of one pass over the frames
+ */
+struct ChannelStats
+{
+  size_t n_samples = 0;
+  std::vector<uint64_t> sum;
+  std::vector<uint64_t> sum_sq;
+  std::vector<uint16_t> min;
+  std::vector<uint16_t> max;
+  std::vector<uint64_t> n_stuck;
+
+  explicit ChannelStats(size_t n_channels)
+    : sum(n_channels, 0)
+    , sum_sq(n_channels, 0)
+    , min(n_channels, std::numeric_limits<uint16_t>::max())
+    , max(n_channels, 0)
+    , n_stuck(n_channels, 0)
+  {}
+
+  double mean(size_t ch) const { return n_samples > 0 ? double(sum[ch]) / n_samples : std::nan(""); }
+
+  double rms(size_t ch) const
+  {
+    if (n_samples == 0)
+      return std::nan("");
+    double m = mean(ch);
+    return std::sqrt(std::max(double(sum_sq[ch]) / n_samples - m * m, 0.));
+  }
+};
+
+/**
+ * @brief Pedestal (mean), RMS, min, max and stuck-code count of every channel, in one pass
+ * over n_frames contiguous frames
+ */
+template<typename Frame>
+ChannelStats
+compute_channel_stats(const Frame* frames, size_t n_frames)
+{
+  using Layout = FrameLayout<Frame>;
+  ChannelStats stats(Layout::s_num_channels);
+  for (size_t i = 0; i < n_frames; ++i) {
+    for (size_t s = 0; s < Layout::s_samples_per_frame; ++s) {
+      for (size_t ch = 0; ch < Layout::s_num_channels; ++ch) {
+        uint16_t adc = Layout::get_adc(frames[i], ch, s);
+        stats.sum[ch] += adc;
+        stats.sum_sq[ch] += uint64_t(adc) * adc;
+        stats.min[ch] = std::min(stats.min[ch], adc);
+        stats.max[ch] = std::max(stats.max[ch], adc);
+        stats.n_stuck[ch] += is_stuck_code(adc);
+      }
+    }
+  }
+  stats.n_samples = n_frames * Layout::s_samples_per_frame;
+  return stats;
+}
+
+/**
+ * @brief Number of stuck codes of every channel over n_frames contiguous frames
+ */
+template<typename Frame>
+std::vector<uint64_t>
+count_stuck_codes(const Frame* frames, size_t n_frames)
+{
+  using Layout = FrameLayout<Frame>;
+  std::vector<uint64_t> n_stuck(Layout::s_num_channels, 0);
+  for (size_t i = 0; i < n_frames; ++i)
+    for (size_t s = 0; s < Layout::s_samples_per_frame; ++s)
+      for (size_t ch = 0; ch < Layout::s_num_channels; ++ch)
+        n_stuck[ch] += is_stuck_code(Layout::get_adc(frames[i], ch, s));
+  return n_stuck;
+}
+
+/**
+ * @brief In-place iterative radix-2 FFT of x (size a power of two), with precomputed
+ * twiddles exp(-2*pi*i*k/n), k < n/2, and bit-reversal permutation
+ */
+inline void
+fft_radix2(std::complex<double>* x,
+           size_t n,
+           const std::vector<std::complex<double>>& twiddles,
+           const std::vector<size_t>& bit_reversal)
+{
+  for (size_t i = 0; i < n; ++i)
+    if (i < bit_reversal[i])
+      std::swap(x[i], x[bit_reversal[i]]);
+  for (size_t len = 2; len <= n; len <<= 1) {
+    size_t half = len / 2;
+    size_t step = n / len;
+    for (size_t i = 0; i < n; i += len) {
+      for (size_t k = 0; k < half; ++k) {
+        std::complex<double> t = twiddles[k * step] * x[i + k + half];
+        x[i + k + half] = x[i + k] - t;
+        x[i + k] += t;
+      }
+    }
+  }
+}
+
+/**
+ * @brief Accumulates the power spectrum |FFT|^2 of every channel over segments of n_fft
+ * consecutive samples, each with its mean removed. Segments don't span calls to add_frames;
+ * the samples left over at the end of a call are dropped.
+ */
+template<typename Frame>
+class FFTPowerAccumulator
+{
+public:
+  using Layout = FrameLayout<Frame>;
+
+  explicit FFTPowerAccumulator(size_t n_fft)
+    : m_n_fft(n_fft)
+    , m_n_bins(n_fft / 2 + 1)
+    , m_segment(Layout::s_num_channels * n_fft)
+    , m_power_sum(Layout::s_num_channels * m_n_bins, 0.)
+    , m_work(n_fft)
+  {
+    if (n_fft < 2 || (n_fft & (n_fft - 1)) != 0)
+      throw std::invalid_argument("n_fft must be a power of two");
+    m_twiddles.resize(n_fft / 2);
+    for (size_t k = 0; k < n_fft / 2; ++k)
+      m_twiddles[k] = std::polar(1., -2. * M_PI * double(k) / double(n_fft));
+    m_bit_reversal.resize(n_fft);
+    size_t n_bits = 0;
+    while ((size_t(1) << n_bits) < n_fft)
+      ++n_bits;
+    for (size_t i = 0; i < n_fft; ++i) {
+      size_t r = 0;
+      for (size_t b = 0; b < n_bits; ++b)
+        r |= ((i >> b) & 1) << (n_bits - 1 - b);
+      m_bit_reversal[i] = r;
+    }
+  }
+
+  void add_frames(const Frame* frames, size_t n_frames)
+  {
+    size_t n_filled = 0;
+    for (size_t i = 0; i < n_frames; ++i) {
+      for (size_t s = 0; s < Layout::s_samples_per_frame; ++s) {
+        for (size_t ch = 0; ch < Layout::s_num_channels; ++ch)
+          m_segment[ch * m_n_fft + n_filled] = Layout::get_adc(frames[i], ch, s);
+        if (++n_filled == m_n_fft) {
+          add_segment();
+          n_filled = 0;
+        }
+      }
+    }
+  }
+
+  size_t get_n_fft() const { return m_n_fft; }
+  size_t get_n_bins() const { return m_n_bins; }
+  size_t get_n_channels() const { return Layout::s_num_channels; }
+  size_t get_n_segments() const { return m_n_segments; }
+
+  // (n_channels, n_bins) sum of |FFT|^2 over the segments
+  const std::vector<double>& get_power_sum() const { return m_power_sum; }
+
+  // frequencies of the bins in Hz, for 16 ns DTS ticks
+  std::vector<double> get_frequencies() const
+  {
+    std::vector<double> f(m_n_bins);
+    for (size_t k = 0; k < m_n_bins; ++k)
+      f[k] = double(k) / (double(m_n_fft) * Layout::s_sampling_period * 16e-9);
+    return f;
+  }
+
+  void reset()
+  {
+    std::fill(m_power_sum.begin(), m_power_sum.end(), 0.);
+    m_n_segments = 0;
+  }
+
+private:
+  void add_segment()
+  {
+    for (size_t ch = 0; ch < Layout::s_num_channels; ++ch) {
+      const double* seg = m_segment.data() + ch * m_n_fft;
+      double mean = 0.;
+      for (size_t j = 0; j < m_n_fft; ++j)
+        mean += seg[j];
+      mean /= m_n_fft;
+      for (size_t j = 0; j < m_n_fft; ++j)
+        m_work[j] = seg[j] - mean;
+      fft_radix2(m_work.data(), m_n_fft, m_twiddles, m_bit_reversal);
+      double* power = m_power_sum.data() + ch * m_n_bins;
+      for (size_t k = 0; k < m_n_bins; ++k)
+        power[k] += std::norm(m_work[k]);
+    }
+    ++m_n_segments;
+  }
+
+  size_t m_n_fft;
+  size_t m_n_bins;
+  size_t m_n_segments = 0;
+  std::vector<double> m_segment;
+  std::vector<double> m_power_sum;
+  std::vector<std::complex<double>> m_work;
+  std::vector<std::complex<double>> m_twiddles;
+  std::vector<size_t> m_bit_reversal;
+};
+
+} // namespace rawdatautils
+} // namespace dunedaq
+
+#endif // RAWDATAUTILS_INCLUDE_FRAMEANALYSIS_HPP_
@@ -0,0 +1,99 @@
+/**
+ * @file FrameStreaming.hpp Helpers to read and write binary frame files in fixed-size chunks
+ *
+ * This is part of the DUNE DAQ , copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+#ifndef RAWDATAUTILS_INCLUDE_FRAMESTREAMING_HPP_
+#define RAWDATAUTILS_INCLUDE_FRAMESTREAMING_HPP_
+
+#include <chrono>
+#include <cstddef>
+#include <cstdint>
+#include <filesystem>
+#include <fstream>
+#include <iostream>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+namespace dunedaq {
+namespace rawdatautils {
+
+/**
+ * @brief Default number of input frames read per chunk. A multiple of 64 so
+ * that chunks can be split into whole WIBEthFrames.
+ */
+constexpr size_t s_default_chunk_frames = 64 * 64;
+
+/**
+ * @brief Reads a binary file of Frames chunk by chunk, calling f(Frame* frames, size_t n_frames)
+ * for each chunk. Memory use is one chunk regardless of the file size. A trailing partial frame
+ * is ignored. Returns the number of frames read.
+ */
+template<typename Frame, typename F>
+size_t
+for_each_frame_chunk(const std::string& filename, size_t chunk_frames, F&& f, size_t max_frames = 0)
+{
+  std::ifstream file(filename.c_str(), std::ios::binary);
+  if (!file.is_open()) {
+    throw std::runtime_error("Could not open " + filename);
+  }
+  std::vector<Frame> buffer(chunk_frames);
+  size_t total_frames = 0;
+  while (file && (max_frames == 0 || total_frames < max_frames)) {
+    size_t to_read = chunk_frames;
+    if (max_frames != 0 && max_frames - total_frames < to_read)
+      to_read = max_frames - total_frames;
+    file.read(reinterpret_cast<char*>(buffer.data()), to_read * sizeof(Frame));
+    size_t n_frames = static_cast<size_t>(file.gcount()) / sizeof(Frame);
+    if (n_frames == 0)
+      break;
+    f(buffer.data(), n_frames);
+    total_frames += n_frames;
+  }
+  return total_frames;
+}
+
+/**
+ * @brief Writes n_frames frames in one call
+ */
+template<typename Frame>
+void
+write_frames(std::ofstream& out, const Frame* frames, size_t n_frames)
+{
+  out.write(reinterpret_cast<const char*>(frames), n_frames * sizeof(Frame));
+}
+
+/**
+ * @brief Name of the output file for one of several output streams: /path/out.bin -> /path/out_<index>.bin
+ */
+inline std::string
+indexed_output_name(const std::string& output, size_t index)
+{
+  std::filesystem::path p(output);
+  std::filesystem::path name = p.stem();
+  name += "_" + std::to_string(index);
+  name += p.extension();
+  return (p.parent_path() / name).string();
+}
+
+/**
+ * @brief Prints the number of frames processed and the rate since start
+ */
+inline void
+report_frame_rate(const std::string& what, size_t n_frames, std::chrono::steady_clock::time_point start)
+{
+  double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+  std::cout << what << ": " << n_frames << " frames in " << seconds << " s";
+  if (seconds > 0)
+    std::cout << " (" << n_frames / seconds << " frames/s)";
+  std::cout << '\n';
+}
+
+} // namespace rawdatautils
+} // namespace dunedaq
+
+#endif // RAWDATAUTILS_INCLUDE_FRAMESTREAMING_HPP_
@@ -0,0 +1,147 @@
+/**
+ * @file HDF5Conversion.hpp Iteration over the ProtoWIB fragments of an HDF5 raw data file for file conversions
+ *
+ * This is part of the DUNE DAQ , copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+#ifndef RAWDATAUTILS_INCLUDE_HDF5CONVERSION_HPP_
+#define RAWDATAUTILS_INCLUDE_HDF5CONVERSION_HPP_
+
+#include <algorithm>
+#include <cstddef>
+#include <cstdint>
+#include <fstream>
+#include <future>
+#include <iostream>
+#include <map>
+#include <memory>
+#include <string>
+#include <vector>
+
+#include "daqdataformats/Fragment.hpp"
+#include "fddetdataformats/WIBFrame.hpp"
+#include "hdf5libs/HDF5RawDataFile.hpp"
+
+namespace dunedaq {
+namespace rawdatautils {
+
+/**
+ * @brief Dataset paths of the ProtoWIB fragments of a record, sorted. The position of a path
+ * in this list is the link number used by the HDF5 converters.
+ */
+inline std::vector<std::string>
+get_wib_fragment_paths(hdf5libs::HDF5RawDataFile& h5_file, const hdf5libs::HDF5RawDataFile::record_id_t& rid)
+{
+  const std::string suffix = "_" + daqdataformats::fragment_type_to_string(daqdataformats::FragmentType::kProtoWIB);
+  std::vector<std::string> paths;
+  for (auto& path : h5_file.get_fragment_dataset_paths(rid)) {
+    if (path.size() >= suffix.size() && path.compare(path.size() - suffix.size(), suffix.size(), suffix) == 0)
+      paths.push_back(path);
+  }
+  std::sort(paths.begin(), paths.end());
+  return paths;
+}
+
+/**
+ * @brief Output streams and conversion state of one link
+ */
+template<typename OutFrame>
+struct LinkOutput
+{
+  std::vector<std::ofstream> outs;
+  std::vector<OutFrame> buffer;
+  uint64_t timestamp = 0;
+  bool started = false;
+  size_t n_frames = 0;
+};
+
+/**
+ * @brief Calls f(state, frames, n_frames) for the WIBFrames of every selected link in records
+ * [first_record, first_record + n_records) of an HDF5 raw data file, where state is the per-link
+ * object created by make_state(link) the first time the link is seen. links empty selects all
+ * links and n_records 0 selects all records from first_record on.
+ *
+ * Fragments are read one record at a time, sequentially since HDF5 is not thread safe, and the
+ * calls for the different links of a record then run in parallel. Calls for the same link are
+ * made in record order and never overlap. Returns the per-link states.
+ */
+template<typename State, typename MakeState, typename F>
+std::map<int, State>
+for_each_wib_fragment(const std::string& filename,
+                      const std::vector<int>& links,
+                      size_t first_record,
+                      size_t n_records,
+                      MakeState&& make_state,
+                      F&& f)
+{
+  hdf5libs::HDF5RawDataFile h5_file(filename);
+  auto records = h5_file.get_all_record_ids();
+  std::map<int, State> states;
+
+  size_t i_record = 0;
+  for (auto& rid : records) {
+    if (i_record++ < first_record)
+      continue;
+    if (n_records != 0 && i_record > first_record + n_records)
+      break;
+
+    auto paths = get_wib_fragment_paths(h5_file, rid);
+    std::vector<int> record_links = links;
+    if (record_links.empty()) {
+      for (size_t i = 0; i < paths.size(); ++i)
+        record_links.push_back(i);
+    }
+    std::sort(record_links.begin(), record_links.end());
+    record_links.erase(std::unique(record_links.begin(), record_links.end()), record_links.end());
+
+    std::vector<std::pair<int, std::unique_ptr<daqdataformats::Fragment>>> frags;
+    for (auto link : record_links) {
+      if (link < 0 || static_cast<size_t>(link) >= paths.size()) {
+        std::cout << "Record " << rid.first << " has no WIB link " << link << ", skipping it\n";
+        continue;
+      }
+      auto frag = h5_file.get_frag_ptr(paths[link]);
+      if (frag->get_fragment_type() != daqdataformats::FragmentType::kProtoWIB)
+        continue;
+      if (states.count(link) == 0)
+        states.emplace(link, make_state(link));
+      frags.emplace_back(link, std::move(frag));
+    }
+
+    std::vector<std::future<void>> tasks;
+    for (auto& [link, frag] : frags) {
+      auto frag_ptr = frag.get();
+      auto state = &states.at(link);
+      tasks.push_back(std::async(std::launch::async, [&f, frag_ptr, state]() {
+        size_t n_frames = (frag_ptr->get_size() - sizeof(daqdataformats::FragmentHeader)) /
+                          sizeof(fddetdataformats::WIBFrame);
+        if (n_frames > 0)
+          f(*state, static_cast<fddetdataformats::WIBFrame*>(frag_ptr->get_data()), n_frames);
+      }));
+    }
+    for (auto& t : tasks)
+      t.get();
+  }
+  return states;
+}
+
+/**
+ * @brief Closes the outputs of every link and prints the number of frames converted per link
+ */
+template<typename State>
+void
+close_link_outputs(std::map<int, State>& states)
+{
+  for (auto& [link, state] : states) {
+    for (auto& out : state.outs)
+      out.close();
+    std::cout << "Link " << link << ": " << state.n_frames << " frames converted\n";
+  }
+}
+
+} // namespace rawdatautils
+} // namespace dunedaq
+
+#endif // RAWDATAUTILS_INCLUDE_HDF5CONVERSION_HPP_
@@ -0,0 +1,38 @@
+/**
+ * @file TriggerPrimitiveRecord.hpp Flat record of a TriggerPrimitive for numpy structured arrays
+ *
+ * This is part of the DUNE DAQ , copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+#ifndef RAWDATAUTILS_INCLUDE_TRIGGERPRIMITIVERECORD_HPP_
+#define RAWDATAUTILS_INCLUDE_TRIGGERPRIMITIVERECORD_HPP_
+
+#include <cstdint>
+
+namespace dunedaq {
+namespace rawdatautils {
+
+/**
+ * @brief TriggerPrimitive fields with fixed types and layout, independent of the
+ * trgdataformats version. The numpy dtype is registered in unpack.cpp.
+ */
+struct TriggerPrimitiveRecord
+{
+  uint64_t time_start;
+  uint64_t time_peak;
+  uint64_t time_over_threshold;
+  uint32_t channel;
+  uint32_t adc_integral;
+  uint32_t type;
+  uint32_t algorithm;
+  uint16_t adc_peak;
+  uint16_t detid;
+  uint16_t flag;
+};
+
+} // namespace rawdatautils
+} // namespace dunedaq
+
+#endif // RAWDATAUTILS_INCLUDE_TRIGGERPRIMITIVERECORD_HPP_
@@ -9,23 +9,30 @@
 #ifndef RAWDATAUTILS_INCLUDE_WIBTOTDE16_HPP_
 #define RAWDATAUTILS_INCLUDE_WIBTOTDE16_HPP_
 
+#include <algorithm>
+#include <chrono>
 #include <cstdint>
+#include <vector>
 #include <iostream>
 #include <fstream>
 #include <filesystem>
 #include "detdataformats/DetID.hpp"
 #include "fddetdataformats/WIBFrame.hpp"
 #include "fddetdataformats/TDE16Frame.hpp"
+#include "rawdatautils/FrameStreaming.hpp"
+#include "rawdatautils/HDF5Conversion.hpp"
 
 namespace dunedaq {
 namespace rawdatautils {
 
-fddetdataformats::TDE16Frame
-wibtotde(fddetdataformats::WIBFrame* fr, uint64_t timestamp, uint16_t ch) {
-  fddetdataformats::TDE16Frame res;
-  // leave ADCs empty for now
-  for (auto i=0; i < dunedaq::fddetdataformats::tot_adc16_samples; i++) {
-	res.set_adc_sample(ch,i);
+/**
+ * @brief Fills res with the header of the WIBFrame fr and the tot_adc16_samples samples of channel ch
+ */
+void
+wibtotde(const fddetdataformats::WIBFrame* fr, uint64_t timestamp, uint16_t ch, const uint16_t* samples,
+         fddetdataformats::TDE16Frame& res) {
+  for (auto i = 0; i < dunedaq::fddetdataformats::tot_adc16_samples; i++) {
+    res.set_adc_sample(samples[i], i);
   }
 
   auto header = fr->get_wib_header();
@@ -36,41 +43,140 @@ wibtotde(fddetdataformats::WIBFrame* fr, uint64_t timestamp, uint16_t ch) {
   res.get_daq_header()->stream_id = header->fiber_no;
   res.set_channel(ch);
   res.set_timestamp(timestamp);
-  std::cout << " Generated frame with TS " << res.get_timestamp() << " for channel " << res.get_channel() << std::endl;
-  return res;
 }
 
+/**
+ * @brief Transcodes a stream of WIBFrames into TDE16Frames. Each block of tot_adc16_samples
+ * consecutive WIBFrames gives one TDE16Frame per channel for the n_channels_per_amc channels
+ * starting at starting_channel. Frames can be added in chunks of any size; samples are transposed
+ * into a per-channel block buffer as they arrive and a partial block at the end is dropped.
+ */
+class WIBtoTDETranscoder
+{
+public:
+  static constexpr size_t s_block_frames = dunedaq::fddetdataformats::tot_adc16_samples;
+  static constexpr size_t s_n_channels = dunedaq::fddetdataformats::n_channels_per_amc;
+
+  explicit WIBtoTDETranscoder(int starting_channel = 0)
+    : m_starting_channel(starting_channel)
+    , m_samples(s_n_channels * s_block_frames)
+    , m_out_buffer(s_n_channels)
+  {}
+
+  void add_frames(const fddetdataformats::WIBFrame* frames, size_t n_frames, std::ofstream& out)
+  {
+    if (!m_started && n_frames > 0) {
+      m_timestamp = frames->get_timestamp();
+      m_started = true;
+    }
+    while (n_frames > 0) {
+      if (m_n_pending == 0)
+        m_block_header = *frames;
+      size_t n = std::min(n_frames, s_block_frames - m_n_pending);
+      transpose(frames, n);
+      m_n_pending += n;
+      frames += n;
+      n_frames -= n;
+      if (m_n_pending == s_block_frames)
+        write_block(out);
+    }
+  }
+
+  size_t get_num_blocks() const { return m_n_blocks; }
+  size_t get_num_pending_frames() const { return m_n_pending; }
+
+private:
+  // Decode a tile of frames into a small frame-major buffer, then scatter it into the channel-major
+  // block buffer; both inner loops run over contiguous memory
+  void transpose(const fddetdataformats::WIBFrame* frames, size_t n_frames)
+  {
+    constexpr size_t tile = 16;
+    uint16_t tile_buf[tile][s_n_channels]; // NOLINT
+    for (size_t t0 = 0; t0 < n_frames; t0 += tile) {
+      size_t n_tile = std::min(tile, n_frames - t0);
+      for (size_t t = 0; t < n_tile; ++t) {
+        for (size_t c = 0; c < s_n_channels; ++c)
+          tile_buf[t][c] = frames[t0 + t].get_channel(m_starting_channel + c);
+      }
+      uint16_t* dst = m_samples.data() + m_n_pending + t0;
+      for (size_t c = 0; c < s_n_channels; ++c) {
+        for (size_t t = 0; t < n_tile; ++t)
+          dst[c * s_block_frames + t] = tile_buf[t][c];
+      }
+    }
+  }
+
+  void write_block(std::ofstream& out)
+  {
+    for (size_t c = 0; c < s_n_channels; ++c)
+      wibtotde(&m_block_header, m_timestamp, c, m_samples.data() + c * s_block_frames, m_out_buffer[c]);
+    write_frames(out, m_out_buffer.data(), m_out_buffer.size());
+    m_timestamp += s_block_frames * dunedaq::fddetdataformats::ticks_between_adc_samples;
+    m_n_pending = 0;
+    ++m_n_blocks;
+  }
+
+  int m_starting_channel;
+  std::vector<uint16_t> m_samples;
+  std::vector<fddetdataformats::TDE16Frame> m_out_buffer;
+  fddetdataformats::WIBFrame m_block_header;
+  uint64_t m_timestamp = 0;
+  bool m_started = false;
+  size_t m_n_pending = 0;
+  size_t m_n_blocks = 0;
+};
+
 void
-wib_binary_to_tde_binary(std::string& filename, std::string& output) {
-  //FIXME: this is temporary.... we take 1 WIB frame and invent TDE frames from it... ADC values not set
-  std::ifstream file(filename.c_str(), std::ios::binary);
+wib_binary_to_tde_binary(std::string& filename, std::string& output, size_t chunk_frames = s_default_chunk_frames,
+                         int starting_channel = 0) {
   std::ofstream out(output.c_str(), std::ios::binary);
   std::cout << "Transforming " << filename << " to " << output << '\n';
-  auto size = std::filesystem::file_size(filename);
-  std::vector<char> v(size);
-  file.read(v.data(), size);
-  file.close();
-  int num_frames = size / sizeof(fddetdataformats::WIBFrame);
-  if (num_frames > 10 ) num_frames = 10;
-  std::cout << "Number of frames found: "<< num_frames << '\n';
-  auto ptr = reinterpret_cast<fddetdataformats::WIBFrame*>(v.data());
-  uint64_t timestamp = ptr->get_timestamp();
-  while(num_frames--){
-    for (uint16_t i = 0; i < dunedaq::fddetdataformats::n_channels_per_amc; i++) {	  
-       auto tdefr = wibtotde(ptr, timestamp, i);
-       out.write(reinterpret_cast<char*>(&tdefr), sizeof(tdefr));
-    }
-    timestamp += (dunedaq::fddetdataformats::tot_adc16_samples * dunedaq::fddetdataformats::ticks_between_adc_samples);
-    ptr++;
-  }
+  auto start = std::chrono::steady_clock::now();
+  WIBtoTDETranscoder transcoder(starting_channel);
+  auto num_frames = for_each_frame_chunk<fddetdataformats::WIBFrame>(filename, chunk_frames,
+    [&](fddetdataformats::WIBFrame* frames, size_t n_frames) {
+      transcoder.add_frames(frames, n_frames, out);
+    });
   out.close();
+  std::cout << "TDE16Frames written: " << transcoder.get_num_blocks() * WIBtoTDETranscoder::s_n_channels
+            << ", WIBFrames dropped at the end: " << transcoder.get_num_pending_frames() << '\n';
+  report_frame_rate("Frames converted", num_frames, start);
 }
 
+/**
+ * @brief Converts the ProtoWIB fragments of an HDF5 raw data file into one TDE binary file per link,
+ * named <output stem>_<link><extension>, transcoded as in WIBtoTDETranscoder. See for_each_wib_fragment
+ * for the link and record selection.
+ */
 void
-wib_hdf5_to_tde_binary(std::string& /*filename*/, std::string& /*output*/) {
+wib_hdf5_to_tde_binary(std::string& filename, std::string& output, std::vector<int> links = {},
+                       size_t first_record = 0, size_t n_records = 0, int starting_channel = 0) {
+  std::cout << "Transforming " << filename << " to " << output << '\n';
+  auto start = std::chrono::steady_clock::now();
+  // TDE blocks span fragment boundaries, so each link keeps its own transcoder
+  struct State
+  {
+    std::vector<std::ofstream> outs;
+    WIBtoTDETranscoder transcoder;
+    size_t n_frames = 0;
+  };
+  auto states = for_each_wib_fragment<State>(filename, links, first_record, n_records,
+    [&](int link) {
+      State state{ {}, WIBtoTDETranscoder(starting_channel) };
+      state.outs.emplace_back(indexed_output_name(output, link).c_str(), std::ios::binary);
+      return state;
+    },
+    [](State& state, fddetdataformats::WIBFrame* frames, size_t n_frames) {
+      state.transcoder.add_frames(frames, n_frames, state.outs[0]);
+      state.n_frames += n_frames;
+    });
+  size_t num_frames = 0;
+  for (auto& [link, state] : states)
+    num_frames += state.n_frames;
+  close_link_outputs(states);
+  report_frame_rate("Frames converted", num_frames, start);
 }
 
-
 } // namespace dunedaq::rawdatautils
 }
 
@@ -9,12 +9,17 @@
 #ifndef RAWDATAUTILS_INCLUDE_WIBTOWIB2_HPP_
 #define RAWDATAUTILS_INCLUDE_WIBTOWIB2_HPP_
 
+#include <algorithm>
+#include <chrono>
 #include <cstdint>
 #include <iostream>
 #include <fstream>
 #include <filesystem>
+#include <vector>
 #include "fddetdataformats/WIBFrame.hpp"
 #include "fddetdataformats/WIB2Frame.hpp"
+#include "rawdatautils/FrameStreaming.hpp"
+#include "rawdatautils/HDF5Conversion.hpp"
 
 namespace dunedaq {
 namespace rawdatautils {
@@ -35,29 +40,63 @@ wibtowib2(fddetdataformats::WIBFrame* fr, uint64_t timestamp=0) {
 }
 
 void
-wib_binary_to_wib2_binary(std::string& filename, std::string& output) {
-  std::ifstream file(filename.c_str(), std::ios::binary);
+wib_binary_to_wib2_binary(std::string& filename, std::string& output, size_t chunk_frames = s_default_chunk_frames) {
   std::ofstream out(output.c_str(), std::ios::binary);
   std::cout << "Transforming " << filename << " to " << output << '\n';
-  auto size = std::filesystem::file_size(filename);
-  std::vector<char> v(size);
-  file.read(v.data(), size);
-  file.close();
-  int num_frames = size / sizeof(fddetdataformats::WIBFrame);
-  std::cout << "Number of frames found: "<< num_frames << '\n';
-  auto ptr = reinterpret_cast<fddetdataformats::WIBFrame*>(v.data());
-  uint64_t timestamp = ptr->get_timestamp();
-  while(num_frames--){
-    auto wib2fr = wibtowib2(ptr, timestamp);
-    timestamp += 32;
-    ptr++;
-    out.write(reinterpret_cast<char*>(&wib2fr), sizeof(wib2fr));
-  }
+  auto start = std::chrono::steady_clock::now();
+  std::vector<fddetdataformats::WIB2Frame> out_buffer(chunk_frames);
+  bool first_chunk = true;
+  uint64_t timestamp = 0;
+  auto num_frames = for_each_frame_chunk<fddetdataformats::WIBFrame>(filename, chunk_frames,
+    [&](fddetdataformats::WIBFrame* frames, size_t n_frames) {
+      if (first_chunk) {
+        timestamp = frames->get_timestamp();
+        first_chunk = false;
+      }
+      for (size_t i = 0; i < n_frames; ++i) {
+        out_buffer[i] = wibtowib2(frames + i, timestamp);
+        timestamp += 32;
+      }
+      write_frames(out, out_buffer.data(), n_frames);
+    });
   out.close();
+  report_frame_rate("Frames converted", num_frames, start);
 }
 
+/**
+ * @brief Converts the ProtoWIB fragments of an HDF5 raw data file into one WIB2 binary file per link,
+ * named <output stem>_<link><extension>. See for_each_wib_fragment for the link and record selection.
+ */
 void
-wib_hdf5_to_wib2_binary(std::string& /*filename*/, std::string& /*output*/) {
+wib_hdf5_to_wib2_binary(std::string& filename, std::string& output, std::vector<int> links = {},
+                        size_t first_record = 0, size_t n_records = 0) {
+  std::cout << "Transforming " << filename << " to " << output << '\n';
+  auto start = std::chrono::steady_clock::now();
+  using State = LinkOutput<fddetdataformats::WIB2Frame>;
+  auto states = for_each_wib_fragment<State>(filename, links, first_record, n_records,
+    [&](int link) {
+      State state;
+      state.outs.emplace_back(indexed_output_name(output, link).c_str(), std::ios::binary);
+      return state;
+    },
+    [](State& state, fddetdataformats::WIBFrame* frames, size_t n_frames) {
+      if (!state.started) {
+        state.timestamp = frames->get_timestamp();
+        state.started = true;
+      }
+      state.buffer.resize(std::max(state.buffer.size(), n_frames));
+      for (size_t i = 0; i < n_frames; ++i) {
+        state.buffer[i] = wibtowib2(frames + i, state.timestamp);
+        state.timestamp += 32;
+      }
+      write_frames(state.outs[0], state.buffer.data(), n_frames);
+      state.n_frames += n_frames;
+    });
+  size_t num_frames = 0;
+  for (auto& [link, state] : states)
+    num_frames += state.n_frames;
+  close_link_outputs(states);
+  report_frame_rate("Frames converted", num_frames, start);
 }
 
 
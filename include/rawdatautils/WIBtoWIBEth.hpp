@@ -9,12 +9,18 @@
 #ifndef RAWDATAUTILS_INCLUDE_WIBTOWIBETH_HPP_
 #define RAWDATAUTILS_INCLUDE_WIBTOWIBETH_HPP_
 
+#include <algorithm>
+#include <chrono>
 #include <cstdint>
+#include <future>
+#include <vector>
 #include <iostream>
 #include <fstream>
 #include <filesystem>
 #include "fddetdataformats/WIBFrame.hpp"
 #include "fddetdataformats/WIBEthFrame.hpp"
+#include "rawdatautils/FrameStreaming.hpp"
+#include "rawdatautils/HDF5Conversion.hpp"
 
 namespace dunedaq {
 namespace rawdatautils {
@@ -38,36 +44,103 @@ wibtowibeth(fddetdataformats::WIBFrame* fr, uint64_t timestamp=0, int starting_c
   return res;
 }
 
+/**
+ * @brief Converts a file of WIBFrames into four files of WIBEthFrames, one per group of 64
+ * channels, named <output stem>_<group><extension>. The input is read in chunks of chunk_frames
+ * (rounded down to a multiple of 64) and the four groups are converted and written in parallel.
+ */
 void
-wib_binary_to_wibeth_binary(std::string& filename, std::string& output) {
-  std::ifstream file(filename.c_str(), std::ios::binary);
-  std::cout << "Transforming " << filename << " to " << output << '\n';
-  auto size = std::filesystem::file_size(filename);
-  std::vector<char> v(size);
-  file.read(v.data(), size);
-  file.close();
-  std::cout << "Number of frames found: "<< size / sizeof(fddetdataformats::WIBFrame) << '\n';
+wib_binary_to_wibeth_binary(std::string& filename, std::string& output, size_t chunk_frames = s_default_chunk_frames) {
+  constexpr size_t frames_per_wibeth = 64;
+  const std::vector<int> starting_channel {0, 64, 128, 192};
+  chunk_frames = std::max(chunk_frames / frames_per_wibeth, size_t(1)) * frames_per_wibeth;
 
-  std::ofstream out(output.c_str(), std::ios::binary);
-  std::vector<int> starting_channel {0, 64, 128, 192};
-  for (auto& sc : starting_channel) {
-    auto ptr = reinterpret_cast<fddetdataformats::WIBFrame*>(v.data());
-    uint64_t timestamp = ptr->get_timestamp();
-    int num_frames = size / sizeof(fddetdataformats::WIBFrame);
-    while(num_frames >= 64){
-      auto wibethfr = wibtowibeth(ptr, timestamp, sc);
-      timestamp += 32 * 64;
-      ptr += 64;
-      num_frames -= 64;
-      out.write(reinterpret_cast<char*>(&wibethfr), sizeof(wibethfr));
-    }
-    out.close();
+  std::vector<std::ofstream> outs;
+  for (size_t i = 0; i < starting_channel.size(); ++i) {
+    auto name = indexed_output_name(output, i);
+    std::cout << "Transforming " << filename << " to " << name << '\n';
+    outs.emplace_back(name.c_str(), std::ios::binary);
   }
+  auto start = std::chrono::steady_clock::now();
 
+  std::vector<std::vector<fddetdataformats::WIBEthFrame>> out_buffers(
+    starting_channel.size(), std::vector<fddetdataformats::WIBEthFrame>(chunk_frames / frames_per_wibeth));
+  bool first_chunk = true;
+  uint64_t timestamp = 0;
+  auto num_frames = for_each_frame_chunk<fddetdataformats::WIBFrame>(filename, chunk_frames,
+    [&](fddetdataformats::WIBFrame* frames, size_t n_frames) {
+      if (first_chunk) {
+        timestamp = frames->get_timestamp();
+        first_chunk = false;
+      }
+      // Only the last chunk can have a partial WIBEthFrame, which is dropped
+      size_t n_out = n_frames / frames_per_wibeth;
+      std::vector<std::future<void>> tasks;
+      for (size_t g = 0; g < starting_channel.size(); ++g) {
+        tasks.push_back(std::async(std::launch::async, [&, g]() {
+          auto& buffer = out_buffers[g];
+          uint64_t ts = timestamp;
+          for (size_t i = 0; i < n_out; ++i) {
+            buffer[i] = wibtowibeth(frames + i * frames_per_wibeth, ts, starting_channel[g]);
+            ts += 32 * frames_per_wibeth;
+          }
+          write_frames(outs[g], buffer.data(), n_out);
+        }));
+      }
+      for (auto& t : tasks)
+        t.get();
+      timestamp += 32 * frames_per_wibeth * n_out;
+    });
+  for (auto& out : outs)
+    out.close();
+  report_frame_rate("Frames converted", num_frames, start);
 }
 
+/**
+ * @brief Converts the ProtoWIB fragments of an HDF5 raw data file into WIBEth binary files, four per
+ * link as for wib_binary_to_wibeth_binary, named <output stem>_<link>_<group><extension>. Frames
+ * at the end of a fragment that do not fill a WIBEthFrame are dropped. See for_each_wib_fragment
+ * for the link and record selection.
+ */
 void
-wib_hdf5_to_wibeth_binary(std::string& /*filename*/, std::string& /*output*/) {
+wib_hdf5_to_wibeth_binary(std::string& filename, std::string& output, std::vector<int> links = {},
+                          size_t first_record = 0, size_t n_records = 0) {
+  constexpr size_t frames_per_wibeth = 64;
+  const std::vector<int> starting_channel {0, 64, 128, 192};
+  std::cout << "Transforming " << filename << " to " << output << '\n';
+  auto start = std::chrono::steady_clock::now();
+  using State = LinkOutput<fddetdataformats::WIBEthFrame>;
+  auto states = for_each_wib_fragment<State>(filename, links, first_record, n_records,
+    [&](int link) {
+      State state;
+      auto link_output = indexed_output_name(output, link);
+      for (size_t g = 0; g < starting_channel.size(); ++g)
+        state.outs.emplace_back(indexed_output_name(link_output, g).c_str(), std::ios::binary);
+      return state;
+    },
+    [&](State& state, fddetdataformats::WIBFrame* frames, size_t n_frames) {
+      if (!state.started) {
+        state.timestamp = frames->get_timestamp();
+        state.started = true;
+      }
+      size_t n_out = n_frames / frames_per_wibeth;
+      state.buffer.resize(std::max(state.buffer.size(), n_out));
+      for (size_t g = 0; g < starting_channel.size(); ++g) {
+        uint64_t ts = state.timestamp;
+        for (size_t i = 0; i < n_out; ++i) {
+          state.buffer[i] = wibtowibeth(frames + i * frames_per_wibeth, ts, starting_channel[g]);
+          ts += 32 * frames_per_wibeth;
+        }
+        write_frames(state.outs[g], state.buffer.data(), n_out);
+      }
+      state.timestamp += 32 * frames_per_wibeth * n_out;
+      state.n_frames += n_out * frames_per_wibeth;
+    });
+  size_t num_frames = 0;
+  for (auto& [link, state] : states)
+    num_frames += state.n_frames;
+  close_link_outputs(states);
+  report_frame_rate("Frames converted", num_frames, start);
 }
 
 
@@ -1,5 +1,5 @@
 /**
- * @file WIBEthUnpacker.cc Fast C++ -> numpy WIBEth format unpacker
+ * @file TDEUnpacker.cpp Fast C++ -> numpy TDE16 format unpacker
  *
  * This is part of the DUNE DAQ , copyright 2020.
  * Licensing/copyright details are in the COPYING file that you should have
@@ -24,31 +24,72 @@ uint32_t get_n_frames(daqdataformats::Fragment const& frag){
 
 /**
  * @brief Unpacks data containing TDE16Frames into a numpy array with the
- * timestamps/channel with dimension (number of TDE16Frames)
- * Warning: It doesn't check that nframes is a sensible value (can read out of bounds)
+ * timestamps with dimension (number of TDE16Frames)
+ * Warning: It doesn't check that n_frames is a sensible value (can read out of bounds)
  */
-py::array_t<uint64_t> np_array_timestamp_data(daqdataformats::Fragment const& frag){
-  size_t nframes = (frag.get_size() - sizeof(daqdataformats::FragmentHeader)) / sizeof(fddetdataformats::TDE16Frame);
-  py::array_t<uint64_t> ret(nframes);
+py::array_t<uint64_t> np_array_timestamp_data(void* data, uint32_t n_frames){
+  py::array_t<uint64_t> ret(n_frames);
   auto ptr = static_cast<uint64_t*>(ret.request().ptr);
-  for (size_t i=0; i<(size_t)nframes; i++) {
-    auto fr = reinterpret_cast<fddetdataformats::TDE16Frame*>(static_cast<char*>(frag.get_data()) + i * sizeof(fddetdataformats::TDE16Frame));
+  for (size_t i=0; i<(size_t)n_frames; i++) {
+    auto fr = reinterpret_cast<fddetdataformats::TDE16Frame*>(static_cast<char*>(data) + i * sizeof(fddetdataformats::TDE16Frame));
     ptr[i] = fr->get_timestamp();
   }
 
   return ret;
 }
 
-py::array_t<uint64_t> np_array_channel_data(daqdataformats::Fragment const& frag){
-  size_t nframes = (frag.get_size() - sizeof(daqdataformats::FragmentHeader)) / sizeof(fddetdataformats::TDE16Frame);
-  py::array_t<uint64_t> ret(nframes);
+/**
+ * @brief Unpacks data containing TDE16Frames into a numpy array with the
+ * channels with dimension (number of TDE16Frames)
+ * Warning: It doesn't check that n_frames is a sensible value (can read out of bounds)
+ */
+py::array_t<uint64_t> np_array_channel_data(void* data, uint32_t n_frames){
+  py::array_t<uint64_t> ret(n_frames);
   auto ptr = static_cast<uint64_t*>(ret.request().ptr);
-  for (size_t i=0; i<(size_t)nframes; i++) {
-    auto fr = reinterpret_cast<fddetdataformats::TDE16Frame*>(static_cast<char*>(frag.get_data()) + i * sizeof(fddetdataformats::TDE16Frame));
+  for (size_t i=0; i<(size_t)n_frames; i++) {
+    auto fr = reinterpret_cast<fddetdataformats::TDE16Frame*>(static_cast<char*>(data) + i * sizeof(fddetdataformats::TDE16Frame));
     ptr[i] = fr->get_channel();
   }
 
   return ret;
 }
 
+/**
+ * @brief Unpacks data containing TDE16Frames into a numpy array with the ADC
+ * values and dimension (number of TDE16Frames, tot_adc16_samples)
+ * Warning: It doesn't check that n_frames is a sensible value (can read out of bounds)
+ */
+py::array_t<uint16_t> np_array_adc_data(void* data, uint32_t n_frames){
+  size_t n_smpl = fddetdataformats::tot_adc16_samples;
+  py::array_t<uint16_t> ret({static_cast<size_t>(n_frames), n_smpl});
+  auto ptr = static_cast<uint16_t*>(ret.request().ptr);
+  for (size_t i=0; i<(size_t)n_frames; i++) {
+    auto fr = reinterpret_cast<fddetdataformats::TDE16Frame*>(static_cast<char*>(data) + i * sizeof(fddetdataformats::TDE16Frame));
+    for (size_t j=0; j<n_smpl; j++)
+      ptr[i*n_smpl + j] = fr->get_adc_sample(j);
+  }
+
+  return ret;
+}
+
+/**
+ * @brief Unpacks a Fragment containing TDE16Frames into a numpy array with the
+ * timestamps with dimension (number of TDE16Frames)
+ */
+py::array_t<uint64_t> np_array_timestamp_data(daqdataformats::Fragment const& frag){
+  return np_array_timestamp_data(frag.get_data(), get_n_frames(frag));
+}
+
+py::array_t<uint64_t> np_array_channel_data(daqdataformats::Fragment const& frag){
+  return np_array_channel_data(frag.get_data(), get_n_frames(frag));
+}
+
+/**
+ * @brief Unpacks a Fragment containing TDE16Frames into a numpy array with the
+ * ADC values and dimension (number of TDE16Frames, tot_adc16_samples)
+ */
+py::array_t<uint16_t> np_array_adc(daqdataformats::Fragment const& frag){
+  return np_array_adc_data(frag.get_data(), get_n_frames(frag));
+}
+
 } // namespace dunedaq::rawdatautils::tde // NOLINT
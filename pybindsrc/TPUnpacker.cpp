@@ -0,0 +1,68 @@
+/**
+ * @file TPUnpacker.cpp Fast C++ -> numpy TriggerPrimitive unpacker
+ *
+ * This is part of the DUNE DAQ , copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+#include "rawdatautils/TriggerPrimitiveRecord.hpp"
+
+#include "trgdataformats/TriggerPrimitive.hpp"
+#include "daqdataformats/Fragment.hpp"
+
+#include <cstdint>
+#include <pybind11/numpy.h>
+
+namespace py = pybind11;
+namespace dunedaq::rawdatautils::tp {
+
+/**
+ * @brief Gets number of TriggerPrimitives in a fragment
+ */
+uint32_t get_n_tps(daqdataformats::Fragment const& frag){
+  return (frag.get_size() - sizeof(daqdataformats::FragmentHeader)) / sizeof(trgdataformats::TriggerPrimitive);
+}
+
+/**
+ * @brief Unpacks data containing TriggerPrimitives into a numpy structured array
+ * with one TriggerPrimitiveRecord per TP
+ * Warning: It doesn't check that n_tps is a sensible value (can read out of bounds)
+ */
+py::array_t<TriggerPrimitiveRecord> np_array_tp_data(void* data, uint32_t n_tps){
+  py::array_t<TriggerPrimitiveRecord> ret(n_tps);
+  auto ptr = static_cast<TriggerPrimitiveRecord*>(ret.request().ptr);
+  auto tps = static_cast<trgdataformats::TriggerPrimitive*>(data);
+  for (size_t i=0; i<(size_t)n_tps; ++i) {
+    auto& tp = tps[i];
+    auto& rec = ptr[i];
+    rec.time_start = tp.time_start;
+    rec.time_peak = tp.time_peak;
+    rec.time_over_threshold = tp.time_over_threshold;
+    rec.channel = tp.channel;
+    rec.adc_integral = tp.adc_integral;
+    rec.adc_peak = tp.adc_peak;
+    rec.detid = tp.detid;
+    rec.type = static_cast<uint32_t>(tp.type);
+    rec.algorithm = static_cast<uint32_t>(tp.algorithm);
+    rec.flag = tp.flag;
+  }
+
+  return ret;
+}
+
+/**
+ * @brief Unpacks a Fragment containing TriggerPrimitives into a numpy structured array
+ */
+py::array_t<TriggerPrimitiveRecord> np_array_tp(daqdataformats::Fragment const& frag){
+  return np_array_tp_data(frag.get_data(), get_n_tps(frag));
+}
+
+/**
+ * @brief numpy dtype of the arrays returned by np_array_tp/np_array_tp_data
+ */
+py::dtype tp_dtype(){
+  return py::dtype::of<TriggerPrimitiveRecord>();
+}
+
+} // namespace dunedaq::rawdatautils::tp // NOLINT
@@ -6,10 +6,16 @@
  * received with this code.
  */
 
+#include "rawdatautils/TriggerPrimitiveRecord.hpp"
+
 #include "fddetdataformats/WIBEthFrame.hpp"
 #include "daqdataformats/Fragment.hpp"
 
+#include <algorithm>
+#include <cmath>
 #include <cstdint>
+#include <stdexcept>
+#include <vector>
 #include <pybind11/numpy.h>
 // #include <fmt/core.h>
 // #include <iostream>
@@ -100,5 +106,139 @@ py::array_t<uint64_t> np_array_timestamp(daqdataformats::Fragment const& frag){
   return np_array_timestamp_data(frag.get_data(), get_n_frames(frag));
 }
 
+/**
+ * @brief Median of the values in [first, last), rounded half to even like numpy.rint. Counts
+ * the values in a histogram spanning their range, or partitions a copy of them (in scratch)
+ * when the range is wider than the number of values, like rawdatautils.analysis.quantiles.adc_median
+ */
+int32_t block_pedestal(const int32_t* first, const int32_t* last, std::vector<int32_t>& scratch){
+  size_t n = last - first;
+  int32_t min = *first, max = *first;
+  for (auto v = first; v != last; ++v) {
+    min = std::min(min, *v);
+    max = std::max(max, *v);
+  }
+  size_t range = max - min + 1;
+  int32_t lower, upper;
+  if (range <= n) {
+    scratch.assign(range, 0);
+    for (auto v = first; v != last; ++v)
+      ++scratch[*v - min];
+    // values of rank (n-1)/2 and n/2
+    size_t k_lower = (n-1)/2, k_upper = n/2, count = 0, i = 0;
+    for (; count + scratch[i] <= k_lower; ++i)
+      count += scratch[i];
+    lower = min + i;
+    for (; count + scratch[i] <= k_upper; ++i)
+      count += scratch[i];
+    upper = min + i;
+  } else {
+    scratch.assign(first, last);
+    auto mid = scratch.begin() + n/2;
+    std::nth_element(scratch.begin(), mid, scratch.end());
+    upper = *mid;
+    lower = (n % 2 == 1) ? upper : *std::max_element(scratch.begin(), mid);
+  }
+  if (lower == upper)
+    return lower;
+  return static_cast<int32_t>(std::nearbyint(0.5 * (static_cast<double>(lower) + upper)));
+}
+
+/**
+ * @brief Software hit finding on data containing WIBEthFrames, one TriggerPrimitiveRecord per hit.
+ * The pedestal of each channel is the median of consecutive blocks of pedestal_window samples
+ * (the last block absorbing a shorter remainder); a hit is a run of samples more than
+ * thresholds[channel] above it. The channel field holds the WIB channel (0-63), the flag is 1 for
+ * hits cut by the end of the data. Hits are ordered by channel then time.
+ * Same algorithm as rawdatautils.analysis.hit_finder.HitFinder.find_hits.
+ * Warning: It doesn't check that n_frames is a sensible value (can read out of bounds)
+ */
+py::array_t<TriggerPrimitiveRecord> np_array_hits_data(void* data, uint32_t n_frames, py::array_t<int32_t, py::array::c_style | py::array::forcecast> thresholds, uint32_t pedestal_window){
+
+  const size_t n_ch = fddetdataformats::WIBEthFrame::s_num_channels;
+  const size_t n_smpl = fddetdataformats::WIBEthFrame::s_time_samples_per_frame;
+  const size_t n_samples = n_smpl * n_frames;
+
+  if (thresholds.size() != 1 && static_cast<size_t>(thresholds.size()) != n_ch)
+    throw std::invalid_argument("thresholds must have 1 or 64 values");
+  if (pedestal_window == 0)
+    throw std::invalid_argument("pedestal_window must be positive");
+  auto thr = thresholds.data();
+
+  if (n_samples == 0)
+    return py::array_t<TriggerPrimitiveRecord>(0);
+
+  // channel-major copy of the ADCs, so that each channel is scanned contiguously
+  std::vector<int32_t> adcs(n_ch * n_samples);
+  std::vector<uint64_t> timestamps(n_samples);
+  for (size_t i=0; i<n_frames; ++i) {
+    auto fr = reinterpret_cast<fddetdataformats::WIBEthFrame*>(
+      static_cast<char*>(data) + i * sizeof(fddetdataformats::WIBEthFrame)
+    );
+    uint64_t ts_0 = fr->get_timestamp();
+    for (size_t j=0; j<n_smpl; ++j)
+      timestamps[i*n_smpl+j] = ts_0+32*j;
+    // the frame stays in cache while it is read per channel; the writes are contiguous
+    for (size_t k=0; k<n_ch; ++k) {
+      int32_t* ch_adcs = adcs.data() + k*n_samples + i*n_smpl;
+      for (size_t j=0; j<n_smpl; ++j)
+        ch_adcs[j] = fr->get_adc(k, j);
+    }
+  }
+
+  const size_t n_blocks = std::max<size_t>(n_samples / pedestal_window, 1);
+  std::vector<int32_t> scratch;
+  std::vector<int32_t> signal(n_samples);
+  std::vector<TriggerPrimitiveRecord> hits;
+
+  for (size_t k=0; k<n_ch; ++k) {
+    const int32_t* ch_adcs = adcs.data() + k*n_samples;
+    const int32_t threshold = thr[thresholds.size() == 1 ? 0 : k];
+
+    for (size_t b=0; b<n_blocks; ++b) {
+      size_t first = b * pedestal_window;
+      size_t last = (b == n_blocks-1) ? n_samples : first + pedestal_window;
+      int32_t pedestal = block_pedestal(ch_adcs + first, ch_adcs + last, scratch);
+      for (size_t s=first; s<last; ++s)
+        signal[s] = ch_adcs[s] - pedestal;
+    }
+
+    size_t s = 0;
+    while (s < n_samples) {
+      if (signal[s] <= threshold) {
+        ++s;
+        continue;
+      }
+      TriggerPrimitiveRecord hit{};
+      size_t start = s;
+      size_t peak = s;
+      int64_t integral = 0;
+      for (; s<n_samples && signal[s] > threshold; ++s) {
+        integral += signal[s];
+        if (signal[s] > signal[peak])
+          peak = s;
+      }
+      hit.time_start = timestamps[start];
+      hit.time_peak = timestamps[peak];
+      hit.time_over_threshold = 32 * (s - start);
+      hit.channel = k;
+      hit.adc_integral = static_cast<uint32_t>(integral);
+      hit.adc_peak = static_cast<uint16_t>(signal[peak]);
+      hit.flag = (s == n_samples) ? 1 : 0;
+      hits.push_back(hit);
+    }
+  }
+
+  py::array_t<TriggerPrimitiveRecord> result(hits.size());
+  std::copy(hits.begin(), hits.end(), static_cast<TriggerPrimitiveRecord*>(result.request().ptr));
+  return result;
+}
+
+/**
+ * @brief Software hit finding on a Fragment containing WIBEthFrames, see np_array_hits_data
+ */
+py::array_t<TriggerPrimitiveRecord> np_array_hits(daqdataformats::Fragment const& frag, py::array_t<int32_t, py::array::c_style | py::array::forcecast> thresholds, uint32_t pedestal_window){
+  return np_array_hits_data(frag.get_data(), get_n_frames(frag), thresholds, pedestal_window);
+}
 
 } // namespace dunedaq::rawdatautils::wibeth // NOLINT
@@ -0,0 +1,124 @@
+/**
+ * @file analysis.cpp Python bindings for analysis kernels running on packed frames
+ *
+ * This is part of the DUNE DAQ Software Suite, copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+#include "rawdatautils/FrameAnalysis.hpp"
+
+#include "fddetdataformats/WIB2Frame.hpp"
+#include "fddetdataformats/WIBEthFrame.hpp"
+#include "daqdataformats/Fragment.hpp"
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+#include <string>
+
+namespace py = pybind11;
+
+namespace dunedaq {
+namespace rawdatautils {
+
+namespace analysis {
+namespace python {
+
+template<typename Frame>
+size_t
+get_n_frames(daqdataformats::Fragment const& frag)
+{
+  return (frag.get_size() - sizeof(daqdataformats::FragmentHeader)) / sizeof(Frame);
+}
+
+template<typename T>
+py::array_t<T>
+to_np_array(std::vector<T> const& v)
+{
+  return py::array_t<T>(v.size(), v.data());
+}
+
+template<typename Frame>
+py::dict
+adc_stats_data(void* data, uint32_t n_frames)
+{
+  auto stats = compute_channel_stats(static_cast<const Frame*>(data), n_frames);
+  size_t n_ch = FrameLayout<Frame>::s_num_channels;
+  py::array_t<double> mean(n_ch), rms(n_ch);
+  auto ptr_mean = mean.mutable_data();
+  auto ptr_rms = rms.mutable_data();
+  for (size_t ch = 0; ch < n_ch; ++ch) {
+    ptr_mean[ch] = stats.mean(ch);
+    ptr_rms[ch] = stats.rms(ch);
+  }
+  py::dict result;
+  result["n_samples"] = stats.n_samples;
+  result["mean"] = mean;
+  result["rms"] = rms;
+  result["min"] = to_np_array(stats.min);
+  result["max"] = to_np_array(stats.max);
+  result["n_stuck"] = to_np_array(stats.n_stuck);
+  return result;
+}
+
+/**
+ * @brief Registers the kernels of one frame type in its submodule (analysis.wib2, analysis.wibeth)
+ */
+template<typename Frame>
+void
+register_frame_analysis(py::module& m)
+{
+  using Accumulator = FFTPowerAccumulator<Frame>;
+
+  m.def("adc_stats", [](daqdataformats::Fragment const& frag) {
+    return adc_stats_data<Frame>(frag.get_data(), get_n_frames<Frame>(frag)); },
+    "Per-channel n_samples, mean (pedestal), rms, min, max and n_stuck of a Fragment, without unpacking it");
+  m.def("adc_stats_data", &adc_stats_data<Frame>, py::arg("data"), py::arg("n_frames"));
+
+  m.def("stuck_code_counts", [](daqdataformats::Fragment const& frag) {
+    return to_np_array(count_stuck_codes(static_cast<const Frame*>(frag.get_data()), get_n_frames<Frame>(frag))); },
+    "Per-channel number of samples with the 6 least significant bits all 0 or all 1");
+  m.def("stuck_code_counts_data", [](void* data, uint32_t n_frames) {
+    return to_np_array(count_stuck_codes(static_cast<const Frame*>(data), n_frames)); },
+    py::arg("data"), py::arg("n_frames"));
+
+  py::class_<Accumulator>(m, "FFTPowerAccumulator",
+                          "Per-channel |FFT|^2 summed over segments of n_fft samples (power of two), mean removed")
+    .def(py::init<size_t>(), py::arg("n_fft") = 1024)
+    .def("add", [](Accumulator& acc, daqdataformats::Fragment const& frag) {
+      acc.add_frames(static_cast<const Frame*>(frag.get_data()), get_n_frames<Frame>(frag)); })
+    .def("add_data", [](Accumulator& acc, void* data, uint32_t n_frames) {
+      acc.add_frames(static_cast<const Frame*>(data), n_frames); }, py::arg("data"), py::arg("n_frames"))
+    .def("power_sum", [](Accumulator const& acc) {
+      py::array_t<double> result(acc.get_power_sum().size(), acc.get_power_sum().data());
+      result.resize({ acc.get_n_channels(), acc.get_n_bins() });
+      return result; })
+    .def("mean_power", [](Accumulator const& acc) {
+      py::array_t<double> result(acc.get_power_sum().size(), acc.get_power_sum().data());
+      auto ptr = result.mutable_data();
+      for (size_t i = 0; i < acc.get_power_sum().size(); ++i)
+        ptr[i] /= acc.get_n_segments() > 0 ? acc.get_n_segments() : 1;
+      result.resize({ acc.get_n_channels(), acc.get_n_bins() });
+      return result; })
+    .def("frequencies", [](Accumulator const& acc) { return to_np_array(acc.get_frequencies()); })
+    .def("get_n_fft", &Accumulator::get_n_fft)
+    .def("get_n_segments", &Accumulator::get_n_segments)
+    .def("reset", &Accumulator::reset);
+}
+
+void
+register_analysis(py::module& m)
+{
+  py::module_ wib2_module = m.def_submodule("wib2");
+  register_frame_analysis<fddetdataformats::WIB2Frame>(wib2_module);
+
+  py::module_ wibeth_module = m.def_submodule("wibeth");
+  register_frame_analysis<fddetdataformats::WIBEthFrame>(wibeth_module);
+}
+
+} // namespace python
+} // namespace analysis
+} // namespace rawdatautils
+} // namespace dunedaq
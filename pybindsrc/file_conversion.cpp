@@ -26,12 +26,22 @@ namespace python {
 void
 register_file_conversion(py::module& m)
 {
-  m.def("wib_hdf5_to_wib2_binary", &wib_hdf5_to_wib2_binary);
-  m.def("wib_binary_to_wib2_binary", &wib_binary_to_wib2_binary);
-  m.def("wib_hdf5_to_wibeth_binary", &wib_hdf5_to_wibeth_binary);
-  m.def("wib_binary_to_wibeth_binary", &wib_binary_to_wibeth_binary);
-  m.def("wib_hdf5_to_tde_binary", &wib_hdf5_to_tde_binary);
-  m.def("wib_binary_to_tde_binary", &wib_binary_to_tde_binary);
+  m.def("wib_hdf5_to_wib2_binary", &wib_hdf5_to_wib2_binary,
+        py::arg("filename"), py::arg("output"), py::arg("links") = std::vector<int>(),
+        py::arg("first_record") = 0, py::arg("n_records") = 0);
+  m.def("wib_binary_to_wib2_binary", &wib_binary_to_wib2_binary,
+        py::arg("filename"), py::arg("output"), py::arg("chunk_frames") = s_default_chunk_frames);
+  m.def("wib_hdf5_to_wibeth_binary", &wib_hdf5_to_wibeth_binary,
+        py::arg("filename"), py::arg("output"), py::arg("links") = std::vector<int>(),
+        py::arg("first_record") = 0, py::arg("n_records") = 0);
+  m.def("wib_binary_to_wibeth_binary", &wib_binary_to_wibeth_binary,
+        py::arg("filename"), py::arg("output"), py::arg("chunk_frames") = s_default_chunk_frames);
+  m.def("wib_hdf5_to_tde_binary", &wib_hdf5_to_tde_binary,
+        py::arg("filename"), py::arg("output"), py::arg("links") = std::vector<int>(),
+        py::arg("first_record") = 0, py::arg("n_records") = 0, py::arg("starting_channel") = 0);
+  m.def("wib_binary_to_tde_binary", &wib_binary_to_tde_binary,
+        py::arg("filename"), py::arg("output"), py::arg("chunk_frames") = s_default_chunk_frames,
+        py::arg("starting_channel") = 0);
 }
 
 } // namespace python
@@ -27,6 +27,12 @@ extern void register_file_conversion(py::module &);
 }
 }
 
+namespace analysis{
+namespace python {
+extern void register_analysis(py::module &);
+}
+}
+
 namespace python {
 
 PYBIND11_MODULE(_daq_rawdatautils_py, m) {
@@ -39,6 +45,9 @@ PYBIND11_MODULE(_daq_rawdatautils_py, m) {
     py::module_ fc_module = m.def_submodule("file_conversion");
     fc::python::register_file_conversion(fc_module);
 
+    py::module_ analysis_module = m.def_submodule("analysis");
+    analysis::python::register_analysis(analysis_module);
+
 }
 
 } // namespace python
@@ -13,6 +13,7 @@
 #include "fddetdataformats/TDE16Frame.hpp"
 #include "fddetdataformats/CRTFrame.hpp"
 #include "daqdataformats/Fragment.hpp"
+#include "rawdatautils/TriggerPrimitiveRecord.hpp"
 
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
@@ -20,6 +21,9 @@
 
 #include <fmt/core.h>
 
+#include <limits>
+#include <stdexcept>
+
 namespace py = pybind11;
 
 namespace dunedaq {
@@ -57,6 +61,8 @@ namespace wibeth {
   extern py::array_t<uint16_t> np_array_adc_data(void* data, uint32_t n_frames);
   extern py::array_t<uint64_t> np_array_timestamp(daqdataformats::Fragment const& frag);
   extern py::array_t<uint64_t> np_array_timestamp_data(void* data, uint32_t n_frames);
+  extern py::array_t<TriggerPrimitiveRecord> np_array_hits(daqdataformats::Fragment const& frag, py::array_t<int32_t, py::array::c_style | py::array::forcecast> thresholds, uint32_t pedestal_window);
+  extern py::array_t<TriggerPrimitiveRecord> np_array_hits_data(void* data, uint32_t n_frames, py::array_t<int32_t, py::array::c_style | py::array::forcecast> thresholds, uint32_t pedestal_window);
 }
 
 
@@ -82,12 +88,22 @@ namespace daphne {
 
 namespace tde {
   extern uint32_t get_n_frames(daqdataformats::Fragment const& frag);
-  extern py::array_t<uint64_t> np_array_timestamp(daqdataformats::Fragment const& frag);
+  extern py::array_t<uint16_t> np_array_adc(daqdataformats::Fragment const& frag);
+  extern py::array_t<uint16_t> np_array_adc_data(void* data, uint32_t n_frames);
   extern py::array_t<uint64_t> np_array_timestamp_data(daqdataformats::Fragment const& frag);
+  extern py::array_t<uint64_t> np_array_timestamp_data(void* data, uint32_t n_frames);
   extern py::array_t<uint64_t> np_array_channel_data(daqdataformats::Fragment const& frag);
+  extern py::array_t<uint64_t> np_array_channel_data(void* data, uint32_t n_frames);
 
 }
 
+namespace tp {
+  extern uint32_t get_n_tps(daqdataformats::Fragment const& frag);
+  extern py::array_t<TriggerPrimitiveRecord> np_array_tp(daqdataformats::Fragment const& frag);
+  extern py::array_t<TriggerPrimitiveRecord> np_array_tp_data(void* data, uint32_t n_tps);
+  extern py::dtype tp_dtype();
+}
+
 namespace crt {
   extern uint32_t get_n_frames(daqdataformats::Fragment const& frag);
   extern py::array_t<int16_t> np_array_adc(daqdataformats::Fragment& frag);
@@ -100,6 +116,38 @@ namespace crt {
   extern py::array_t<uint16_t> np_array_modules_data(void* data, int nframes);
 }
 
+/**
+ * @brief Pointer to the data of a buffer (e.g. a numpy memmap of a binary frame file) holding at
+ * least n_frames Frames. Throws if the buffer is not contiguous or too small, so the *_data
+ * unpackers can be given buffers from python without reading out of bounds.
+ */
+template<typename Frame>
+void* get_frames_ptr(py::buffer const& buffer, int64_t n_frames) {
+  py::buffer_info info = buffer.request();
+  py::ssize_t expected_stride = info.itemsize;
+  for (py::ssize_t i = info.ndim - 1; i >= 0; --i) {
+    if (info.shape[i] > 1 && info.strides[i] != expected_stride)
+      throw std::invalid_argument("Buffer is not C-contiguous");
+    expected_stride *= info.shape[i];
+  }
+  size_t buffer_size = info.size * info.itemsize;
+  if (n_frames < 0 || static_cast<size_t>(n_frames) * sizeof(Frame) > buffer_size)
+    throw std::out_of_range(fmt::format("Buffer of {} bytes does not hold {} frames of {} bytes",
+                                        buffer_size, n_frames, sizeof(Frame)));
+  return info.ptr;
+}
+
+/**
+ * @brief n_frames (int64_t in all the buffer overloads) converted to the frame count type of an
+ * unpacker, throwing instead of wrapping around when it does not fit.
+ */
+template<typename Count>
+Count narrow_n_frames(int64_t n_frames) {
+  if (n_frames < 0 || static_cast<uint64_t>(n_frames) > static_cast<uint64_t>(std::numeric_limits<Count>::max()))
+    throw std::out_of_range(fmt::format("{} frames is out of range for this unpacker", n_frames));
+  return static_cast<Count>(n_frames);
+}
+
 namespace unpack {
 namespace python {
 
@@ -113,6 +161,10 @@ register_unpack(py::module& m) {
   wib_module.def("np_array_timestamp", &wib::np_array_timestamp);
   wib_module.def("np_array_adc_data", &wib::np_array_adc_data);
   wib_module.def("np_array_timestamp_data", &wib::np_array_timestamp_data);
+  wib_module.def("np_array_adc_data", [](py::buffer const& b, int64_t n_frames) {
+    return wib::np_array_adc_data(get_frames_ptr<fddetdataformats::WIBFrame>(b, n_frames), narrow_n_frames<int>(n_frames)); });
+  wib_module.def("np_array_timestamp_data", [](py::buffer const& b, int64_t n_frames) {
+    return wib::np_array_timestamp_data(get_frames_ptr<fddetdataformats::WIBFrame>(b, n_frames), narrow_n_frames<int>(n_frames)); });
 
   py::module_ wib2_module = m.def_submodule("wib2");
   wib2_module.def("get_n_frames", &wib2::get_n_frames);
@@ -120,6 +172,10 @@ register_unpack(py::module& m) {
   wib2_module.def("np_array_timestamp", &wib2::np_array_timestamp);
   wib2_module.def("np_array_adc_data", &wib2::np_array_adc_data);
   wib2_module.def("np_array_timestamp_data", &wib2::np_array_timestamp_data);
+  wib2_module.def("np_array_adc_data", [](py::buffer const& b, int64_t n_frames) {
+    return wib2::np_array_adc_data(get_frames_ptr<fddetdataformats::WIB2Frame>(b, n_frames), narrow_n_frames<int>(n_frames)); });
+  wib2_module.def("np_array_timestamp_data", [](py::buffer const& b, int64_t n_frames) {
+    return wib2::np_array_timestamp_data(get_frames_ptr<fddetdataformats::WIB2Frame>(b, n_frames), narrow_n_frames<int>(n_frames)); });
 
   py::module_ wibeth_module = m.def_submodule("wibeth");
   wibeth_module.def("get_n_frames", &wibeth::get_n_frames);
@@ -127,6 +183,14 @@ register_unpack(py::module& m) {
   wibeth_module.def("np_array_timestamp", &wibeth::np_array_timestamp);
   wibeth_module.def("np_array_adc_data", &wibeth::np_array_adc_data);
   wibeth_module.def("np_array_timestamp_data", &wibeth::np_array_timestamp_data);
+  wibeth_module.def("np_array_adc_data", [](py::buffer const& b, int64_t n_frames) {
+    return wibeth::np_array_adc_data(get_frames_ptr<fddetdataformats::WIBEthFrame>(b, n_frames), narrow_n_frames<uint32_t>(n_frames)); });
+  wibeth_module.def("np_array_timestamp_data", [](py::buffer const& b, int64_t n_frames) {
+    return wibeth::np_array_timestamp_data(get_frames_ptr<fddetdataformats::WIBEthFrame>(b, n_frames), narrow_n_frames<uint32_t>(n_frames)); });
+  wibeth_module.def("np_array_hits", &wibeth::np_array_hits,
+                    py::arg("frag"), py::arg("thresholds"), py::arg("pedestal_window") = 1024);
+  wibeth_module.def("np_array_hits_data", &wibeth::np_array_hits_data,
+                    py::arg("data"), py::arg("n_frames"), py::arg("thresholds"), py::arg("pedestal_window") = 1024);
 
   py::module_ daphne_module = m.def_submodule("daphne");
   daphne_module.def("get_n_frames", &daphne::get_n_frames);
@@ -147,8 +211,18 @@ register_unpack(py::module& m) {
 
   py::module_ tde_module = m.def_submodule("tde");
   tde_module.def("get_n_frames", &tde::get_n_frames);
-  tde_module.def("np_array_timestamp_data", &tde::np_array_timestamp_data);
-  tde_module.def("np_array_channel_data", &tde::np_array_channel_data);
+  tde_module.def("np_array_adc", &tde::np_array_adc);
+  tde_module.def("np_array_timestamp_data", py::overload_cast<daqdataformats::Fragment const&>(&tde::np_array_timestamp_data));
+  tde_module.def("np_array_channel_data", py::overload_cast<daqdataformats::Fragment const&>(&tde::np_array_channel_data));
+  tde_module.def("np_array_adc_data", &tde::np_array_adc_data);
+  tde_module.def("np_array_timestamp_data", py::overload_cast<void*, uint32_t>(&tde::np_array_timestamp_data));
+  tde_module.def("np_array_channel_data", py::overload_cast<void*, uint32_t>(&tde::np_array_channel_data));
+  tde_module.def("np_array_adc_data", [](py::buffer const& b, int64_t n_frames) {
+    return tde::np_array_adc_data(get_frames_ptr<fddetdataformats::TDE16Frame>(b, n_frames), narrow_n_frames<uint32_t>(n_frames)); });
+  tde_module.def("np_array_timestamp_data", [](py::buffer const& b, int64_t n_frames) {
+    return tde::np_array_timestamp_data(get_frames_ptr<fddetdataformats::TDE16Frame>(b, n_frames), narrow_n_frames<uint32_t>(n_frames)); });
+  tde_module.def("np_array_channel_data", [](py::buffer const& b, int64_t n_frames) {
+    return tde::np_array_channel_data(get_frames_ptr<fddetdataformats::TDE16Frame>(b, n_frames), narrow_n_frames<uint32_t>(n_frames)); });
 
   py::module_ crt_module = m.def_submodule("crt");
   crt_module.def("get_n_frames", &crt::get_n_frames);
@@ -160,6 +234,14 @@ register_unpack(py::module& m) {
   crt_module.def("np_array_adc_data", &crt::np_array_adc_data);
   crt_module.def("np_array_timestamp_data", &crt::np_array_timestamp_data);  
   crt_module.def("np_array_channel_data", &crt::np_array_channel_data);
+
+  PYBIND11_NUMPY_DTYPE(TriggerPrimitiveRecord, time_start, time_peak, time_over_threshold, channel,
+                       adc_integral, type, algorithm, adc_peak, detid, flag);
+  py::module_ tp_module = m.def_submodule("tp");
+  tp_module.def("get_n_tps", &tp::get_n_tps);
+  tp_module.def("np_array_tp", &tp::np_array_tp);
+  tp_module.def("np_array_tp_data", &tp::np_array_tp_data);
+  tp_module.def("tp_dtype", &tp::tp_dtype);
 }
 
 } // namespace python
@@ -0,0 +1,140 @@
+#general imports
+import numpy as np
+
+class ChannelStatsAccumulator:
+    """
+    Run-level per-channel mean, variance, min and max in constant memory.
+
+    Each fragment's per-channel statistics are merged in with the parallel
+    (Chan et al.) form of Welford's update, vectorized over channels. Channel
+    keys can be any hashable (offline channel numbers for TPC data).
+    Accumulators from different processes can be combined with merge(), or
+    saved/loaded with save()/load().
+    """
+
+    def __init__(self,initial_size=64):
+        self.channel_rows = {}
+        self.keys = []
+        self.n = np.zeros(initial_size,dtype=np.int64)
+        self.mean = np.zeros(initial_size,dtype=np.float64)
+        self.m2 = np.zeros(initial_size,dtype=np.float64)
+        self.min = np.full(initial_size,np.inf)
+        self.max = np.full(initial_size,-np.inf)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def grow(self,size):
+        old = self.n.shape[0]
+        if size <= old:
+            return
+        size = max(size,2*old)
+        self.n = np.concatenate((self.n, np.zeros(size-old,dtype=np.int64)))
+        self.mean = np.concatenate((self.mean, np.zeros(size-old)))
+        self.m2 = np.concatenate((self.m2, np.zeros(size-old)))
+        self.min = np.concatenate((self.min, np.full(size-old,np.inf)))
+        self.max = np.concatenate((self.max, np.full(size-old,-np.inf)))
+
+    def get_rows(self,channels):
+        rows = np.empty(len(channels),dtype=np.int64)
+        for i,ch in enumerate(channels):
+            row = self.channel_rows.get(ch)
+            if row is None:
+                row = len(self.keys)
+                self.channel_rows[ch] = row
+                self.keys.append(ch)
+            rows[i] = row
+        self.grow(len(self.keys))
+        return rows
+
+    def merge_rows(self,rows,n,mean,m2,vmin,vmax):
+        #rows must be unique here; vectorized parallel Welford merge
+        n_a = self.n[rows]
+        n_tot = n_a + n
+        valid = n_tot>0
+        delta = mean - self.mean[rows]
+        frac = np.divide(n, n_tot, out=np.zeros(len(rows)), where=valid)
+        self.mean[rows] += delta*frac
+        self.m2[rows] += m2 + delta*delta*n_a*frac
+        self.n[rows] = n_tot
+        self.min[rows] = np.minimum(self.min[rows],vmin)
+        self.max[rows] = np.maximum(self.max[rows],vmax)
+
+    def accumulate_stats(self,channels,n,mean,var,vmin,vmax):
+        #merge already-computed per-channel statistics of one batch (var with ddof=0)
+        rows = self.get_rows(channels)
+        n = np.broadcast_to(np.asarray(n,dtype=np.int64),rows.shape)
+        mean = np.asarray(mean,dtype=np.float64)
+        m2 = np.asarray(var,dtype=np.float64)*n
+        vmin = np.asarray(vmin,dtype=np.float64)
+        vmax = np.asarray(vmax,dtype=np.float64)
+        if len(np.unique(rows))==len(rows):
+            self.merge_rows(rows,n,mean,m2,vmin,vmax)
+        else:
+            for i in range(len(rows)):
+                self.merge_rows(rows[i:i+1],n[i:i+1],mean[i:i+1],m2[i:i+1],vmin[i:i+1],vmax[i:i+1])
+
+    def accumulate(self,adcs,channels):
+        #adcs: (n_samples, n_channels)
+        adcs = np.asarray(adcs)
+        if adcs.shape[0]==0:
+            return
+        self.accumulate_stats(channels, adcs.shape[0],
+                              np.mean(adcs,axis=0), np.var(adcs,axis=0),
+                              np.min(adcs,axis=0), np.max(adcs,axis=0))
+
+    def merge(self,other):
+        n_keys = len(other.keys)
+        if n_keys==0:
+            return self
+        self.accumulate_stats(other.keys, other.n[:n_keys], other.mean[:n_keys],
+                              other.variance(), other.min[:n_keys], other.max[:n_keys])
+        return self
+
+    def variance(self,ddof=0):
+        n_keys = len(self.keys)
+        denom = self.n[:n_keys]-ddof
+        return np.divide(self.m2[:n_keys], denom, out=np.full(n_keys,np.nan), where=denom>0)
+
+    def rms(self,ddof=0):
+        return np.sqrt(self.variance(ddof))
+
+    def results(self):
+        n_keys = len(self.keys)
+        return { "channel": list(self.keys),
+                 "n": self.n[:n_keys].copy(),
+                 "mean": self.mean[:n_keys].copy(),
+                 "rms": self.rms(),
+                 "min": self.min[:n_keys].copy(),
+                 "max": self.max[:n_keys].copy() }
+
+    def to_dict(self):
+        n_keys = len(self.keys)
+        return { "keys": np.array(self.keys),
+                 "n": self.n[:n_keys].copy(),
+                 "mean": self.mean[:n_keys].copy(),
+                 "m2": self.m2[:n_keys].copy(),
+                 "min": self.min[:n_keys].copy(),
+                 "max": self.max[:n_keys].copy() }
+
+    @classmethod
+    def from_dict(cls,d):
+        keys = np.asarray(d["keys"])
+        #multi-component keys (e.g. (src_id, channel)) are stored as rows
+        keys = [ tuple(k.tolist()) for k in keys ] if keys.ndim==2 else keys.tolist()
+        acc = cls(initial_size=max(1,len(keys)))
+        rows = acc.get_rows(keys)
+        acc.n[rows] = d["n"]
+        acc.mean[rows] = d["mean"]
+        acc.m2[rows] = d["m2"]
+        acc.min[rows] = d["min"]
+        acc.max[rows] = d["max"]
+        return acc
+
+    def save(self,filename):
+        np.savez(filename,**self.to_dict())
+
+    @classmethod
+    def load(cls,filename):
+        with np.load(filename) as f:
+            return cls.from_dict(f)
@@ -0,0 +1,59 @@
+#general imports
+import numpy as np
+
+def coherent_group_ids(planes,groups=None):
+    #combine per-channel plane and (optional) group labels, e.g. FEMB, into dense ids 0..n_groups-1
+    planes = np.asarray(planes)
+    if groups is None:
+        _, ids = np.unique(planes,return_inverse=True)
+    else:
+        keys = np.stack((planes.astype(np.int64),np.asarray(groups).astype(np.int64)),axis=1)
+        _, ids = np.unique(keys,axis=0,return_inverse=True)
+    return ids.reshape(-1)
+
+def contiguous_slice(cols):
+    #slice equivalent of a sorted index array, if there is one (keeps views instead of copies)
+    if len(cols)>0 and cols[-1]-cols[0]+1==len(cols):
+        return slice(int(cols[0]),int(cols[-1])+1)
+    return cols
+
+def remove_coherent_noise(adcs,planes,groups=None,method="median",in_place=False):
+    """
+    Subtract the per-time-sample common mode of each (plane, group) of channels.
+
+    adcs is (n_samples, n_channels), e.g. all links of a record stacked along
+    the channel axis, with planes/groups giving per-channel labels. The common
+    mode is the median (or mean) over the channels of a group at each sample.
+
+    The work is done in float32. With in_place=True and float32 input, adcs
+    itself is modified; otherwise one float32 copy is made. Returns the
+    subtracted array, the raw RMS and the coherent-noise-removed RMS per channel.
+    """
+    if method not in ("median","mean"):
+        raise ValueError(f"Unknown common mode method {method}")
+
+    if in_place and isinstance(adcs,np.ndarray) and adcs.dtype==np.float32:
+        x = adcs
+    else:
+        x = np.array(adcs,dtype=np.float32)
+
+    raw_rms = x.std(axis=0)
+
+    ids = coherent_group_ids(planes,groups)
+    n_groups = int(ids.max())+1 if len(ids)>0 else 0
+
+    if method=="mean":
+        #group means of every sample at once, then one broadcast subtraction
+        order = np.argsort(ids,kind="stable")
+        counts = np.bincount(ids,minlength=n_groups)
+        starts = np.concatenate(([0],np.cumsum(counts)[:-1]))
+        common_mode = np.add.reduceat(x[:,order],starts,axis=1)
+        common_mode /= counts
+        x -= common_mode[:,ids]
+    else:
+        for i_group in range(n_groups):
+            cols = contiguous_slice(np.flatnonzero(ids==i_group))
+            common_mode = np.median(x[:,cols],axis=1)
+            x[:,cols] -= common_mode[:,None]
+
+    return x, raw_rms, x.std(axis=0)
@@ -0,0 +1,121 @@
+#general imports
+import numpy as np
+
+#unpacker imports
+import rawdatautils.unpack.wibeth
+
+#analysis imports
+import rawdatautils.analysis.quantiles
+from rawdatautils.analysis.trigger_primitives import TP_DTYPE
+
+#flag set on hits cut by the end of the data given to find_hits
+FLAG_TRUNCATED = 1
+
+class HitFinder:
+    """
+    Software emulation of TP generation on unpacked WIBEth ADCs
+    ((n_samples, n_channels), as from rawdatautils.unpack.wibeth.np_array_adc).
+
+    The pedestal of each channel is tracked as the median of consecutive
+    blocks of pedestal_window samples. A hit is a run of samples more than
+    threshold ADC above the pedestal; it gives one row of TP_DTYPE (the layout
+    of rawdatautils.unpack.tp.np_array_tp, i.e. the TriggerPrimitiveData
+    fields) with start/peak times, time over threshold, and the integral and
+    peak of the pedestal-subtracted signal. All steps are vectorized over
+    channels and samples.
+
+    find_hits_fragment runs the same algorithm in C++ directly on the frames
+    of a WIBEth fragment (rawdatautils.unpack.wibeth.np_array_hits), without
+    unpacking the ADCs to python.
+    """
+
+    SAMPLING_PERIOD = 32
+    ADC_BITS = 14
+
+    #trgdataformats TriggerPrimitive::Type::kTPC, Algorithm::kUnknown
+    TP_TYPE = 1
+    TP_ALGORITHM = 0
+
+    def __init__(self,threshold=20,pedestal_window=1024,detid=0):
+        #threshold in ADC counts above pedestal, a scalar or one value per channel
+        self.threshold = threshold
+        self.pedestal_window = int(pedestal_window)
+        self.detid = detid
+
+    def get_pedestals(self,adcs):
+        #(n_blocks, n_channels) pedestals, the last block absorbing a short remainder
+        n_samples = adcs.shape[0]
+        n_blocks = max(n_samples//self.pedestal_window,1)
+        bounds = [ i*self.pedestal_window for i in range(n_blocks) ] + [n_samples]
+        return np.array([ rawdatautils.analysis.quantiles.adc_median(adcs[b:e],axis=0,n_bits=self.ADC_BITS) for b, e in zip(bounds[:-1],bounds[1:]) ]), bounds
+
+    def subtract_pedestals(self,adcs):
+        #(n_channels, n_samples) int32 signal, channel-major so that hits are contiguous in memory
+        pedestals, bounds = self.get_pedestals(adcs)
+        signal = np.ascontiguousarray(adcs.T,dtype=np.int32)
+        for i, (b, e) in enumerate(zip(bounds[:-1],bounds[1:])):
+            signal[:,b:e] -= np.rint(pedestals[i]).astype(np.int32)[:,None]
+        return signal
+
+    def find_hits(self,adcs,timestamps,channels):
+        """
+        adcs: (n_samples, n_channels), timestamps: (n_samples,) in DTS ticks,
+        channels: (n_channels,) offline channels. Returns a TP_DTYPE array
+        sorted by channel then time_start.
+        """
+        adcs = np.asarray(adcs)
+        timestamps = np.asarray(timestamps)
+        channels = np.asarray(channels)
+        n_samples, n_channels = adcs.shape
+        if n_samples==0:
+            return np.zeros(0,dtype=TP_DTYPE)
+
+        signal = self.subtract_pedestals(adcs)
+        threshold = np.broadcast_to(np.asarray(self.threshold),(n_channels,))
+        above = np.zeros((n_channels,n_samples+2),dtype=bool)
+        above[:,1:-1] = signal > threshold[:,None]
+
+        #threshold crossings alternate start, end, start, ... in (channel, sample) order
+        edges = np.flatnonzero(above[:,1:]!=above[:,:-1])
+        hit_ch, hit_start = np.divmod(edges[0::2],n_samples+1)
+        hit_end = edges[1::2] - hit_ch*(n_samples+1)
+        n_hits = len(hit_ch)
+        tps = np.zeros(n_hits,dtype=TP_DTYPE)
+        if n_hits==0:
+            return tps
+
+        #gather the samples of all hits into one flat array, hits contiguous
+        lengths = hit_end - hit_start
+        seg_starts = np.zeros(n_hits,dtype=np.int64)
+        np.cumsum(lengths[:-1],out=seg_starts[1:])
+        hit_of_sample = np.repeat(np.arange(n_hits),lengths)
+        sample_idx = np.repeat(hit_start - seg_starts,lengths) + np.arange(len(hit_of_sample))
+        values = signal[hit_ch[hit_of_sample],sample_idx]
+
+        peaks = np.maximum.reduceat(values,seg_starts)
+        #first sample at the peak value of each hit
+        at_peak = np.flatnonzero(values==peaks[hit_of_sample])
+        _, first_at_peak = np.unique(hit_of_sample[at_peak],return_index=True)
+        peak_idx = sample_idx[at_peak[first_at_peak]]
+
+        timestamps = timestamps.astype(np.uint64)
+        tps["time_start"] = timestamps[hit_start]
+        tps["time_peak"] = timestamps[peak_idx]
+        tps["time_over_threshold"] = lengths*self.SAMPLING_PERIOD
+        tps["channel"] = channels[hit_ch]
+        tps["adc_integral"] = np.add.reduceat(values.astype(np.int64),seg_starts)
+        tps["adc_peak"] = peaks
+        tps["detid"] = self.detid
+        tps["type"] = self.TP_TYPE
+        tps["algorithm"] = self.TP_ALGORITHM
+        tps["flag"] = np.where(hit_end==n_samples,FLAG_TRUNCATED,0)
+        return tps
+
+    def find_hits_fragment(self,frag,channels):
+        #channels: (64,) offline channels of the link, indexed by WIB channel
+        tps = rawdatautils.unpack.wibeth.np_array_hits(frag,np.atleast_1d(np.asarray(self.threshold,dtype=np.int32)),self.pedestal_window)
+        tps["channel"] = np.asarray(channels)[tps["channel"]]
+        tps["detid"] = self.detid
+        tps["type"] = self.TP_TYPE
+        tps["algorithm"] = self.TP_ALGORITHM
+        return tps
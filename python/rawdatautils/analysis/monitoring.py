@@ -0,0 +1,184 @@
+#general imports
+import os
+import time
+import numpy as np
+
+class FixedHistogram:
+    """
+    Histogram with fixed bin edges; counts[0] is the underflow (below edges[0])
+    and counts[-1] the overflow (at or above edges[-1]).
+    """
+
+    def __init__(self,edges):
+        self.edges = np.asarray(edges,dtype=np.float64)
+        self.counts = np.zeros(len(self.edges)+1,dtype=np.int64)
+
+    def fill(self,values,weights=None):
+        idx = np.searchsorted(self.edges,np.asarray(values,dtype=np.float64),side="right")
+        self.counts += np.bincount(idx,weights=weights,minlength=len(self.counts)).astype(np.int64)
+
+    def reset(self):
+        self.counts[:] = 0
+
+class RingBuffer:
+    """
+    The last length rows (n_columns values each) of a time series, in fixed memory.
+    """
+
+    def __init__(self,length,n_columns=1):
+        self.data = np.full((length,n_columns),np.nan)
+        self.n_appended = 0
+
+    def __len__(self):
+        return min(self.n_appended,len(self.data))
+
+    def append(self,row):
+        self.data[self.n_appended%len(self.data)] = row
+        self.n_appended += 1
+
+    def get(self):
+        #rows in the order they were appended, oldest first
+        length = len(self.data)
+        if self.n_appended <= length:
+            return self.data[:self.n_appended].copy()
+        i = self.n_appended%length
+        return np.concatenate((self.data[i:],self.data[:i]))
+
+#timestamps behind each sparse timestamp-diff entry of a header dataclass (one diff fewer than timestamps),
+#by dataclass name: WIBEth headers use per-sample timestamps, 64 per frame
+TIMESTAMPS_PER_FRAME = { "WIBEthHeaderData": 64,
+                         "WIBHeaderData": 1 }
+
+def get_timestamp_diffs(header):
+    #(diff values, counts) of a detector header dataclass, None if it has no timestamp diffs
+    if hasattr(header,"ts_diffs_vals"):
+        return np.asarray(header.ts_diffs_vals), np.asarray(header.ts_diffs_counts)
+    if hasattr(header,"timestamp_dts_diff_vals"):
+        n_diffs = header.n_frames*TIMESTAMPS_PER_FRAME.get(type(header).__name__,1) - 1
+        idx = np.asarray(header.timestamp_dts_diff_idx,dtype=np.int64)
+        if n_diffs<=0 or len(idx)==0:
+            return None
+        #run lengths of the sparse representation
+        counts = np.diff(np.append(idx,n_diffs))
+        return np.asarray(header.timestamp_dts_diff_vals), counts
+    return None
+
+class SourceMonitor:
+    #histograms, time series and error counters of one source ID
+
+    def __init__(self,n_points,adc_rms_edges,ts_diff_edges):
+        self.trend = RingBuffer(n_points,len(MonitoringAccumulator.TREND_COLUMNS))
+        self.adc_rms_hist = FixedHistogram(adc_rms_edges)
+        self.ts_diff_hist = FixedHistogram(ts_diff_edges)
+        self.error_bit_counts = np.zeros(32,dtype=np.int64)
+        self.n_fragments = 0
+        self.n_errors = 0
+
+class MonitoringAccumulator:
+    """
+    Online-monitoring accumulators per source ID, fed with the data dicts of
+    the Unpackers (get_all_data of one fragment), in memory that doesn't grow
+    with the length of the run:
+      - a time series of the last n_points fragments: trigger number, trigger
+        timestamp, mean of the channel ADC means and RMSs (NaN when the
+        fragment wasn't analysis-prescaled) and error flag (TREND_COLUMNS),
+      - fixed-bin histograms of the channel ADC RMSs and of the frame
+        timestamp differences,
+      - counts of fragments, fragments with error bits and of each error bit.
+
+    save_snapshot writes everything to an npz file atomically (write then
+    rename), so a display can reload it at any time.
+    """
+
+    TREND_COLUMNS = [ "trigger", "timestamp_dts", "adc_mean", "adc_rms", "error" ]
+
+    def __init__(self,n_points=1000,adc_rms_edges=None,ts_diff_edges=None):
+        self.n_points = n_points
+        self.adc_rms_edges = np.asarray(adc_rms_edges) if adc_rms_edges is not None else np.linspace(0,100,201)
+        #unit bins centred on the integer diffs 0..4095
+        self.ts_diff_edges = np.asarray(ts_diff_edges) if ts_diff_edges is not None else np.arange(4097)-0.5
+        self.sources = {}
+        self.n_updates = 0
+        self.last_snapshot_time = 0.
+
+    def get_source(self,src_id):
+        source = self.sources.get(src_id)
+        if source is None:
+            source = SourceMonitor(self.n_points,self.adc_rms_edges,self.ts_diff_edges)
+            self.sources[src_id] = source
+        return source
+
+    def add(self,data_dict):
+        frh_data = data_dict.get("frh")
+        if not frh_data:
+            return
+        frh = frh_data[0]
+        source = self.get_source(frh.src_id)
+        source.n_fragments += 1
+        if frh.error_bits!=0:
+            source.n_errors += 1
+            source.error_bit_counts += (int(frh.error_bits)>>np.arange(32))&1
+
+        adc_mean = np.nan
+        adc_rms = np.nan
+        for key, data in data_dict.items():
+            if key.startswith("detd_") and len(data)>0 and hasattr(data[0],"adc_rms"):
+                rms = np.array([ d.adc_rms for d in data ],dtype=np.float64)
+                adc_mean = np.mean([ d.adc_mean for d in data ])
+                adc_rms = np.mean(rms)
+                source.adc_rms_hist.fill(rms)
+            elif key.startswith("deth_"):
+                for header in data:
+                    diffs = get_timestamp_diffs(header)
+                    if diffs is not None:
+                        source.ts_diff_hist.fill(diffs[0],weights=diffs[1])
+
+        source.trend.append([ frh.trigger, frh.trigger_timestamp_dts, adc_mean, adc_rms, frh.error_bits!=0 ])
+        self.n_updates += 1
+
+    def error_rates(self):
+        #{src_id: (fraction of all fragments with error bits, fraction over the time series window)}
+        rates = {}
+        for src_id, source in self.sources.items():
+            trend = source.trend.get()
+            recent = float(np.mean(trend[:,4])) if len(trend)>0 else np.nan
+            rates[src_id] = (source.n_errors/source.n_fragments if source.n_fragments>0 else np.nan, recent)
+        return rates
+
+    def snapshot(self):
+        #flat dict of arrays, per-source entries named <src_id>/<quantity>
+        src_ids = sorted(self.sources)
+        snap = { "src_ids": np.array(src_ids,dtype=np.int64),
+                 "trend_columns": np.array(self.TREND_COLUMNS),
+                 "adc_rms_edges": self.adc_rms_edges,
+                 "ts_diff_edges": self.ts_diff_edges,
+                 "n_updates": self.n_updates,
+                 "snapshot_time": time.time() }
+        for src_id in src_ids:
+            source = self.sources[src_id]
+            snap[f"{src_id}/trend"] = source.trend.get()
+            snap[f"{src_id}/adc_rms_hist"] = source.adc_rms_hist.counts.copy()
+            snap[f"{src_id}/ts_diff_hist"] = source.ts_diff_hist.counts.copy()
+            snap[f"{src_id}/error_bit_counts"] = source.error_bit_counts.copy()
+            snap[f"{src_id}/n_fragments"] = source.n_fragments
+            snap[f"{src_id}/n_errors"] = source.n_errors
+        return snap
+
+    def save_snapshot(self,filename):
+        #write then rename so that readers never see a partial snapshot
+        tmp_name = filename + ".tmp"
+        with open(tmp_name,"wb") as f:
+            np.savez(f,**self.snapshot())
+        os.replace(tmp_name,filename)
+        self.last_snapshot_time = time.time()
+        return filename
+
+    def save_snapshot_if_due(self,filename,interval=5.):
+        #for calling after every record: saves at most every interval seconds
+        if time.time()-self.last_snapshot_time < interval:
+            return None
+        return self.save_snapshot(filename)
+
+def load_snapshot(filename):
+    with np.load(filename) as f:
+        return { k: f[k] for k in f.files }
@@ -0,0 +1,159 @@
+#general imports
+import numpy as np
+
+#DTS clock tick, in seconds
+DTS_TICK = 16e-9
+
+def make_window(name,n):
+    if name is None:
+        return np.ones(n,dtype=np.float32)
+    if name=="hann":
+        return np.hanning(n).astype(np.float32)
+    if name=="hamming":
+        return np.hamming(n).astype(np.float32)
+    if name=="blackman":
+        return np.blackman(n).astype(np.float32)
+    raise ValueError(f"Unknown window {name}")
+
+def add_rows(arr,rows,vals):
+    #fancy-index add; fall back to unbuffered add when rows repeat
+    if len(np.unique(rows))==len(rows):
+        arr[rows] += vals
+    else:
+        np.add.at(arr,rows,vals)
+
+class NoiseSpectrumAccumulator:
+    """
+    Run-level average noise power spectra, one per channel.
+
+    Waveforms (n_samples, n_channels) are split into Welch segments of
+    segment_length samples (default: the full waveform) with the given
+    fractional overlap, mean-subtracted, windowed and transformed in float32
+    as one batch over all channels given. Power spectral densities (ADC^2/Hz,
+    one-sided) are summed in place per channel key, so memory is one spectrum
+    per channel regardless of how many records are processed.
+
+    Channel keys can be any hashable (offline channel numbers for TPC data).
+    sampling_period is in DTS ticks; when left to None, the unpacker the
+    accumulator is passed to sets it to its own SAMPLING_PERIOD.
+    """
+
+    def __init__(self,segment_length=None,overlap=0.5,window="hann",sampling_period=None,channel_chunk=512):
+        self.segment_length = segment_length
+        self.overlap = overlap
+        self.window_name = window
+        self.sampling_period = sampling_period
+        self.channel_chunk = channel_chunk
+
+        self.window = None
+        self.scale = None
+
+        self.channel_rows = {}
+        self.keys = []
+        self.psd_sum = None
+        self.n_segments = None
+
+    def setup(self,n_samples):
+        if self.sampling_period is None:
+            raise ValueError("NoiseSpectrumAccumulator needs a sampling_period")
+        if self.segment_length is None:
+            self.segment_length = n_samples
+        n = self.segment_length
+        self.window = make_window(self.window_name,n)
+        fs = 1. / (self.sampling_period*DTS_TICK)
+        #one-sided density scaling: DC and Nyquist bins are not doubled
+        self.scale = np.full(n//2+1, 2./(fs*np.sum(self.window.astype(np.float64)**2)))
+        self.scale[0] /= 2.
+        if n%2==0:
+            self.scale[-1] /= 2.
+        self.psd_sum = np.zeros((64,n//2+1),dtype=np.float64)
+        self.n_segments = np.zeros(64,dtype=np.int64)
+
+    def frequencies(self):
+        return np.fft.rfftfreq(self.segment_length, d=self.sampling_period*DTS_TICK)
+
+    def get_rows(self,channels):
+        rows = np.empty(len(channels),dtype=np.int64)
+        for i,ch in enumerate(channels):
+            row = self.channel_rows.get(ch)
+            if row is None:
+                row = len(self.keys)
+                self.channel_rows[ch] = row
+                self.keys.append(ch)
+            rows[i] = row
+        if len(self.keys) > self.psd_sum.shape[0]:
+            new_size = max(len(self.keys),2*self.psd_sum.shape[0])
+            self.psd_sum = np.concatenate((self.psd_sum, np.zeros((new_size-self.psd_sum.shape[0],self.psd_sum.shape[1]))))
+            self.n_segments = np.concatenate((self.n_segments, np.zeros(new_size-self.n_segments.shape[0],dtype=np.int64)))
+        return rows
+
+    def segment_power(self,adcs):
+        #adcs: (n_samples, n_channels) -> summed power (n_channels, n_freq), number of segments
+        n = self.segment_length
+        step = max(1,int(round(n*(1.-self.overlap))))
+        x = np.asarray(adcs)
+        if x.shape[0] < n:
+            return None, 0
+        #(n_segments, n_channels, n) view, no copy until the float32 conversion
+        segments = np.lib.stride_tricks.sliding_window_view(x,n,axis=0)[::step]
+        seg = segments.astype(np.float32)
+        seg -= seg.mean(axis=-1,keepdims=True,dtype=np.float32)
+        seg *= self.window
+        spec = np.fft.rfft(seg,axis=-1)
+        power = (spec.real**2 + spec.imag**2).sum(axis=0,dtype=np.float64)
+        return power, segments.shape[0]
+
+    def accumulate(self,adcs,channels):
+        if self.window is None:
+            self.setup(np.shape(adcs)[0])
+        #too short for one segment (e.g. a truncated fragment): don't register the channels
+        if np.shape(adcs)[0] < self.segment_length:
+            return
+        rows = self.get_rows(channels)
+        for i_start in range(0,len(rows),self.channel_chunk):
+            sl = slice(i_start,i_start+self.channel_chunk)
+            power, n_seg = self.segment_power(adcs[:,sl])
+            power *= self.scale
+            add_rows(self.psd_sum, rows[sl], power)
+            add_rows(self.n_segments, rows[sl], n_seg)
+
+    def accumulate_record(self,blocks):
+        #blocks: iterable of (adcs, channels) for all links of a record;
+        #links with equal numbers of samples are transformed together
+        by_length = {}
+        for adcs, channels in blocks:
+            by_length.setdefault(np.shape(adcs)[0],[]).append((adcs,channels))
+        for group in by_length.values():
+            if len(group)==1:
+                self.accumulate(*group[0])
+            else:
+                self.accumulate(np.concatenate([ g[0] for g in group ],axis=1),
+                                [ ch for g in group for ch in g[1] ])
+
+    def power_spectra(self):
+        #returns channel keys, frequencies and the average PSD per channel (NaN for channels without segments)
+        n_keys = len(self.keys)
+        if n_keys==0:
+            return [], None, None
+        counts = self.n_segments[:n_keys]
+        psd = np.full(self.psd_sum[:n_keys].shape,np.nan)
+        np.divide(self.psd_sum[:n_keys],counts[:,None],out=psd,where=counts[:,None]>0)
+        return list(self.keys), self.frequencies(), psd
+
+    def merge(self,other):
+        if other.window is None:
+            return self
+        if self.sampling_period is None:
+            self.sampling_period = other.sampling_period
+        if other.sampling_period!=self.sampling_period:
+            raise ValueError("Cannot merge spectra with different sampling periods")
+        if self.window is None:
+            self.segment_length = other.segment_length
+            self.setup(other.segment_length)
+        if other.segment_length!=self.segment_length:
+            raise ValueError("Cannot merge spectra with different segment lengths")
+        rows = self.get_rows(other.keys)
+        n_keys = len(other.keys)
+        add_rows(self.psd_sum, rows, other.psd_sum[:n_keys])
+        add_rows(self.n_segments, rows, other.n_segments[:n_keys])
+        return self
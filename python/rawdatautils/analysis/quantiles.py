@@ -0,0 +1,118 @@
+#general imports
+import numpy as np
+
+#full ADC ranges of the supported detector formats
+WIBETH_ADC_BITS = 14
+DAPHNE_ADC_BITS = 14
+
+def adc_histograms(adcs,axis=0,n_bits=WIBETH_ADC_BITS):
+    """
+    Per-channel histograms of integer ADC values, unit-width bins.
+
+    adcs is 2D with samples along axis. To keep the histograms small they only
+    span the range of values present: returns (hist, offset) with hist of shape
+    (n_channels, max-min+1), bin i holding the count of value offset+i.
+    """
+    x = np.asarray(adcs)
+    if axis!=0:
+        x = x.T
+    n_samples, n_channels = x.shape
+    if n_samples==0:
+        return np.zeros((n_channels,0),dtype=np.int64), 0
+    offset = int(x.min())
+    n_bins = int(x.max()) - offset + 1
+    if n_bins > (1<<n_bits):
+        raise ValueError(f"ADC values span {n_bins} codes, more than {n_bits} bits")
+    #one bincount over all channels: channel c occupies bins [c*n_bins, (c+1)*n_bins)
+    idx = x.astype(np.int64)
+    idx += np.arange(n_channels,dtype=np.int64)*n_bins - offset
+    hist = np.bincount(idx.ravel(),minlength=n_channels*n_bins).reshape(n_channels,n_bins)
+    return hist, offset
+
+def histogram_kth_values(hist,k):
+    #k: (n_channels, n_k) zero-based ranks -> bin index of the k-th smallest value
+    n_channels, n_bins = hist.shape
+    cum = np.cumsum(hist,axis=1,dtype=np.int64)
+    #shift each row so the flattened cumulative counts stay sorted, then search once
+    row_shift = np.arange(n_channels,dtype=np.int64)*(int(cum[:,-1].max())+1)
+    cum += row_shift[:,None]
+    idx = np.searchsorted(cum.ravel(), (k + row_shift[:,None]).ravel(), side="right")
+    return idx.reshape(k.shape) - (np.arange(n_channels)*n_bins)[:,None]
+
+def histogram_quantiles(hist,q,offset=0):
+    """
+    Exact per-channel quantiles from unit-width histograms, using the same
+    linear interpolation as np.quantile/np.median. q is a scalar or 1D array
+    in [0,1]; returns shape (n_channels,) or (n_channels, len(q)).
+    Channels with no entries give nan.
+    """
+    q_arr = np.atleast_1d(np.asarray(q,dtype=np.float64))
+    n = hist.sum(axis=1)
+    pos = np.maximum(n-1,0)[:,None]*q_arr[None,:]
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    v_lo = histogram_kth_values(hist,lo)
+    v_hi = histogram_kth_values(hist,hi)
+    result = offset + v_lo + (pos-lo)*(v_hi-v_lo)
+    result[n==0] = np.nan
+    return result[:,0] if np.ndim(q)==0 else result
+
+def adc_quantiles(adcs,q,axis=0,n_bits=WIBETH_ADC_BITS):
+    #returns (quantiles, hist, offset); see histogram_quantiles and adc_histograms
+    hist, offset = adc_histograms(adcs,axis=axis,n_bits=n_bits)
+    return histogram_quantiles(hist,q,offset), hist, offset
+
+def adc_median(adcs,axis=0,n_bits=WIBETH_ADC_BITS):
+    #drop-in for np.median(adcs,axis) on 2D integer ADC arrays
+    n_samples = np.shape(adcs)[axis]
+    if n_samples==0:
+        return np.median(adcs,axis=axis)
+    #a histogram wider than the data (e.g. from a few outliers) costs more than partitioning
+    if int(np.max(adcs)) - int(np.min(adcs)) >= n_samples:
+        return np.median(adcs,axis=axis)
+    return adc_quantiles(adcs,0.5,axis=axis,n_bits=n_bits)[0]
+
+class AdcHistogramAccumulator:
+    """
+    Run-level per-channel ADC histograms over a fixed code range, filled from
+    the (hist, offset) pairs returned by adc_histograms/adc_quantiles.
+    """
+
+    def __init__(self,n_bits=WIBETH_ADC_BITS,dtype=np.uint32):
+        self.n_bins = 1<<n_bits
+        self.dtype = dtype
+        self.channel_rows = {}
+        self.keys = []
+        self.hist = np.zeros((0,self.n_bins),dtype=dtype)
+
+    def get_rows(self,channels):
+        rows = np.empty(len(channels),dtype=np.int64)
+        for i,ch in enumerate(channels):
+            row = self.channel_rows.get(ch)
+            if row is None:
+                row = len(self.keys)
+                self.channel_rows[ch] = row
+                self.keys.append(ch)
+            rows[i] = row
+        if len(self.keys) > self.hist.shape[0]:
+            new_size = max(len(self.keys),2*self.hist.shape[0])
+            self.hist = np.concatenate((self.hist, np.zeros((new_size-self.hist.shape[0],self.n_bins),dtype=self.dtype)))
+        return rows
+
+    def add(self,hist,offset,channels):
+        rows = self.get_rows(channels)
+        sl = slice(offset,offset+hist.shape[1])
+        if len(np.unique(rows))==len(rows):
+            self.hist[rows,sl] += hist.astype(self.dtype)
+        else:
+            for row, h in zip(rows,hist):
+                self.hist[row,sl] += h.astype(self.dtype)
+
+    def merge(self,other):
+        n_keys = len(other.keys)
+        if n_keys>0:
+            self.add(other.hist[:n_keys],0,other.keys)
+        return self
+
+    def quantiles(self,q):
+        return histogram_quantiles(self.hist[:len(self.keys)],q)
@@ -0,0 +1,85 @@
+#general imports
+from dataclasses import dataclass
+import numpy as np
+
+@dataclass
+class RecordAlignmentReport:
+
+    links: np.ndarray
+    n_frames: np.ndarray
+    timestamp_first: np.ndarray
+    timestamp_last: np.ndarray
+    #offsets relative to the first link added
+    first_offsets: np.ndarray
+    last_offsets: np.ndarray
+    #fraction of [window_begin, window_end) covered by each link's samples
+    window_coverage: np.ndarray
+    missing_links: list
+
+    def is_aligned(self):
+        return len(self.missing_links)==0 and not np.any(self.first_offsets) and not np.any(self.last_offsets)
+
+class RecordAlignmentChecker:
+    """
+    Collects first/last sample timestamps and frame counts of every link while
+    a record is being processed, so cross-link alignment can be checked at the
+    end of the record without reading any fragment again.
+
+    Usage per record: begin_record(expected_links), add_link(...) for every
+    fragment in the main pass, then check().
+    """
+
+    def __init__(self,sample_period=32):
+        self.sample_period = sample_period
+        self.begin_record()
+
+    def begin_record(self,expected_links=None):
+        self.expected_links = list(expected_links) if expected_links is not None else []
+        self.links = []
+        self.n_frames = []
+        self.timestamp_first = []
+        self.timestamp_last = []
+        self.window_begin = []
+        self.window_end = []
+
+    def add_link(self,link,timestamp_first,timestamp_last,n_frames,window_begin=0,window_end=0):
+        #timestamp_last is the timestamp of the last sample of the link
+        self.links.append(link)
+        self.n_frames.append(n_frames)
+        self.timestamp_first.append(timestamp_first)
+        self.timestamp_last.append(timestamp_last)
+        self.window_begin.append(window_begin)
+        self.window_end.append(window_end)
+
+    def add_timestamps(self,link,timestamps,n_frames,frag_header=None):
+        #convenience for when the sample timestamps are already unpacked
+        if len(timestamps)==0:
+            return
+        window_begin = frag_header.window_begin if frag_header is not None else 0
+        window_end = frag_header.window_end if frag_header is not None else 0
+        self.add_link(link,int(timestamps[0]),int(timestamps[-1]),n_frames,window_begin,window_end)
+
+    def check(self):
+        first = np.array(self.timestamp_first,dtype=np.int64)
+        last = np.array(self.timestamp_last,dtype=np.int64)
+        begin = np.array(self.window_begin,dtype=np.int64)
+        end = np.array(self.window_end,dtype=np.int64)
+
+        first_offsets = first - first[0] if len(first)>0 else first
+        last_offsets = last - last[0] if len(last)>0 else last
+
+        window = end - begin
+        covered = np.minimum(last+self.sample_period,end) - np.maximum(first,begin)
+        coverage = np.divide(np.maximum(covered,0), window, out=np.full(len(window),np.nan), where=window>0)
+
+        seen = set(self.links)
+        missing = [ l for l in self.expected_links if l not in seen ]
+
+        return RecordAlignmentReport(links=np.array(self.links),
+                                     n_frames=np.array(self.n_frames),
+                                     timestamp_first=first,
+                                     timestamp_last=last,
+                                     first_offsets=first_offsets,
+                                     last_offsets=last_offsets,
+                                     window_coverage=coverage,
+                                     missing_links=missing)
@@ -0,0 +1,157 @@
+#general imports
+import numpy as np
+
+#DTS clock tick in seconds
+DTS_TICK = 16e-9
+
+#same fields and layout as rawdatautils.unpack.tp.tp_dtype(), for TP arrays built in python
+TP_DTYPE = np.dtype([ ("time_start", np.uint64),
+                      ("time_peak", np.uint64),
+                      ("time_over_threshold", np.uint64),
+                      ("channel", np.uint32),
+                      ("adc_integral", np.uint32),
+                      ("type", np.uint32),
+                      ("algorithm", np.uint32),
+                      ("adc_peak", np.uint16),
+                      ("detid", np.uint16),
+                      ("flag", np.uint16) ], align=True)
+
+def tp_time_span(tps):
+    #ticks from the first TP start to the last TP end
+    if len(tps)==0:
+        return 0
+    t_end = tps["time_start"].astype(np.int64) + tps["time_over_threshold"].astype(np.int64)
+    return int(t_end.max()) - int(tps["time_start"].min())
+
+def channel_counts(tps):
+    #(channels, number of TPs) for the channels with TPs
+    return np.unique(tps["channel"],return_counts=True)
+
+def tp_rates(tps,duration=None):
+    #(channels, rates in Hz); duration in ticks, the TP time span by default
+    channels, counts = channel_counts(tps)
+    if duration is None:
+        duration = tp_time_span(tps)
+    rates = counts/(duration*DTS_TICK) if duration>0 else np.full(len(counts),np.nan)
+    return channels, rates
+
+def merge_counts(keys_a,counts_a,keys_b,counts_b):
+    #sum two sparse (sorted unique keys, counts) histograms
+    keys = np.union1d(keys_a,keys_b)
+    counts = np.zeros(len(keys),dtype=np.int64)
+    counts[np.searchsorted(keys,keys_a)] += counts_a
+    counts[np.searchsorted(keys,keys_b)] += counts_b
+    return keys, counts
+
+def cluster_tps(tps,max_dt=100,max_dch=2):
+    """
+    Groups TPs close in time and channel. TPs are sorted by start time and
+    split into time groups wherever a TP starts more than max_dt ticks after
+    every earlier TP of the group has ended; each time group is then split by
+    channel wherever consecutive channels differ by more than max_dch.
+
+    Returns (labels, clusters): the cluster index of every TP (in the input
+    order) and a structured array with one row per cluster (n_tps, channel
+    and time ranges, summed ADC integral, peak ADC).
+    """
+    n = len(tps)
+    cluster_dtype = np.dtype([ ("n_tps", np.int64),
+                               ("channel_min", np.uint32),
+                               ("channel_max", np.uint32),
+                               ("time_start", np.uint64),
+                               ("time_end", np.uint64),
+                               ("adc_integral", np.uint64),
+                               ("adc_peak", np.uint16) ])
+    if n==0:
+        return np.zeros(0,dtype=np.int64), np.zeros(0,dtype=cluster_dtype)
+
+    start = tps["time_start"].astype(np.int64)
+    end = start + tps["time_over_threshold"].astype(np.int64)
+
+    by_time = np.argsort(start,kind="stable")
+    s_start = start[by_time]
+    running_end = np.maximum.accumulate(end[by_time])
+    new_group = np.empty(n,dtype=bool)
+    new_group[0] = True
+    new_group[1:] = s_start[1:] > running_end[:-1] + max_dt
+    time_group = np.empty(n,dtype=np.int64)
+    time_group[by_time] = np.cumsum(new_group) - 1
+
+    channel = tps["channel"].astype(np.int64)
+    order = np.lexsort((start,channel,time_group))
+    new_cluster = np.empty(n,dtype=bool)
+    new_cluster[0] = True
+    new_cluster[1:] = (np.diff(time_group[order])!=0) | (np.diff(channel[order]) > max_dch)
+    starts = np.flatnonzero(new_cluster)
+
+    labels = np.empty(n,dtype=np.int64)
+    labels[order] = np.cumsum(new_cluster) - 1
+
+    clusters = np.zeros(len(starts),dtype=cluster_dtype)
+    clusters["n_tps"] = np.diff(np.append(starts,n))
+    clusters["channel_min"] = np.minimum.reduceat(channel[order],starts)
+    clusters["channel_max"] = np.maximum.reduceat(channel[order],starts)
+    clusters["time_start"] = np.minimum.reduceat(start[order],starts)
+    clusters["time_end"] = np.maximum.reduceat(end[order],starts)
+    clusters["adc_integral"] = np.add.reduceat(tps["adc_integral"][order].astype(np.uint64),starts)
+    clusters["adc_peak"] = np.maximum.reduceat(tps["adc_peak"][order],starts)
+    return labels, clusters
+
+class TPSummary:
+    """
+    Run-level TP summary filled record by record from TP structured arrays:
+    per-channel counts (and rates over the accumulated duration),
+    time-over-threshold and ADC-integral histograms and, given a channel to
+    plane mapping, per-plane TP counts and channel occupancy. Summaries of
+    separate records/files/processes combine with merge.
+
+    plane_of maps an array of channels to an array of planes, e.g. a lookup
+    built from the channel map.
+    """
+
+    def __init__(self,tot_bins=None,adc_integral_bins=None,plane_of=None):
+        self.tot_bins = np.asarray(tot_bins) if tot_bins is not None else np.arange(0,64*32+1,32)
+        self.adc_integral_bins = np.asarray(adc_integral_bins) if adc_integral_bins is not None else np.linspace(0,50000,101)
+        self.plane_of = plane_of
+        self.n_tps = 0
+        self.duration = 0
+        self.channels = np.zeros(0,dtype=np.uint32)
+        self.counts = np.zeros(0,dtype=np.int64)
+        self.tot_hist = np.zeros(len(self.tot_bins)-1,dtype=np.int64)
+        self.adc_integral_hist = np.zeros(len(self.adc_integral_bins)-1,dtype=np.int64)
+
+    def add(self,tps,duration=None):
+        #duration of the record in ticks, used for the rates (the TP time span by default)
+        self.n_tps += len(tps)
+        self.duration += tp_time_span(tps) if duration is None else int(duration)
+        channels, counts = channel_counts(tps)
+        self.channels, self.counts = merge_counts(self.channels,self.counts,channels,counts)
+        self.tot_hist += np.histogram(tps["time_over_threshold"],bins=self.tot_bins)[0]
+        self.adc_integral_hist += np.histogram(tps["adc_integral"],bins=self.adc_integral_bins)[0]
+        return self
+
+    def merge(self,other):
+        if not (np.array_equal(self.tot_bins,other.tot_bins) and np.array_equal(self.adc_integral_bins,other.adc_integral_bins)):
+            raise ValueError("Cannot merge TP summaries with different histogram bins")
+        self.n_tps += other.n_tps
+        self.duration += other.duration
+        self.channels, self.counts = merge_counts(self.channels,self.counts,other.channels,other.counts)
+        self.tot_hist += other.tot_hist
+        self.adc_integral_hist += other.adc_integral_hist
+        return self
+
+    def rates(self):
+        #(channels, rates in Hz)
+        if self.duration<=0:
+            return self.channels, np.full(len(self.counts),np.nan)
+        return self.channels, self.counts/(self.duration*DTS_TICK)
+
+    def plane_occupancy(self):
+        #{plane: (number of TPs, number of channels with TPs)}
+        if self.plane_of is None:
+            raise ValueError("plane_of is needed for the plane occupancy")
+        planes = np.asarray(self.plane_of(self.channels))
+        keys, inverse = np.unique(planes,return_inverse=True)
+        tp_counts = np.bincount(inverse,weights=self.counts,minlength=len(keys)).astype(np.int64)
+        channel_counts = np.bincount(inverse,minlength=len(keys))
+        return { k.item(): (int(n), int(c)) for k, n, c in zip(keys,tp_counts,channel_counts) }
@@ -0,0 +1 @@
+from ..._daq_rawdatautils_py.analysis.wibeth import *
@@ -0,0 +1,96 @@
+#general imports
+import os
+import numpy as np
+
+#dunedaq imports
+import fddetdataformats
+
+#unpacker imports
+import rawdatautils.unpack.wib
+import rawdatautils.unpack.wib2
+import rawdatautils.unpack.wibeth
+import rawdatautils.unpack.tde
+
+#frame class and unpacker module of each supported flat binary format
+FRAME_FORMATS = { "wib": (fddetdataformats.WIBFrame, rawdatautils.unpack.wib),
+                  "wib2": (fddetdataformats.WIB2Frame, rawdatautils.unpack.wib2),
+                  "wibeth": (fddetdataformats.WIBEthFrame, rawdatautils.unpack.wibeth),
+                  "tde": (fddetdataformats.TDE16Frame, rawdatautils.unpack.tde) }
+
+class BinaryFrameFile:
+    """
+    Read-only memory map of a flat binary file of frames, such as the ones
+    written by file_conversion or hdf5_wib2_to_binary.py. Frame ranges are
+    passed from the mapping straight to the C++ *_data unpackers, so only the
+    requested frames are read from disk. A trailing partial frame is ignored.
+    """
+
+    def __init__(self,filename,frame_format):
+        if frame_format not in FRAME_FORMATS:
+            raise ValueError(f"Unknown frame format {frame_format}, expected one of {list(FRAME_FORMATS)}")
+        self.filename = filename
+        self.frame_format = frame_format
+        self.frame_obj, self.unpacker = FRAME_FORMATS[frame_format]
+        self.frame_size = self.frame_obj.sizeof()
+
+        file_size = os.path.getsize(filename)
+        self.n_frames = file_size // self.frame_size
+        self.trailing_bytes = file_size - self.n_frames*self.frame_size
+        #np.memmap can't map an empty file
+        if self.n_frames > 0:
+            self.data = np.memmap(filename,dtype=np.uint8,mode="r",shape=(self.n_frames*self.frame_size,))
+        else:
+            self.data = np.zeros(0,dtype=np.uint8)
+
+    def __len__(self):
+        return self.n_frames
+
+    def get_n_frames(self):
+        return self.n_frames
+
+    def frame_range(self,first=0,n_frames=None):
+        #clip [first, first+n_frames) to the file; returns (first, n_frames)
+        if first < 0:
+            first += self.n_frames
+        first = min(max(first,0),self.n_frames)
+        if n_frames is None or first+n_frames > self.n_frames:
+            n_frames = self.n_frames - first
+        return first, max(n_frames,0)
+
+    def get_frames(self,first=0,n_frames=None):
+        #raw bytes of the frames, a view of the mapping
+        first, n_frames = self.frame_range(first,n_frames)
+        return self.data[first*self.frame_size:(first+n_frames)*self.frame_size]
+
+    def get_adc(self,first=0,n_frames=None):
+        frames = self.get_frames(first,n_frames)
+        return self.unpacker.np_array_adc_data(frames,len(frames)//self.frame_size)
+
+    def get_timestamps(self,first=0,n_frames=None):
+        frames = self.get_frames(first,n_frames)
+        return self.unpacker.np_array_timestamp_data(frames,len(frames)//self.frame_size)
+
+    def get_channels(self,first=0,n_frames=None):
+        #TDE16Frames carry one channel each
+        if self.frame_format != "tde":
+            raise ValueError(f"{self.frame_format} frames have no per-frame channel")
+        frames = self.get_frames(first,n_frames)
+        return self.unpacker.np_array_channel_data(frames,len(frames)//self.frame_size)
+
+    def iter_chunks(self,chunk_frames=1024,first=0,n_frames=None):
+        #yields (first frame of the chunk, adcs, timestamps) over the frame range
+        first, n_frames = self.frame_range(first,n_frames)
+        for start in range(first,first+n_frames,chunk_frames):
+            n = min(chunk_frames,first+n_frames-start)
+            yield start, self.get_adc(start,n), self.get_timestamps(start,n)
+
+    def close(self):
+        #drop the mapping; views returned by get_frames keep it alive until they are deleted
+        self.data = np.zeros(0,dtype=np.uint8)
+        self.n_frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
@@ -58,6 +58,161 @@ def desparsify_array_diff_of_diff_locs_and_vals(arr_first, change_locations, cha
     arr = np.concatenate((np.array([0], dtype=np.uint), arr_diff)).cumsum() + arr_first
     return arr
 
+## Lossless compression of ADC waveforms
+
+def zigzag_encode(arr):
+    # Map signed integers to unsigned ones, small magnitudes to small values: 0,-1,1,-2,... -> 0,1,2,3,...
+    arr = np.asarray(arr, dtype=np.int64)
+    return ((arr << 1) ^ (arr >> 63)).astype(np.uint64)
+
+def zigzag_decode(arr):
+    arr = np.asarray(arr, dtype=np.uint64)
+    return (arr >> np.uint64(1)).astype(np.int64) ^ -(arr & np.uint64(1)).astype(np.int64)
+
+def bit_widths(arr):
+    # Number of bits needed for each (unsigned) value, 0 for 0
+    powers = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+    return np.searchsorted(powers, np.asarray(arr, dtype=np.uint64), side="right").astype(np.uint8)
+
+def pack_fixed_width(values, width):
+    # Pack values (< 2**width, a multiple of 8 of them) with width bits each, least significant bit first:
+    # every 8 values fill width bytes, built as little-endian 64-bit words
+    groups = np.asarray(values, dtype=np.uint64).reshape(-1, 8)
+    n_words = -(-width // 8)
+    words = np.zeros((len(groups), n_words), dtype=np.uint64)
+    for i in range(8):
+        word, offset = divmod(i * width, 64)
+        words[:, word] |= groups[:, i] << np.uint64(offset)
+        if offset + width > 64:
+            words[:, word + 1] |= groups[:, i] >> np.uint64(64 - offset)
+    return words.astype("<u8", copy=False).view(np.uint8).reshape(len(groups), 8 * n_words)[:, :width].ravel()
+
+def unpack_fixed_width(data, width):
+    # Inverse of pack_fixed_width
+    groups = np.asarray(data, dtype=np.uint8).reshape(-1, width)
+    n_words = -(-width // 8)
+    buf = np.zeros((len(groups), 8 * n_words), dtype=np.uint8)
+    buf[:, :width] = groups
+    words = buf.view("<u8").astype(np.uint64)
+    mask = np.uint64((1 << width) - 1)
+    values = np.empty((len(groups), 8), dtype=np.uint64)
+    for i in range(8):
+        word, offset = divmod(i * width, 64)
+        v = words[:, word] >> np.uint64(offset)
+        if offset + width > 64:
+            v |= words[:, word + 1] << np.uint64(64 - offset)
+        values[:, i] = v & mask
+    return values.ravel()
+
+@dataclass
+class CompressedWaveforms:
+    # Output of compress_waveforms, for (n_samples, n_channels) ADC arrays
+    n_samples: int
+    n_channels: int
+    # 1 for a single channel given as a 1D array (n_channels is then 1), else 2
+    ndim: int
+    dtype: str
+    # "delta": first sample of each channel + differences of consecutive samples,
+    # "pedestal": rounded median of each channel + residuals
+    method: str
+    block_size: int
+    # (n_channels,) int64 first samples or pedestals
+    reference: np.ndarray
+    # (n_channels, n_blocks) bits per zigzag-encoded value in each block of block_size values
+    widths: np.ndarray
+    # bit-packed blocks, by increasing width, then channel and block
+    data: np.ndarray
+
+    def nbytes(self):
+        return self.reference.nbytes + self.widths.nbytes + self.data.nbytes
+
+    def raw_nbytes(self):
+        return self.n_samples * self.n_channels * np.dtype(self.dtype).itemsize
+
+    def compression_ratio(self):
+        return self.raw_nbytes() / max(self.nbytes(), 1)
+
+def compress_waveforms(adcs, method="delta", block_size=64):
+    # Lossless: residuals (sample differences or pedestal-subtracted values) are zigzag encoded
+    # and bit-packed with the smallest width holding every value of each block of block_size values.
+    # adcs is (n_samples, n_channels) integers as from the unpackers, or 1D for a single channel
+    adcs = np.asarray(adcs)
+    if not np.issubdtype(adcs.dtype, np.integer):
+        raise ValueError(f"compress_waveforms needs integer ADC values, got dtype {adcs.dtype}")
+    if adcs.ndim not in (1, 2):
+        raise ValueError(f"compress_waveforms needs a 1D or 2D array, got {adcs.ndim} dimensions")
+    if block_size <= 0 or block_size % 8 != 0:
+        raise ValueError(f"block_size must be a positive multiple of 8, got {block_size}")
+    adcs_2d = adcs[:, None] if adcs.ndim == 1 else adcs
+    n_samples, n_channels = adcs_2d.shape
+    # Channel-major, so that each channel's values are contiguous. Residuals wrap around
+    # modulo 2**64 for 64-bit inputs, which the decoding undoes
+    x = adcs_2d.T.astype(np.int64)
+
+    if method == "delta":
+        reference = x[:, 0].copy() if n_samples > 0 else np.zeros(n_channels, dtype=np.int64)
+        residuals = np.diff(x, axis=1)
+    elif method == "pedestal":
+        reference = np.rint(np.median(x, axis=1)).astype(np.int64) if n_samples > 0 else np.zeros(n_channels, dtype=np.int64)
+        residuals = x - reference[:, None]
+    else:
+        raise ValueError(f"Unknown compression method {method}, expected delta or pedestal")
+
+    n_values = residuals.shape[1]
+    n_blocks = -(-n_values // block_size)
+    # Pad the last block of each channel with zeros, which don't change its width
+    blocks = np.zeros((n_channels, n_blocks * block_size), dtype=np.uint64)
+    blocks[:, :n_values] = zigzag_encode(residuals)
+    blocks = blocks.reshape(n_channels * n_blocks, block_size)
+    widths = bit_widths(blocks.max(axis=1)) if len(blocks) > 0 else np.zeros(0, dtype=np.uint8)
+
+    # Blocks of the same width are packed together
+    data = [ pack_fixed_width(blocks[widths == w].ravel(), int(w)) for w in np.unique(widths) if w > 0 ]
+
+    return CompressedWaveforms(n_samples=n_samples,
+                               n_channels=n_channels,
+                               ndim=adcs.ndim,
+                               dtype=adcs.dtype.str,
+                               method=method,
+                               block_size=block_size,
+                               reference=reference,
+                               widths=widths.reshape(n_channels, n_blocks),
+                               data=np.concatenate(data) if len(data) > 0 else np.zeros(0, dtype=np.uint8))
+
+def decompress_waveforms(cw):
+    # Inverse of compress_waveforms: returns the original array, same shape and dtype
+    n_channels = cw.n_channels
+    n_values = max(cw.n_samples - 1 if cw.method == "delta" else cw.n_samples, 0)
+
+    widths = cw.widths.ravel()
+    blocks = np.zeros((len(widths), cw.block_size), dtype=np.uint64)
+    pos = 0
+    for w in np.unique(widths):
+        if w == 0:
+            continue
+        rows = np.flatnonzero(widths == w)
+        n_bytes = len(rows) * cw.block_size * int(w) // 8
+        blocks[rows] = unpack_fixed_width(cw.data[pos:pos + n_bytes], int(w)).reshape(len(rows), cw.block_size)
+        pos += n_bytes
+    residuals = zigzag_decode(blocks.reshape(n_channels, cw.widths.shape[1] * cw.block_size)[:, :n_values])
+
+    reference = cw.reference.astype(np.int64)
+    if cw.method == "delta":
+        x = np.empty((n_channels, cw.n_samples), dtype=np.int64)
+        if cw.n_samples > 0:
+            x[:, 0] = reference
+            np.cumsum(residuals, axis=1, out=x[:, 1:])
+            x[:, 1:] += reference[:, None]
+    else:
+        x = residuals + reference[:, None]
+
+    adcs = x.T.astype(np.dtype(cw.dtype))
+    return adcs if cw.ndim == 2 else adcs[:, 0]
+
+def compress_waveform_data(wvfm_data, method="delta", block_size=64):
+    # Batch-compress the adcs of a list of *WaveformData (same number of samples each), channels in list order
+    return compress_waveforms(np.stack([ w.adcs for w in wvfm_data ], axis=1), method=method, block_size=block_size)
+
 @dataclass(order=True)
 class RecordDataBase():
     run: int
@@ -306,3 +461,98 @@ class DAPHNEWaveformData(DAPHNEChannelDataBase):
     timestamp_dts: int
     timestamps: np.ndarray
     adcs: np.ndarray
+
+@dataclass(order=True)
+class WIBHeaderData(FragmentDataBase):
+
+    #first frame only; used for both WIB and WIB2 frames
+    version: int
+    crate: int
+    slot: int
+    link: int
+
+    timestamp_dts_diff_vals: np.ndarray
+    timestamp_dts_diff_idx: np.ndarray
+    timestamp_dts_first: int
+
+    n_frames: int
+    n_channels: int
+    sampling_period: int
+
+@dataclass(order=True)
+class WIBChannelDataBase(FragmentDataBase):
+
+    channel: int
+    plane: int
+    apa: str
+    wib_chan: int
+
+    @classmethod
+    def index_names(cls):
+        return [ "run","trigger","sequence","src_id","channel" ]
+
+    def index_values(self):
+        return [ self.run, self.trigger, self.sequence, self.src_id, self.channel ]
+
+@dataclass(order=True)
+class WIBAnalysisData(WIBChannelDataBase):
+
+    adc_mean: float
+    adc_rms: float
+    adc_max: int
+    adc_min: int
+    adc_median: float
+
+@dataclass(order=True)
+class WIBWaveformData(WIBChannelDataBase):
+
+    timestamps: np.ndarray
+    adcs: np.ndarray
+    fft_mag: np.ndarray
+
+@dataclass(order=True)
+class TDEChannelDataBase(FragmentDataBase):
+
+    channel: int
+
+    @classmethod
+    def index_names(cls):
+        return [ "run","trigger","sequence","src_id","channel" ]
+
+    def index_values(self):
+        return [ self.run, self.trigger, self.sequence, self.src_id, self.channel ]
+
+@dataclass(order=True)
+class TDEAnalysisData(TDEChannelDataBase):
+
+    timestamp_dts: int
+    adc_mean: float
+    adc_rms: float
+    adc_max: int
+    adc_min: int
+    adc_median: float
+
+@dataclass(order=True)
+class TDEWaveformData(TDEChannelDataBase):
+
+    timestamp_dts: int
+    timestamps: np.ndarray
+    adcs: np.ndarray
+
+@dataclass(order=True)
+class CRTHitData(FragmentDataBase):
+
+    #one per CRT frame
+    module: int
+    timestamp_dts: int
+    n_channels_hit: int
+    adc_sum: int
+    adc_max: int
+
+@dataclass(order=True)
+class CRTWaveformData(FragmentDataBase):
+
+    module: int
+    timestamp_dts: int
+    channels: np.ndarray
+    adcs: np.ndarray
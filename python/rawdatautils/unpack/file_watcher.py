@@ -0,0 +1,220 @@
+#general imports
+import asyncio
+import collections
+import concurrent.futures
+import glob
+import json
+import os
+import time
+
+#dunedaq imports
+from hdf5libs import HDF5RawDataFile
+
+#unpacker imports
+from rawdatautils.unpack.scan import RecordScanner
+from rawdatautils.unpack.registry import make_default_registry
+import rawdatautils.unpack.fragment_cache
+
+def get_closing_timestamp(filename):
+    #closing_timestamp attribute of a raw data file in seconds since the epoch,
+    #None while the writer hasn't closed it (attribute missing or file still locked)
+    try:
+        value_string = HDF5RawDataFile(filename).get_attribute("closing_timestamp")
+    except (RuntimeError, OSError):
+        return None
+    try:
+        return float(value_string)/1000.
+    except (TypeError, ValueError):
+        return None
+
+class FileQCTask:
+    """
+    Processing of one closed file, run in a worker process: the one-pass scan
+    summary and, with unpack=True, the Unpacker pipeline of
+    make_default_registry over every fragment. Returns a JSON-friendly dict.
+
+    With use_cache=True the fragments are read through the shared
+    fragment cache of the worker process (the task is sent to the workers,
+    so it holds a flag rather than a cache).
+    """
+
+    def __init__(self,unpack=False,channel_map=None,ana_data_prescale=1,wvfm_data_prescale=None,use_cache=False):
+        self.unpack = unpack
+        self.channel_map = channel_map
+        self.ana_data_prescale = ana_data_prescale
+        self.wvfm_data_prescale = wvfm_data_prescale
+        self.use_cache = use_cache
+
+    def __call__(self,filename):
+        t_start = time.time()
+        h5_file = HDF5RawDataFile(filename)
+        scanner = RecordScanner(cache=rawdatautils.unpack.fragment_cache.shared_cache if self.use_cache else None)
+        registry = make_default_registry(self.channel_map,self.ana_data_prescale,self.wvfm_data_prescale) if self.unpack else None
+        n_unpacked = collections.Counter()
+
+        def unpack(frag):
+            data = registry.get_all_data(frag)
+            n_unpacked.update({ k: len(v) for k, v in data.items() })
+
+        #each fragment is read once, for both the scan and the unpacking
+        for record in h5_file.get_all_record_ids():
+            scanner.add_record(h5_file,record,on_fragment=unpack if registry is not None else None)
+            if registry is not None:
+                registry.flush()
+        return { "file": filename,
+                 "n_records": scanner.n_records,
+                 "summary": scanner.summary_lines(),
+                 "n_unpacked": dict(n_unpacked),
+                 "processing_time": time.time()-t_start }
+
+class FileWatcher:
+    """
+    asyncio service that watches directories for raw data files and processes
+    each one as soon as its writer has closed it, i.e. once its
+    closing_timestamp attribute can be read. Closed files go through a bounded
+    queue to n_workers worker processes running task(filename) (a FileQCTask
+    by default); each result is passed to on_result(filename, result, error).
+
+    The directories are polled every poll_interval seconds; a file is checked
+    when it is new or has changed since its last check, and at least every
+    recheck_interval seconds in case it was closed while still locked by
+    the writer during that check. get_stats gives the queue depth, the files
+    in progress and the latencies from file close to the end of processing.
+    """
+
+    def __init__(self,directories,task=None,on_result=None,pattern="*.hdf5",n_workers=2,max_queue=16,
+                 poll_interval=1.,recheck_interval=10.,process_existing=True,n_latencies=100):
+        self.directories = list(directories)
+        self.task = task if task is not None else FileQCTask()
+        self.on_result = on_result
+        self.pattern = pattern
+        self.n_workers = n_workers
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self.recheck_interval = recheck_interval
+        self.process_existing = process_existing
+        #(size, mtime, time of the last check) of the files seen but not closed yet
+        self.open_files = {}
+        #files queued or done, never queued again
+        self.seen_files = set()
+        self.queue = None
+        self.stop_event = None
+        self.n_in_progress = 0
+        self.n_processed = 0
+        self.n_failed = 0
+        #exceptions raised by on_result, kept for get_stats instead of being printed
+        self.n_callback_errors = 0
+        self.last_callback_error = None
+        #(close to queue, close to result) in seconds of the latest files
+        self.latencies = collections.deque(maxlen=n_latencies)
+
+    def list_files(self):
+        files = []
+        for d in self.directories:
+            files += glob.glob(os.path.join(d,self.pattern))
+        return sorted(files)
+
+    def files_to_check(self):
+        #files not queued yet that are new, changed since their last check or due for a recheck
+        now = time.time()
+        to_check = []
+        for f in self.list_files():
+            if f in self.seen_files:
+                continue
+            try:
+                stat = os.stat(f)
+            except OSError:
+                continue
+            last = self.open_files.get(f)
+            if last is None or last[:2]!=(stat.st_size, stat.st_mtime) or now-last[2]>self.recheck_interval:
+                self.open_files[f] = (stat.st_size, stat.st_mtime, now)
+                to_check.append(f)
+        return to_check
+
+    async def poll(self,loop):
+        for f in self.files_to_check():
+            closing_timestamp = await loop.run_in_executor(None,get_closing_timestamp,f)
+            if closing_timestamp is None:
+                continue
+            del self.open_files[f]
+            self.seen_files.add(f)
+            await self.queue.put((f, closing_timestamp, time.time()))
+
+    async def worker(self,loop,pool):
+        while True:
+            f, closing_timestamp, t_queued = await self.queue.get()
+            self.n_in_progress += 1
+            result, error = None, None
+            try:
+                result = await loop.run_in_executor(pool,self.task,f)
+                self.n_processed += 1
+            except Exception as e:
+                error = e
+                self.n_failed += 1
+            finally:
+                self.n_in_progress -= 1
+                self.latencies.append((t_queued-closing_timestamp, time.time()-closing_timestamp))
+                self.queue.task_done()
+            if self.on_result is not None:
+                #a failing callback must not stop the worker, or the queue would fill up;
+                #the file then counts as failed
+                try:
+                    self.on_result(f,result,error)
+                except Exception as e:
+                    self.n_callback_errors += 1
+                    self.last_callback_error = (f, e)
+                    if error is None:
+                        self.n_processed -= 1
+                        self.n_failed += 1
+
+    async def run(self,stop_when_idle=False):
+        #watch until stop() is called or, with stop_when_idle, until the closed files found are all processed
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.stop_event = asyncio.Event()
+        if not self.process_existing:
+            self.seen_files.update(self.list_files())
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            workers = [ asyncio.create_task(self.worker(loop,pool)) for _ in range(self.n_workers) ]
+            try:
+                while not self.stop_event.is_set():
+                    await self.poll(loop)
+                    if stop_when_idle:
+                        await self.queue.join()
+                        break
+                    try:
+                        await asyncio.wait_for(self.stop_event.wait(),self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                for w in workers:
+                    w.cancel()
+                await asyncio.gather(*workers,return_exceptions=True)
+
+    def stop(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def get_stats(self):
+        stats = { "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+                  "in_progress": self.n_in_progress,
+                  "open_files": len(self.open_files),
+                  "processed": self.n_processed,
+                  "failed": self.n_failed,
+                  "callback_errors": self.n_callback_errors }
+        if self.last_callback_error is not None:
+            stats["last_callback_error"] = f"{self.last_callback_error[0]}: {self.last_callback_error[1]!r}"
+        if len(self.latencies)>0:
+            queue_latency = [ l[0] for l in self.latencies ]
+            total_latency = [ l[1] for l in self.latencies ]
+            stats["close_to_queue_mean"] = sum(queue_latency)/len(queue_latency)
+            stats["close_to_result_mean"] = sum(total_latency)/len(total_latency)
+            stats["close_to_result_max"] = max(total_latency)
+        return stats
+
+    def write_stats(self,filename):
+        #write then rename so that readers never see a partial file
+        tmp_name = filename + ".tmp"
+        with open(tmp_name,"w") as f:
+            json.dump(self.get_stats(),f)
+        os.replace(tmp_name,filename)
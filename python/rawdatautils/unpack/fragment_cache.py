@@ -0,0 +1,143 @@
+#general imports
+from collections import OrderedDict
+import threading
+
+#dunedaq imports
+import daqdataformats
+
+def source_key(source):
+    #SourceIDs identify a fragment within a record; geo ids (int) and dataset paths (str) are aliases of them
+    if isinstance(source,daqdataformats.SourceID):
+        return ("sid", int(source.subsystem), int(source.id))
+    if isinstance(source,str):
+        return ("path", source)
+    return ("geo", int(source))
+
+def record_key(record):
+    #(record number, sequence number); a bare record number means sequence number 0
+    if isinstance(record,(tuple,list)):
+        return (int(record[0]), int(record[1]))
+    return (int(record), 0)
+
+class FragmentCache:
+    """
+    LRU cache of decoded Fragments keyed by (file, record, SourceID), bounded by
+    the total fragment size in bytes. Safe to share between analyses and threads
+    in one process; use shared_cache for the process-wide instance.
+
+    Fragments requested by geo ID or dataset path are stored under the record
+    and SourceID of their header, so a fragment is cached once however it is
+    requested; the geo ID or path is remembered as an alias of that entry and
+    resolved before the lookup on the next request.
+    """
+
+    def __init__(self,max_bytes=2<<30):
+        self.max_bytes = int(max_bytes)
+        #key -> (fragment, size, aliases of the key)
+        self.entries = OrderedDict()
+        #(file, record or None, geo/path source key) -> key
+        self.aliases = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def make_key(self,file_name,frag):
+        #canonical key of a fragment, from its header
+        return (file_name, (int(frag.get_trigger_number()), int(frag.get_sequence_number())), source_key(frag.get_element_id()))
+
+    def get_frag(self,h5_file,record,source=None):
+        #same call signatures as HDF5RawDataFile.get_frag: (record, geo id / SourceID) or (dataset path)
+        if source is None:
+            record, source = None, record
+        file_name = h5_file.get_file_name()
+        src_key = source_key(source)
+        if src_key[0]=="sid":
+            alias, key = None, (file_name, record_key(record), src_key)
+        else:
+            alias = (file_name, record_key(record) if record is not None else None, src_key)
+
+        with self.lock:
+            if alias is not None:
+                key = self.aliases.get(alias)
+            entry = self.entries.get(key) if key is not None else None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        frag = h5_file.get_frag(source) if record is None else h5_file.get_frag(record,source)
+        if key is None:
+            key = self.make_key(file_name,frag)
+        self.put(key,frag,alias)
+        return frag
+
+    def drop(self,key):
+        #with the lock held
+        _, size, aliases = self.entries.pop(key)
+        for alias in aliases:
+            if self.aliases.get(alias)==key:
+                del self.aliases[alias]
+        self.current_bytes -= size
+
+    def put(self,key,frag,alias=None):
+        size = frag.get_size()
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            aliases = []
+            if key in self.entries:
+                aliases = self.entries[key][2]
+                self.drop(key)
+            if alias is not None:
+                aliases.append(alias)
+            for a in aliases:
+                self.aliases[a] = key
+            self.entries[key] = (frag,size,aliases)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self.drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self,file_name=None,record=None,source=None):
+        #drop every entry matching all of the given (non-None) fields, sources matching
+        #the SourceID of the entry or one of its geo ID/path aliases; returns number dropped
+        rec_key = record_key(record) if record is not None else None
+        src_key = source_key(source) if source is not None else None
+        with self.lock:
+            to_drop = [ key for key, (_, _, aliases) in self.entries.items()
+                        if (file_name is None or key[0]==file_name)
+                        and (rec_key is None or key[1]==rec_key)
+                        and (src_key is None or key[2]==src_key or any(a[2]==src_key for a in aliases)) ]
+            for key in to_drop:
+                self.drop(key)
+        return len(to_drop)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.aliases.clear()
+            self.current_bytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            n_lookups = self.hits + self.misses
+            return { "entries": len(self.entries),
+                     "bytes": self.current_bytes,
+                     "max_bytes": self.max_bytes,
+                     "hits": self.hits,
+                     "misses": self.misses,
+                     "evictions": self.evictions,
+                     "hit_rate": self.hits/n_lookups if n_lookups>0 else 0. }
+
+#process-wide cache shared by rawdatautils readers and unpackers
+shared_cache = FragmentCache()
+
+def get_frag(h5_file,record,source=None,cache=None):
+    #get_frag through a cache (shared_cache by default)
+    return (shared_cache if cache is None else cache).get_frag(h5_file,record,source)
@@ -0,0 +1,165 @@
+#general imports
+import os
+import numpy as np
+
+#dunedaq imports
+import daqdataformats
+import fddetdataformats
+from hdf5libs import HDF5RawDataFile
+
+#unpacker imports
+import rawdatautils.unpack.fragment_cache
+
+INDEX_VERSION = 1
+
+#one row per fragment
+INDEX_DTYPE = np.dtype([ ("record", np.uint64),
+                         ("sequence", np.uint32),
+                         ("run", np.uint32),
+                         ("subsystem", np.uint8),
+                         ("src_id", np.uint32),
+                         ("geo_id", np.uint64),
+                         ("det_id", np.uint16),
+                         ("fragment_type", np.uint32),
+                         ("size", np.uint64),
+                         ("error_bits", np.uint32),
+                         ("trigger_timestamp", np.uint64),
+                         ("window_begin", np.uint64),
+                         ("window_end", np.uint64) ])
+
+#frame class and name of the stream field of the DAQ header, for the fragment types whose geo id can be read from the first frame
+GEO_FRAMES = { daqdataformats.FragmentType.kWIBEth: (fddetdataformats.WIBEthFrame, "stream_id"),
+               daqdataformats.FragmentType.kDAPHNEStream: (fddetdataformats.DAPHNEStreamFrame, "link_id"),
+               daqdataformats.FragmentType.kDAPHNE: (fddetdataformats.DAPHNEFrame, "link_id") }
+
+def make_geo_id(det_id,crate_id,slot_id,stream_id):
+    #same packing as the geo ids of HardwareMapService: 16 bits each, det id lowest
+    return int(det_id) | (int(crate_id)<<16) | (int(slot_id)<<32) | (int(stream_id)<<48)
+
+def get_geo_id(frag):
+    frame_format = GEO_FRAMES.get(frag.get_fragment_type())
+    if frame_format is None or frag.get_data_size() < frame_format[0].sizeof():
+        return 0
+    frame_obj, stream_field = frame_format
+    dh = frame_obj(frag.get_data()).get_daqheader()
+    return make_geo_id(dh.det_id,dh.crate_id,dh.slot_id,getattr(dh,stream_field))
+
+def index_file_name(h5_file_name):
+    return h5_file_name + ".index.npz"
+
+def get_records(h5_file):
+    #trigger records, or timeslices for timeslice files
+    try:
+        records = h5_file.get_all_trigger_record_ids()
+    except RuntimeError:
+        records = []
+    if len(records)==0:
+        records = h5_file.get_all_timeslice_ids()
+    return sorted(records)
+
+class FragmentIndex:
+    """
+    Fragment metadata of one raw data file (see INDEX_DTYPE), stored in a
+    sidecar npz file next to it so that selections don't need the HDF5 file.
+    Build with FragmentIndex.build or get_index, query with select.
+    """
+
+    def __init__(self,entries,file_name="",file_size=0,file_mtime=0.):
+        self.entries = entries
+        self.file_name = file_name
+        self.file_size = file_size
+        self.file_mtime = file_mtime
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def build(cls,h5_file_name,cache=None):
+        #cache: optional fragment_cache.FragmentCache the fragments are read through
+        h5_file = HDF5RawDataFile(h5_file_name)
+        rows = []
+        for r in get_records(h5_file):
+            for sid in h5_file.get_source_ids(r):
+                if cache is None:
+                    frag = h5_file.get_frag(r,sid)
+                else:
+                    frag = rawdatautils.unpack.fragment_cache.get_frag(h5_file,r,sid,cache=cache)
+                frh = frag.get_header()
+                rows.append((r[0], r[1], frag.get_run_number(),
+                             int(sid.subsystem), sid.id, get_geo_id(frag),
+                             frag.get_detector_id(), int(frag.get_fragment_type()),
+                             frag.get_size(), frh.error_bits,
+                             frag.get_trigger_timestamp(), frag.get_window_begin(), frag.get_window_end()))
+        stat = os.stat(h5_file_name)
+        return cls(np.array(rows,dtype=INDEX_DTYPE),h5_file_name,stat.st_size,stat.st_mtime)
+
+    def save(self,filename=None):
+        if filename is None:
+            filename = index_file_name(self.file_name)
+        #write then rename so that readers never see a partial index
+        tmp_name = filename + ".tmp.npz"
+        np.savez_compressed(tmp_name,
+                            entries=self.entries,
+                            version=INDEX_VERSION,
+                            file_name=self.file_name,
+                            file_size=self.file_size,
+                            file_mtime=self.file_mtime)
+        os.replace(tmp_name,filename)
+        return filename
+
+    @classmethod
+    def load(cls,filename):
+        with np.load(filename) as f:
+            if int(f["version"]) != INDEX_VERSION:
+                raise ValueError(f"{filename} has index version {int(f['version'])}, expected {INDEX_VERSION}")
+            return cls(f["entries"],str(f["file_name"]),int(f["file_size"]),float(f["file_mtime"]))
+
+    def is_stale(self):
+        #True if the raw file changed (or is gone) since the index was built
+        try:
+            stat = os.stat(self.file_name)
+        except OSError:
+            return True
+        return stat.st_size != self.file_size or stat.st_mtime != self.file_mtime
+
+    def mask(self,has_errors=None,**criteria):
+        """
+        Boolean mask of the entries matching all criteria. Each keyword is a
+        field of INDEX_DTYPE with a value, a list of values or a callable
+        taking the field array. Fragment types can be given as FragmentType.
+        has_errors=True/False selects on non-zero error bits.
+        """
+        mask = np.ones(len(self.entries),dtype=bool)
+        for field, value in criteria.items():
+            if field not in INDEX_DTYPE.names:
+                raise ValueError(f"Unknown index field {field}")
+            col = self.entries[field]
+            if callable(value):
+                mask &= np.broadcast_to(np.asarray(value(col),dtype=bool),mask.shape)
+            elif isinstance(value,(list,tuple,set,np.ndarray)):
+                mask &= np.isin(col,[ int(v) for v in value ])
+            else:
+                mask &= col == int(value)
+        if has_errors is not None:
+            mask &= (self.entries["error_bits"]!=0) == bool(has_errors)
+        return mask
+
+    def select(self,has_errors=None,**criteria):
+        #entries matching the criteria, see mask
+        return self.entries[self.mask(has_errors=has_errors,**criteria)]
+
+    def records(self,has_errors=None,**criteria):
+        #(record, sequence) ids with at least one matching fragment
+        sel = self.select(has_errors=has_errors,**criteria)
+        return sorted(set(zip(sel["record"].tolist(),sel["sequence"].tolist())))
+
+def get_index(h5_file_name,rebuild=False,cache=None):
+    #sidecar index of a raw data file, (re)built and saved if missing or stale
+    filename = index_file_name(h5_file_name)
+    if not rebuild and os.path.exists(filename):
+        index = FragmentIndex.load(filename)
+        if not index.is_stale():
+            return index
+    index = FragmentIndex.build(h5_file_name,cache=cache)
+    index.save(filename)
+    return index
@@ -0,0 +1,117 @@
+#general imports
+import contextlib
+import json
+import time
+
+#one shared no-op context, returned when instrumentation is disabled
+_null_stage = contextlib.nullcontext()
+
+class StageStats:
+
+    __slots__ = ("calls", "wall_time", "n_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_time = 0.
+        self.n_bytes = 0
+
+    def to_dict(self):
+        return { "calls": self.calls, "wall_time": self.wall_time, "n_bytes": self.n_bytes }
+
+class _StageTimer:
+
+    __slots__ = ("stats", "n_bytes", "t_start")
+
+    def __init__(self, stats, n_bytes):
+        self.stats = stats
+        self.n_bytes = n_bytes
+
+    def __enter__(self):
+        self.t_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.wall_time += time.perf_counter()-self.t_start
+        self.stats.calls += 1
+        self.stats.n_bytes += self.n_bytes
+        return False
+
+class Instrumentation:
+    """
+    Registry of per-(unpacker class, stage) wall time, call and byte counters.
+
+    Disabled by default: stage() then returns a shared no-op context, so the
+    instrumented code paths cost one attribute lookup and a function call.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stats = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.stats = {}
+
+    def get_stats(self, unpacker_name, stage_name):
+        key = (unpacker_name, stage_name)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = StageStats()
+        return stats
+
+    def stage(self, unpacker, stage_name, n_bytes=0):
+        if not self.enabled:
+            return _null_stage
+        return _StageTimer(self.get_stats(type(unpacker).__name__, stage_name), n_bytes)
+
+    def record(self, unpacker_name, stage_name, wall_time, n_bytes=0, calls=1):
+        if not self.enabled:
+            return
+        stats = self.get_stats(unpacker_name, stage_name)
+        stats.wall_time += wall_time
+        stats.calls += calls
+        stats.n_bytes += n_bytes
+
+    def summary_rows(self):
+        rows = []
+        for (unpacker_name, stage_name), stats in sorted(self.stats.items()):
+            rows.append({ "unpacker": unpacker_name,
+                          "stage": stage_name,
+                          "calls": stats.calls,
+                          "wall_time": stats.wall_time,
+                          "time_per_call": stats.wall_time/stats.calls if stats.calls else 0.,
+                          "n_bytes": stats.n_bytes,
+                          "throughput_MBps": stats.n_bytes/stats.wall_time/1e6 if stats.wall_time>0 else 0. })
+        return rows
+
+    def summary_table(self):
+        rows = self.summary_rows()
+        if len(rows)==0:
+            return "No instrumentation data recorded."
+        unpacker_len = max(len("Unpacker"), max(len(row["unpacker"]) for row in rows))
+        stage_len = max(len("Stage"), max(len(row["stage"]) for row in rows))
+        fmtstring = f"%-{unpacker_len}s|%-{stage_len}s|%10s|%12s|%14s|%14s|%12s|"
+        lines = [ fmtstring % ("Unpacker", "Stage", "calls", "total (s)", "per call (us)", "bytes", "MB/s") ]
+        lines.append("-"*len(lines[0]))
+        for row in rows:
+            lines.append(fmtstring % (row["unpacker"], row["stage"], row["calls"],
+                                      f'{row["wall_time"]:.4f}',
+                                      f'{row["time_per_call"]*1e6:.1f}',
+                                      row["n_bytes"],
+                                      f'{row["throughput_MBps"]:.1f}'))
+        return "\n".join(lines)
+
+    def to_json(self, filename=None, indent=2):
+        json_str = json.dumps(self.summary_rows(), indent=indent)
+        if filename is not None:
+            with open(filename, "w") as f:
+                f.write(json_str)
+        return json_str
+
+#default registry shared by all Unpacker instances (see Unpacker.instrumentation)
+registry = Instrumentation()
@@ -0,0 +1,154 @@
+#general imports
+import bisect
+import math
+import time
+
+_MASK64 = 0xffffffffffffffff
+
+def splitmix64(x):
+    #stateless 64-bit mixer, used to turn (seed, trigger number) into a uniform value
+    x = (x + 0x9e3779b97f4a7c15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return x ^ (x >> 31)
+
+class Prescaler:
+
+    is_adaptive = False
+
+    def accept(self,trigger_number):
+        return True
+
+    def update(self,cost):
+        pass
+
+class FixedPrescaler(Prescaler):
+
+    def __init__(self,prescale=1):
+        self.prescale = int(prescale)
+
+    def accept(self,trigger_number):
+        return (trigger_number % self.prescale)==0
+
+class AdaptivePrescaler(Prescaler):
+    """
+    Prescaler that adjusts its prescale to stay within a processing budget.
+
+    cpu_budget is the fraction of wall-clock time the product may use (e.g. 0.25
+    for a quarter of a core), products_per_second caps the product rate; either
+    or both can be given. The prescale is re-evaluated every update_interval
+    offered triggers from the measured cost per accepted trigger, and is
+    quantized to powers of two between min_prescale and max_prescale.
+
+    accept() may be called for every fragment: the decision is made once per
+    trigger number and repeated for the other fragments of the same trigger,
+    so prescale changes only take effect at trigger boundaries.
+
+    Trigger selection is a pure function of (seed, trigger number, prescale):
+    a trigger accepted at prescale P is also accepted at any prescale below P.
+    Every prescale change is appended to schedule as (trigger_number, prescale);
+    passing that schedule back in replays exactly the same selection when a
+    file is reprocessed, independent of the measured timing.
+    """
+
+    is_adaptive = True
+
+    def __init__(self,cpu_budget=None,products_per_second=None,seed=0,
+                 min_prescale=1,max_prescale=1<<20,update_interval=64,
+                 schedule=None,clock=time.monotonic):
+
+        if cpu_budget is None and products_per_second is None and schedule is None:
+            raise ValueError("AdaptivePrescaler needs a cpu_budget, a products_per_second budget or a schedule")
+
+        self.cpu_budget = cpu_budget
+        self.products_per_second = products_per_second
+        self.seed = int(seed) & _MASK64
+        self.min_prescale = max(1,int(min_prescale))
+        self.max_prescale = max(self.min_prescale,int(max_prescale))
+        self.update_interval = max(1,int(update_interval))
+        self.clock = clock
+
+        self.replay = schedule is not None
+        #kept in the order the changes were made, which is ascending trigger number
+        self.schedule = list(schedule) if schedule is not None else []
+        self._schedule_triggers = [ s[0] for s in self.schedule ]
+
+        self.prescale = self.min_prescale
+        self.last_accepted = False
+        self.last_trigger = None
+
+        self._n_offered = 0
+        self._n_accepted = 0
+        self._cost = 0.
+        self._window_start = None
+
+    def selection_value(self,trigger_number):
+        #uniform in [0,1), fixed for a given seed and trigger number
+        return splitmix64(self.seed ^ ((int(trigger_number)*0x9e3779b97f4a7c15) & _MASK64)) / 18446744073709551616.
+
+    def prescale_for_trigger(self,trigger_number):
+        i = bisect.bisect_right(self._schedule_triggers,trigger_number)
+        return self.schedule[i-1][1] if i>0 else self.min_prescale
+
+    def accept(self,trigger_number):
+        if trigger_number==self.last_trigger:
+            return self.last_accepted
+        self.last_trigger = trigger_number
+
+        if self.replay:
+            self.prescale = self.prescale_for_trigger(trigger_number)
+        else:
+            if self._window_start is None:
+                self._window_start = self.clock()
+                if len(self.schedule)==0:
+                    self.schedule.append((trigger_number,self.prescale))
+                    self._schedule_triggers.append(trigger_number)
+            self._n_offered += 1
+            if self._n_offered >= self.update_interval:
+                self.adjust(trigger_number)
+
+        self.last_accepted = self.selection_value(trigger_number)*self.prescale < 1.
+        if self.last_accepted:
+            self._n_accepted += 1
+        return self.last_accepted
+
+    def update(self,cost):
+        #cost (seconds) of a fragment of the trigger of the last accept() call
+        if self.last_accepted:
+            self._cost += cost
+
+    def adjust(self,trigger_number):
+        now = self.clock()
+        elapsed = now - self._window_start
+
+        if elapsed>0 and self._n_accepted>0:
+            offered_rate = self._n_offered / elapsed
+            allowed_rate = math.inf
+            if self.cpu_budget is not None:
+                cost_per_trigger = self._cost / self._n_accepted
+                if cost_per_trigger>0:
+                    allowed_rate = self.cpu_budget / cost_per_trigger
+            if self.products_per_second is not None:
+                allowed_rate = min(allowed_rate,self.products_per_second)
+
+            target = offered_rate / allowed_rate if allowed_rate>0 else math.inf
+            prescale = 1 if target<=1 else 1<<math.ceil(math.log2(min(target,self.max_prescale)))
+            prescale = min(max(prescale,self.min_prescale),self.max_prescale)
+
+            if prescale!=self.prescale:
+                self.prescale = prescale
+                self.schedule.append((trigger_number,prescale))
+                self._schedule_triggers.append(trigger_number)
+
+        self._n_offered = 0
+        self._n_accepted = 0
+        self._cost = 0.
+        self._window_start = now
+
+def make_prescaler(prescale):
+    #None/0 disables the product, ints keep the fixed modulo behaviour
+    if isinstance(prescale,Prescaler):
+        return prescale
+    if not prescale:
+        return None
+    return FixedPrescaler(prescale)
@@ -0,0 +1,128 @@
+#dunedaq imports
+import daqdataformats
+import detdataformats
+import fddetdataformats
+
+#unpacker imports
+from rawdatautils.unpack.utils import *
+
+#detector data version of the first frame, for the fragment types that have one;
+#only read when version-specific unpackers are registered for the fragment type
+DET_DATA_VERSION_GETTERS = { daqdataformats.FragmentType.kProtoWIB: lambda frag: fddetdataformats.WIBFrame(frag.get_data()).get_wib_header().version,
+                             daqdataformats.FragmentType.kWIB: lambda frag: fddetdataformats.WIB2Frame(frag.get_data()).get_header().version,
+                             daqdataformats.FragmentType.kWIBEth: lambda frag: fddetdataformats.WIBEthFrame(frag.get_data()).get_wibheader().version }
+
+class UnpackerRegistry:
+    """
+    Maps (subdetector, fragment type, version) to unpacker factories, so that
+    the fragments of mixed records go to the right Unpacker without the
+    driver loop knowing which detectors are in the file.
+
+    Factories are called without arguments the first time their entry is
+    used and the unpacker is kept, so each entry has one instance across all
+    the fragments (and prescalers/accumulators keep their state). subdetector
+    and version None match any value; the most specific entry wins, in the
+    order (subdetector, type, version), (subdetector, type), (type, version),
+    (type). The result is cached per detector ID and fragment type (and
+    version), so dispatching a fragment is a dictionary lookup.
+    """
+
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        self.version_getters = dict(DET_DATA_VERSION_GETTERS)
+        self.versioned_types = set()
+        self.dispatch = {}
+        #header-only unpacking of the fragments without a registered unpacker
+        self.fallback = FragmentUnpacker()
+
+    def register(self,fragment_type,factory,subdetector=None,version=None,version_getter=None):
+        if version_getter is not None:
+            self.version_getters[fragment_type] = version_getter
+        if version is not None:
+            if fragment_type not in self.version_getters:
+                raise ValueError(f"No way to read the detector data version of fragment type {fragment_type}, pass a version_getter")
+            self.versioned_types.add(fragment_type)
+        key = (subdetector, fragment_type, version)
+        self.factories[key] = factory
+        self.instances.pop(key,None)
+        self.dispatch.clear()
+
+    def get_entry(self,subdetector,fragment_type,version=None):
+        for key in ((subdetector, fragment_type, version),
+                    (subdetector, fragment_type, None),
+                    (None, fragment_type, version),
+                    (None, fragment_type, None)):
+            if key in self.factories:
+                return key
+        return None
+
+    def get_factory(self,subdetector,fragment_type,version=None):
+        #factory of the most specific entry, None if there is none
+        entry = self.get_entry(subdetector,fragment_type,version)
+        return self.factories[entry] if entry is not None else None
+
+    def get_instance(self,key):
+        unpacker = self.instances.get(key)
+        if unpacker is None:
+            unpacker = self.factories[key]()
+            self.instances[key] = unpacker
+        return unpacker
+
+    def get_unpacker(self,frag):
+        #registered unpacker of the fragment, None if there is none
+        fragment_type = frag.get_fragment_type()
+        key = (frag.get_detector_id(), fragment_type, None)
+        if fragment_type in self.versioned_types and frag.get_data_size()>0:
+            key = (key[0], fragment_type, self.version_getters[fragment_type](frag))
+        try:
+            return self.dispatch[key]
+        except KeyError:
+            pass
+        entry = self.get_entry(detdataformats.DetID.Subdetector(key[0]),fragment_type,key[2])
+        unpacker = self.get_instance(entry) if entry is not None else None
+        self.dispatch[key] = unpacker
+        return unpacker
+
+    def get_all_data(self,frag):
+        unpacker = self.get_unpacker(frag)
+        if unpacker is None:
+            unpacker = self.fallback
+        return unpacker.get_all_data(frag)
+
+    def flush(self):
+        #end of a record: lets the unpackers hand their per-record batches to their accumulators
+        for unpacker in self.instances.values():
+            if hasattr(unpacker,"flush"):
+                unpacker.flush()
+
+    def get_unpackers(self):
+        #the unpackers created so far, e.g. to read their accumulators at the end of a run
+        return dict(self.instances)
+
+def make_channel_map_factory(unpacker_class,channel_map,**kwargs):
+    def factory():
+        if channel_map is None:
+            raise ValueError(f"{unpacker_class.__name__} needs a channel map")
+        return unpacker_class(channel_map,**kwargs)
+    return factory
+
+def make_default_registry(channel_map=None,ana_data_prescale=1,wvfm_data_prescale=None):
+    """
+    Registry with an entry for every frame format the C++ unpackers support:
+    WIB, WIB2, WIBEth, DAPHNE, DAPHNEStream, TDE, CRT and trigger primitives,
+    for any subdetector. The TPC formats need channel_map, only when one of
+    their fragments is met. Detector-specific unpackers can be registered on
+    top, e.g. registry.register(FragmentType.kWIBEth, factory, subdetector=DetID.Subdetector.kVD_BottomTPC).
+    """
+    prescales = { "ana_data_prescale": ana_data_prescale, "wvfm_data_prescale": wvfm_data_prescale }
+    registry = UnpackerRegistry()
+    registry.register(daqdataformats.FragmentType.kProtoWIB,make_channel_map_factory(WIBUnpacker,channel_map,**prescales))
+    registry.register(daqdataformats.FragmentType.kWIB,make_channel_map_factory(WIB2Unpacker,channel_map,**prescales))
+    registry.register(daqdataformats.FragmentType.kWIBEth,make_channel_map_factory(WIBEthUnpacker,channel_map,**prescales))
+    registry.register(daqdataformats.FragmentType.kDAPHNE,lambda: DAPHNEUnpacker(**prescales))
+    registry.register(daqdataformats.FragmentType.kDAPHNEStream,lambda: DAPHNEStreamUnpacker(**prescales))
+    registry.register(daqdataformats.FragmentType.kTDE_AMC,lambda: TDEUnpacker(**prescales))
+    registry.register(daqdataformats.FragmentType.kCRT,lambda: CRTUnpacker(**prescales))
+    registry.register(daqdataformats.FragmentType.kTriggerPrimitive,TriggerPrimitiveUnpacker)
+    return registry
@@ -0,0 +1,345 @@
+#general imports
+import time
+
+#dunedaq imports
+import daqdataformats
+import detdataformats
+
+#unpacker imports
+from rawdatautils.unpack.utils import get_type_string
+from rawdatautils.unpack.registry import UnpackerRegistry
+import rawdatautils.unpack.fragment_cache
+import rawdatautils.unpack.wib
+import rawdatautils.unpack.wib2
+import rawdatautils.unpack.wibeth
+import rawdatautils.unpack.daphne
+import rawdatautils.unpack.tde
+import rawdatautils.unpack.crt
+import rawdatautils.unpack.tp
+import rawdatautils.analysis.wib2
+import rawdatautils.analysis.wibeth
+from rawdatautils.analysis.trigger_primitives import TPSummary
+
+#analysis imports
+import numpy as np
+
+class FragmentTypeSummary:
+    """
+    Summary of all the fragments of one type string (subdetector and fragment
+    type) seen in a scan: counts, sizes, error bits and source IDs. Subclasses
+    add the checks of their detector data in add_data and report them in
+    summary_lines.
+    """
+
+    def __init__(self,type_string):
+        self.type_string = type_string
+        self.n_fragments = 0
+        self.n_empty = 0
+        self.n_errors = 0
+        self.n_bytes = 0
+        self.src_ids = set()
+        self.bad_src_ids = set()
+
+    def add(self,frag):
+        frh = frag.get_header()
+        self.n_fragments += 1
+        self.n_bytes += frh.size
+        self.src_ids.add(frh.element_id.id)
+        if frh.error_bits!=0:
+            self.n_errors += 1
+            self.bad_src_ids.add(frh.element_id.id)
+        if frag.get_data_size()==0:
+            self.n_empty += 1
+            return
+        self.add_data(frag)
+
+    def add_data(self,frag):
+        pass
+
+    def summary_lines(self):
+        return []
+
+class FrameSummary(FragmentTypeSummary):
+    #frame count and, for formats with a fixed sampling period, timestamp continuity within each fragment
+
+    unpacker = None
+    SAMPLING_PERIOD = None
+
+    def __init__(self,type_string):
+        super().__init__(type_string)
+        self.n_frames = 0
+        self.n_ts_jumps = 0
+
+    def get_timestamps(self,frag):
+        return self.unpacker.np_array_timestamp(frag)
+
+    def get_n_frames(self,frag,timestamps):
+        return len(timestamps)
+
+    def add_data(self,frag):
+        timestamps = np.asarray(self.get_timestamps(frag),dtype=np.int64)
+        self.n_frames += self.get_n_frames(frag,timestamps)
+        if self.SAMPLING_PERIOD is not None and len(timestamps)>1:
+            n_jumps = np.count_nonzero(np.diff(timestamps)!=self.SAMPLING_PERIOD)
+            if n_jumps>0:
+                self.n_ts_jumps += n_jumps
+                self.bad_src_ids.add(frag.get_header().element_id.id)
+
+    def summary_lines(self):
+        lines = [ f"frames: {self.n_frames}" ]
+        if self.SAMPLING_PERIOD is not None:
+            lines.append(f"timestamp jumps (expected diff {self.SAMPLING_PERIOD}): {self.n_ts_jumps}")
+        return lines
+
+class ADCStatsSummary(FrameSummary):
+    #pedestal, RMS and stuck-code fraction over all channels of all fragments
+
+    def __init__(self,type_string):
+        super().__init__(type_string)
+        self.n_samples = 0
+        self.adc_sum = 0.
+        self.rms_sum = 0.
+        self.n_channel_fragments = 0
+        self.n_flat = 0
+        self.n_stuck = 0
+        self.n_stuck_checked = 0
+
+    def get_adc_stats(self,frag):
+        #dict with the per-channel n_samples, mean, rms, min, max and n_stuck, as the analysis kernels return
+        adcs = np.asarray(self.unpacker.np_array_adc(frag))
+        if adcs.size==0:
+            return { "n_samples": 0 }
+        adcs = adcs.reshape(adcs.shape[0],-1)
+        return { "n_samples": adcs.shape[0],
+                 "mean": np.mean(adcs,axis=0),
+                 "rms": np.std(adcs,axis=0),
+                 "min": np.min(adcs,axis=0),
+                 "max": np.max(adcs,axis=0),
+                 "n_stuck": None }
+
+    def add_data(self,frag):
+        super().add_data(frag)
+        stats = self.get_adc_stats(frag)
+        if stats["n_samples"]==0:
+            return
+        n_channels = len(stats["mean"])
+        self.n_samples += stats["n_samples"]*n_channels
+        self.adc_sum += float(np.sum(stats["mean"]))*stats["n_samples"]
+        self.rms_sum += float(np.sum(stats["rms"]))
+        self.n_channel_fragments += n_channels
+        self.n_flat += int(np.count_nonzero(stats["max"]==stats["min"]))
+        if stats["n_stuck"] is not None:
+            self.n_stuck += int(np.sum(stats["n_stuck"]))
+            self.n_stuck_checked += stats["n_samples"]*n_channels
+
+    def summary_lines(self):
+        lines = super().summary_lines()
+        if self.n_channel_fragments>0:
+            lines.append(f"ADC pedestal / RMS: {self.adc_sum/self.n_samples:.1f} / {self.rms_sum/self.n_channel_fragments:.2f}")
+            lines.append(f"flat channels (in fragments): {self.n_flat} of {self.n_channel_fragments}")
+            if self.n_stuck_checked>0:
+                lines.append(f"stuck codes: {100.*self.n_stuck/self.n_stuck_checked:.3f}%")
+        return lines
+
+class WIBSummary(ADCStatsSummary):
+    unpacker = rawdatautils.unpack.wib
+    SAMPLING_PERIOD = 25
+
+class WIB2Summary(ADCStatsSummary):
+    unpacker = rawdatautils.unpack.wib2
+    analysis = rawdatautils.analysis.wib2
+    SAMPLING_PERIOD = 32
+
+    def get_adc_stats(self,frag):
+        #one pass over the packed frames, no unpacking
+        return self.analysis.adc_stats(frag)
+
+class WIBEthSummary(WIB2Summary):
+    unpacker = rawdatautils.unpack.wibeth
+    analysis = rawdatautils.analysis.wibeth
+    SAMPLING_PERIOD = 32
+
+    def get_n_frames(self,frag,timestamps):
+        #one timestamp per sample, several samples per frame
+        return self.unpacker.get_n_frames(frag)
+
+class DAPHNEStreamSummary(ADCStatsSummary):
+    unpacker = rawdatautils.unpack.daphne
+    SAMPLING_PERIOD = 1
+
+    def get_timestamps(self,frag):
+        return self.unpacker.np_array_timestamp_stream(frag)
+
+    def get_adc_stats(self,frag):
+        adcs = self.unpacker.np_array_adc_stream(frag)
+        if adcs.size==0:
+            return { "n_samples": 0 }
+        return { "n_samples": adcs.shape[0],
+                 "mean": np.mean(adcs,axis=0),
+                 "rms": np.std(adcs,axis=0),
+                 "min": np.min(adcs,axis=0),
+                 "max": np.max(adcs,axis=0),
+                 "n_stuck": None }
+
+class ChannelFrameSummary(FrameSummary):
+    #self-triggered/irregular frames: frame count and number of distinct channels
+
+    def __init__(self,type_string):
+        super().__init__(type_string)
+        self.channels = set()
+
+    def get_channels(self,frag):
+        return []
+
+    def add_data(self,frag):
+        super().add_data(frag)
+        self.channels.update(np.unique(self.get_channels(frag)).tolist())
+
+    def summary_lines(self):
+        return super().summary_lines() + [ f"distinct channels: {len(self.channels)}" ]
+
+class DAPHNESummary(ChannelFrameSummary):
+    unpacker = rawdatautils.unpack.daphne
+
+    def get_channels(self,frag):
+        return self.unpacker.np_array_channels(frag)
+
+class TDESummary(ChannelFrameSummary):
+    unpacker = rawdatautils.unpack.tde
+
+    def get_timestamps(self,frag):
+        return self.unpacker.np_array_timestamp_data(frag)
+
+    def get_channels(self,frag):
+        return self.unpacker.np_array_channel_data(frag)
+
+class CRTSummary(ChannelFrameSummary):
+    #the "channels" of a CRT summary are its modules
+    unpacker = rawdatautils.unpack.crt
+
+    def get_channels(self,frag):
+        return self.unpacker.np_array_modules(frag)
+
+    def summary_lines(self):
+        return [ f"hits: {self.n_frames}", f"distinct modules: {len(self.channels)}" ]
+
+class TriggerPrimitiveSummary(FragmentTypeSummary):
+
+    unpacker = rawdatautils.unpack.tp
+
+    def __init__(self,type_string):
+        super().__init__(type_string)
+        self.tp_summary = TPSummary()
+
+    def add_data(self,frag):
+        frh = frag.get_header()
+        self.tp_summary.add(self.unpacker.np_array_tp(frag),duration=frh.window_end-frh.window_begin)
+
+    def summary_lines(self):
+        tps = self.tp_summary
+        lines = [ f"TPs: {tps.n_tps} on {len(tps.channels)} channels" ]
+        if tps.n_tps>0:
+            channels, rates = tps.rates()
+            lines.append(f"TP rate per channel (Hz) median / max: {np.median(rates):.1f} / {np.max(rates):.1f}")
+        return lines
+
+#summary class of each supported fragment type; other fragment types only get the common counts
+scan_summary_classes = { daqdataformats.FragmentType.kProtoWIB: WIBSummary,
+                         daqdataformats.FragmentType.kWIB: WIB2Summary,
+                         daqdataformats.FragmentType.kWIBEth: WIBEthSummary,
+                         daqdataformats.FragmentType.kDAPHNE: DAPHNESummary,
+                         daqdataformats.FragmentType.kDAPHNEStream: DAPHNEStreamSummary,
+                         daqdataformats.FragmentType.kTDE_AMC: TDESummary,
+                         daqdataformats.FragmentType.kCRT: CRTSummary,
+                         daqdataformats.FragmentType.kTriggerPrimitive: TriggerPrimitiveSummary }
+
+def make_summary_registry():
+    #UnpackerRegistry of the summary classes, for any subdetector; the scanner creates
+    #one summary per type string with the class of the most specific entry
+    registry = UnpackerRegistry()
+    for fragment_type, summary_class in scan_summary_classes.items():
+        registry.register(fragment_type,summary_class)
+    return registry
+
+class RecordScanner:
+    """
+    Walks the records of a file once, sending every fragment to the summary
+    of its type string (subdetector and fragment type, as in
+    FragmentUnpacker.get_all_data), created on first use, so that all the
+    detectors of a file are checked in a single pass.
+
+    subdetectors and fragment_types optionally restrict the scan, as
+    DetID.Subdetector and FragmentType values. With a cache
+    (fragment_cache.FragmentCache), fragments are read through it.
+
+    Summary classes are looked up by (subdetector, fragment type) in
+    summary_registry (make_summary_registry by default), with the wildcards
+    of UnpackerRegistry, so detector-specific summaries can be registered,
+    e.g. scanner.summary_registry.register(FragmentType.kWIBEth, MySummary, subdetector=DetID.Subdetector.kVD_BottomTPC).
+    """
+
+    def __init__(self,subdetectors=None,fragment_types=None,cache=None,summary_registry=None):
+        self.subdetectors = set(subdetectors) if subdetectors is not None else None
+        self.fragment_types = set(fragment_types) if fragment_types is not None else None
+        self.cache = cache
+        self.summary_registry = summary_registry if summary_registry is not None else make_summary_registry()
+        self.summaries = {}
+        self.n_records = 0
+        self.n_fragments = 0
+        self.scan_time = 0.
+
+    def get_summary(self,frag):
+        key = (frag.get_detector_id(),frag.get_fragment_type())
+        summary = self.summaries.get(key)
+        if summary is None:
+            summary_class = self.summary_registry.get_factory(detdataformats.DetID.Subdetector(key[0]),key[1])
+            summary = (summary_class if summary_class is not None else FragmentTypeSummary)(get_type_string(frag))
+            self.summaries[key] = summary
+        return summary
+
+    def accept(self,frag):
+        if self.fragment_types is not None and frag.get_fragment_type() not in self.fragment_types:
+            return False
+        if self.subdetectors is not None and detdataformats.DetID.Subdetector(frag.get_detector_id()) not in self.subdetectors:
+            return False
+        return True
+
+    def get_frag(self,h5_file,record,sid):
+        if self.cache is None:
+            return h5_file.get_frag(record,sid)
+        return rawdatautils.unpack.fragment_cache.get_frag(h5_file,record,sid,cache=self.cache)
+
+    def add_fragment(self,frag):
+        if not self.accept(frag):
+            return
+        self.n_fragments += 1
+        self.get_summary(frag).add(frag)
+
+    def add_record(self,h5_file,record,on_fragment=None):
+        #on_fragment(frag) is called on every fragment read, so other processing can share the read
+        #(its time counts in scan_time)
+        t_start = time.perf_counter()
+        for sid in h5_file.get_source_ids(record):
+            frag = self.get_frag(h5_file,record,sid)
+            self.add_fragment(frag)
+            if on_fragment is not None:
+                on_fragment(frag)
+        self.n_records += 1
+        self.scan_time += time.perf_counter()-t_start
+
+    def scan(self,h5_file,records=None):
+        if records is None:
+            records = h5_file.get_all_record_ids()
+        for record in records:
+            self.add_record(h5_file,record)
+        return self
+
+    def summary_lines(self):
+        lines = [ f"Scanned {self.n_fragments} fragments in {self.n_records} records ({self.scan_time:.2f} s)" ]
+        for summary in sorted(self.summaries.values(),key=lambda s: s.type_string):
+            lines.append(f"{summary.type_string}: {summary.n_fragments} fragments from {len(summary.src_ids)} sources, "
+                         f"{summary.n_bytes/1e6:.1f} MB, {summary.n_errors} with error bits, {summary.n_empty} empty")
+            lines += [ f"    {line}" for line in summary.summary_lines() ]
+            if len(summary.bad_src_ids)>0:
+                lines.append(f"    sources with errors or timestamp jumps: {sorted(summary.bad_src_ids)}")
+        return lines
@@ -0,0 +1,165 @@
+#general imports
+from dataclasses import dataclass
+import numpy as np
+
+#dunedaq imports
+import daqdataformats
+
+#unpacker imports
+import rawdatautils.unpack.wibeth
+import rawdatautils.unpack.daphne
+import rawdatautils.unpack.fragment_cache
+
+@dataclass
+class StreamChunk:
+
+    src_id: int
+    #contiguous samples: timestamps (n_samples,), adcs (n_samples, n_channels)
+    timestamps: np.ndarray
+    adcs: np.ndarray
+    #timeslices the samples come from
+    first_record: tuple
+    last_record: tuple
+    #ticks missing between the end of the previous chunk of this link and this one, 0 if contiguous
+    gap_before: int
+    #duplicate samples already seen in earlier timeslices, dropped from this chunk
+    n_trimmed: int
+
+def unpack_wibeth(frag):
+    return rawdatautils.unpack.wibeth.np_array_timestamp(frag), rawdatautils.unpack.wibeth.np_array_adc(frag)
+
+def unpack_daphne_stream(frag):
+    return rawdatautils.unpack.daphne.np_array_timestamp_stream(frag), rawdatautils.unpack.daphne.np_array_adc_stream(frag)
+
+#(unpack function, sampling period in ticks) per supported fragment type
+STREAM_FORMATS = { daqdataformats.FragmentType.kWIBEth: (unpack_wibeth, 32),
+                   daqdataformats.FragmentType.kDAPHNEStream: (unpack_daphne_stream, 1) }
+
+class LinkStream:
+    #pending contiguous pieces of one link and the timestamp its stream has reached
+
+    def __init__(self,src_id,sampling_period):
+        self.src_id = src_id
+        self.sampling_period = sampling_period
+        self.next_timestamp = None
+        self.pieces = []
+        self.first_record = None
+        self.last_record = None
+        self.gap_before = 0
+        self.n_trimmed = 0
+
+    def flush(self):
+        if len(self.pieces)==0:
+            return None
+        chunk = StreamChunk(src_id=self.src_id,
+                            timestamps=np.concatenate([ p[0] for p in self.pieces ]),
+                            adcs=np.concatenate([ p[1] for p in self.pieces ]),
+                            first_record=self.first_record,
+                            last_record=self.last_record,
+                            gap_before=self.gap_before,
+                            n_trimmed=self.n_trimmed)
+        self.pieces = []
+        self.gap_before = 0
+        self.n_trimmed = 0
+        return chunk
+
+class TimeSliceStitcher:
+    """
+    Turns the WIBEth/DAPHNEStream fragments of consecutive timeslices into a
+    continuous stream per link (source ID).
+
+    Samples already seen in an earlier timeslice of the same link (overlapping
+    timeslice windows) are trimmed. A link's pending samples are yielded as one
+    StreamChunk whenever its stream is discontinuous (a gap in the timestamps,
+    reported in gap_before of the next chunk), and at the end. At most
+    max_chunks pending pieces (contiguous parts of unpacked fragments) are held
+    in memory over all links: when the limit is reached, the link holding the
+    most is flushed early, so one continuous stretch can come out as several
+    consecutive chunks with gap_before 0.
+    """
+
+    def __init__(self,h5_file,src_ids=None,max_chunks=16,cache=None):
+        self.h5_file = h5_file
+        self.src_ids = set(src_ids) if src_ids is not None else None
+        self.max_chunks = max(int(max_chunks),1)
+        self.cache = cache
+        self.links = {}
+        self.n_pending = 0
+
+    def get_records(self):
+        return sorted(self.h5_file.get_all_timeslice_ids())
+
+    def get_frag(self,record,sid):
+        if self.cache is None:
+            return self.h5_file.get_frag(record,sid)
+        return rawdatautils.unpack.fragment_cache.get_frag(self.h5_file,record,sid,cache=self.cache)
+
+    def add_fragment(self,link,record,timestamps,adcs):
+        #yields the chunks completed by adding this fragment's samples
+        if len(timestamps)==0:
+            return
+        if link.next_timestamp is not None:
+            #drop samples already seen (timestamps are increasing within a fragment)
+            n_trim = int(np.searchsorted(timestamps,np.array(link.next_timestamp,dtype=timestamps.dtype)))
+            if n_trim==len(timestamps):
+                link.n_trimmed += n_trim
+                return
+            timestamps, adcs = timestamps[n_trim:], adcs[n_trim:]
+            gap = int(timestamps[0]) - link.next_timestamp
+        else:
+            n_trim, gap = 0, 0
+
+        #discontinuities inside the fragment split it into pieces
+        breaks = np.flatnonzero(np.diff(timestamps.astype(np.int64))!=link.sampling_period)+1
+        bounds = np.concatenate(([0],breaks,[len(timestamps)]))
+        for i in range(len(bounds)-1):
+            b, e = bounds[i], bounds[i+1]
+            if i>0:
+                gap = int(timestamps[b]) - int(timestamps[b-1]) - link.sampling_period
+            if gap!=0:
+                self.n_pending -= len(link.pieces)
+                chunk = link.flush()
+                if chunk is not None:
+                    yield chunk
+                link.gap_before = gap
+            if len(link.pieces)==0:
+                link.first_record = record
+            link.pieces.append((timestamps[b:e],adcs[b:e]))
+            link.last_record = record
+            link.n_trimmed += n_trim
+            n_trim = 0
+            self.n_pending += 1
+        link.next_timestamp = int(timestamps[-1]) + link.sampling_period
+
+        while self.n_pending >= self.max_chunks:
+            fullest = max(self.links.values(),key=lambda l: len(l.pieces))
+            self.n_pending -= len(fullest.pieces)
+            yield fullest.flush()
+
+    def iter_chunks(self):
+        for record in self.get_records():
+            for sid in self.h5_file.get_source_ids(record):
+                if sid.subsystem!=daqdataformats.SourceID.Subsystem.kDetectorReadout:
+                    continue
+                if self.src_ids is not None and sid.id not in self.src_ids:
+                    continue
+                frag = self.get_frag(record,sid)
+                frag_format = STREAM_FORMATS.get(frag.get_fragment_type())
+                if frag_format is None:
+                    continue
+                unpack, sampling_period = frag_format
+                link = self.links.get(sid.id)
+                if link is None:
+                    link = LinkStream(sid.id,sampling_period)
+                    self.links[sid.id] = link
+                timestamps, adcs = unpack(frag)
+                yield from self.add_fragment(link,record,timestamps,adcs)
+
+        for link in self.links.values():
+            self.n_pending -= len(link.pieces)
+            chunk = link.flush()
+            if chunk is not None:
+                yield chunk
+
+    def __iter__(self):
+        return self.iter_chunks()
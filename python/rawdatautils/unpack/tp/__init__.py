@@ -0,0 +1 @@
+from ..._daq_rawdatautils_py.unpack.tp import *
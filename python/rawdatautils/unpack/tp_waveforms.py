@@ -0,0 +1,163 @@
+#general imports
+from dataclasses import dataclass
+import numpy as np
+
+#dunedaq imports
+import daqdataformats
+import fddetdataformats
+import detchannelmaps
+
+#unpacker imports
+import rawdatautils.unpack.window
+
+@dataclass
+class TPWaveforms:
+
+    #(n_tp, width) ADC samples, fill_value where there is no data
+    adcs: np.ndarray
+    #(n_tp, width) True where the sample was found in a fragment
+    valid: np.ndarray
+    #(n_tp,) timestamp of the first sample of each snippet
+    timestamps: np.ndarray
+    #(n_tp, 4) (crate, slot, stream, chan) of each TP's channel, -1 if the channel is unknown
+    hw_channels: np.ndarray
+
+def pack_link(crate,slot,stream):
+    #one sortable integer per (crate, slot, stream)
+    return (np.asarray(crate,dtype=np.int64)<<32) | (np.asarray(slot,dtype=np.int64)<<16) | np.asarray(stream,dtype=np.int64)
+
+class InverseChannelMap:
+    """
+    Offline channel -> (crate, slot, stream, chan) lookup. The channel maps
+    only go from hardware to offline channels, so the inverse is filled link
+    by link from the links seen in the data (add_link) and kept in sorted
+    arrays for vectorized lookups.
+    """
+
+    N_CHANNELS_PER_LINK = 64
+
+    def __init__(self,channel_map):
+        self.channel_map = detchannelmaps.make_map(channel_map) if isinstance(channel_map,str) else channel_map
+        self.links = set()
+        self.offline_channels = np.zeros(0,dtype=np.int64)
+        self.hw_channels = np.zeros((0,4),dtype=np.int64)
+
+    def add_link(self,crate,slot,stream):
+        key = (int(crate),int(slot),int(stream))
+        if key in self.links:
+            return
+        self.links.add(key)
+        chans = np.arange(self.N_CHANNELS_PER_LINK)
+        offline = np.array([ self.channel_map.get_offline_channel_from_crate_slot_stream_chan(*key,int(c)) for c in chans ],dtype=np.int64)
+        hw = np.column_stack((np.full((len(chans),3),key,dtype=np.int64),chans))
+        offline = np.concatenate((self.offline_channels,offline))
+        hw = np.concatenate((self.hw_channels,hw))
+        order = np.argsort(offline,kind="stable")
+        self.offline_channels, self.hw_channels = offline[order], hw[order]
+
+    def lookup(self,channels):
+        #(n, 4) (crate, slot, stream, chan) per channel, -1 for channels not in the added links
+        channels = np.asarray(channels,dtype=np.int64)
+        hw = np.full((len(channels),4),-1,dtype=np.int64)
+        if len(self.offline_channels)==0:
+            return hw
+        pos = np.minimum(np.searchsorted(self.offline_channels,channels),len(self.offline_channels)-1)
+        found = self.offline_channels[pos]==channels
+        hw[found] = self.hw_channels[pos[found]]
+        return hw
+
+#inverse maps by channel map name, shared by all matchers of the process
+inverse_channel_maps = {}
+
+def get_inverse_channel_map(channel_map):
+    inverse = inverse_channel_maps.get(channel_map)
+    if inverse is None:
+        inverse = InverseChannelMap(channel_map)
+        inverse_channel_maps[channel_map] = inverse
+    return inverse
+
+class TPWaveformMatcher:
+    """
+    Extracts the raw WIBEth waveform around each trigger primitive of a
+    record: width samples per TP, pre_samples of them before time_peak.
+
+    TP (offline) channels are mapped back to their link and WIB channel with
+    the cached inverse channel map. Per link, the TP windows are merged into
+    contiguous time ranges and only the frames overlapping those ranges are
+    unpacked (see rawdatautils.unpack.window).
+    """
+
+    frame_obj = fddetdataformats.WIBEthFrame
+
+    def __init__(self,channel_map,width=64,pre_samples=None,fill_value=0):
+        self.inverse_map = get_inverse_channel_map(channel_map) if isinstance(channel_map,str) else InverseChannelMap(channel_map)
+        self.width = int(width)
+        self.pre_samples = self.width//2 if pre_samples is None else int(pre_samples)
+        self.fill_value = fill_value
+        self.extractor = rawdatautils.unpack.window.WIBEthWindowExtractor()
+        self.sampling_period = self.extractor.SAMPLING_PERIOD
+
+    def get_links(self,frags):
+        #{packed (crate, slot, stream): fragment} for the non-empty WIBEth fragments
+        links = {}
+        for frag in frags:
+            if frag.get_fragment_type()!=daqdataformats.FragmentType.kWIBEth or frag.get_data_size() < self.frame_obj.sizeof():
+                continue
+            dh = self.frame_obj(frag.get_data()).get_daqheader()
+            self.inverse_map.add_link(dh.crate_id,dh.slot_id,dh.stream_id)
+            links[int(pack_link(dh.crate_id,dh.slot_id,dh.stream_id))] = frag
+        return links
+
+    def fill_snippets(self,out,frag,sel,t0,chans):
+        #t0 (sorted) and chans of the TPs sel of one link; fills out.adcs/out.valid
+        offsets = np.arange(self.width,dtype=np.int64)*self.sampling_period
+        t1 = t0 + self.width*self.sampling_period
+        frame_span = self.extractor.get_frame_span(frag)
+
+        #merge TP windows closer than one frame into ranges decoded together
+        running_end = np.maximum.accumulate(t1)
+        breaks = np.flatnonzero(t0[1:] > running_end[:-1] + frame_span) + 1
+        bounds = np.concatenate(([0],breaks,[len(t0)]))
+        for b, e in zip(bounds[:-1],bounds[1:]):
+            first, last = self.extractor.find_frames(frag,max(int(t0[b]),0),max(int(running_end[e-1]),0))
+            if last==first:
+                continue
+            timestamps = self.extractor.unpack_timestamp(frag,first,last-first).astype(np.int64)
+            adcs = self.extractor.unpack_adc(frag,first,last-first)
+
+            idx = np.searchsorted(timestamps,t0[b:e])[:,None] + np.arange(self.width)
+            idx_c = np.minimum(idx,len(timestamps)-1)
+            #samples missing in the data (gaps, edges of the fragment) stay invalid
+            ok = (idx < len(timestamps)) & (timestamps[idx_c] == t0[b:e,None] + offsets)
+            rows = sel[b:e]
+            out.adcs[rows] = np.where(ok,adcs[idx_c,chans[b:e,None]],self.fill_value)
+            out.valid[rows] = ok
+
+    def match(self,tps,frags):
+        """
+        tps: TP structured array of the record (rawdatautils.unpack.tp.np_array_tp),
+        frags: its WIBEth fragments. Returns a TPWaveforms in the order of tps.
+        """
+        n = len(tps)
+        links = self.get_links(frags)
+        hw = self.inverse_map.lookup(tps["channel"])
+        t0 = tps["time_peak"].astype(np.int64) - self.pre_samples*self.sampling_period
+        out = TPWaveforms(adcs=np.full((n,self.width),self.fill_value,dtype=np.uint16),
+                          valid=np.zeros((n,self.width),dtype=bool),
+                          timestamps=t0,
+                          hw_channels=hw)
+        if n==0 or len(links)==0:
+            return out
+
+        link_of_tp = np.where(hw[:,0]>=0,pack_link(hw[:,0],hw[:,1],hw[:,2]),-1)
+        for link, frag in links.items():
+            sel = np.flatnonzero(link_of_tp==link)
+            if len(sel)==0:
+                continue
+            sel = sel[np.argsort(t0[sel],kind="stable")]
+            self.fill_snippets(out,frag,sel,t0[sel],hw[sel,3])
+        return out
+
+def match_tp_waveforms(tps,frags,channel_map,width=64,pre_samples=None):
+    #convenience wrapper, see TPWaveformMatcher
+    return TPWaveformMatcher(channel_map,width=width,pre_samples=pre_samples).match(tps,frags)
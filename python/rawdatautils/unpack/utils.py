@@ -1,5 +1,7 @@
 #general imports
+import contextlib
 import sys
+import time
 
 #dunedaq imports
 import daqdataformats
@@ -10,21 +12,35 @@ import detchannelmaps
 
 #unpacker imports
 from rawdatautils.unpack.dataclasses import *
+import rawdatautils.unpack.instrumentation
+from rawdatautils.unpack.prescale import make_prescaler
+import rawdatautils.analysis.quantiles
+import rawdatautils.unpack.wib
+import rawdatautils.unpack.wib2
 import rawdatautils.unpack.wibeth
 import rawdatautils.unpack.daphne
+import rawdatautils.unpack.tde
 import rawdatautils.unpack.crt
+import rawdatautils.unpack.tp
 import h5py
 
 #analysis imports
 import numpy as np
 import numpy.fft
 
+def get_type_string(frag):
+    #subdetector and fragment type names, e.g. kHD_TPC_kWIBEth, used to name the detector data of a fragment
+    return f'{detdataformats.DetID.Subdetector(frag.get_detector_id()).name}_{frag.get_fragment_type().name}'
+
 class Unpacker:
 
     is_fragment_unpacker = False
 
     is_detector_unpacker = False
     is_trigger_unpacker = False
+
+    #shared stage timing/counter registry, disabled unless explicitly enabled
+    instrumentation = rawdatautils.unpack.instrumentation.registry
     
     def __init__(self, index=None):
         self.index = index
@@ -106,22 +122,26 @@ class FragmentUnpacker(Unpacker):
 
     def get_all_data(self,in_data):
         #in_data = fragment
-        
-        data_dict = { "frh": self.get_frh_data(in_data) }
+
+        with self.instrumentation.stage(self,"fragment_header"):
+            data_dict = { "frh": self.get_frh_data(in_data) }
 
         #if no data, nothing to unpack further
-        if in_data.get_data_size()==0:
+        n_bytes = in_data.get_data_size()
+        if n_bytes==0:
             return data_dict
         
-        type_string = f'{detdataformats.DetID.Subdetector(in_data.get_detector_id()).name}_{in_data.get_fragment_type().name}'
+        type_string = get_type_string(in_data)
 
         if(self.is_trigger_unpacker):
-            trgh, trgd = self.get_trg_data(in_data)
+            with self.instrumentation.stage(self,"trigger_data",n_bytes):
+                trgh, trgd = self.get_trg_data(in_data)
             if trgh is not None: data_dict["trgh"] = trgh
-            if trg is not None: data_dict["trgd"] = trgd
+            if trgd is not None: data_dict["trgd"] = trgd
 
         if(self.is_detector_unpacker):
-            daqh, deth, detd, detw = self.get_det_data(in_data)
+            with self.instrumentation.stage(self,"detector_data",n_bytes):
+                daqh, deth, detd, detw = self.get_det_data(in_data)
             if daqh is not None: data_dict["daqh"] = daqh
             if deth is not None: data_dict[f"deth_{type_string}"] = deth
             if detd is not None: data_dict[f"detd_{type_string}"] = detd
@@ -152,39 +172,115 @@ class TriggerDataUnpacker(FragmentUnpacker):
 class TriggerPrimitiveUnpacker(TriggerDataUnpacker):
 
     trg_obj = trgdataformats.TriggerPrimitive
+    unpacker = rawdatautils.unpack.tp
         
     def get_n_obj(self,frag):
-        return frag.get_data_size()/self.trg_obj.sizeof()
+        return frag.get_data_size()//self.trg_obj.sizeof()
+
+    def get_trg_obj_array(self,frag):
+        #all TPs of the fragment as one structured array (see rawdatautils.unpack.tp.tp_dtype())
+        with self.instrumentation.stage(self,"tp_unpack",frag.get_data_size()):
+            return self.unpacker.np_array_tp(frag)
     
     def get_trg_obj_data(self,frag):
         frh = frag.get_header()
-        tpd_list = []
-        for i_tp in range(self.get_n_obj(frag)):
-            tp = self.trg_obj(frag.get_data(i*self.trg_obj.sizeof()))
-            tpd_list.append( TriggerPrimitiveData(run=frh.run_number,
-                                                  trigger=frh.trigger_number,
-                                                  sequence=frh.sequence_number,
-                                                  src_id=frh.element_id.id,
-                                                  time_start=tp.time_start,
-                                                  time_peak=tp.time_peak,
-                                                  time_over_threshold=tp.time_over_threshold,
-                                                  channel=tp.channel,
-                                                  adc_integral=tp.adc_integral,
-                                                  adc_peak=tp.adc_peak,
-                                                  detid=tp.detid,
-                                                  tp_type=tp.type,
-                                                  algorithm=tp.algorithm,
-                                                  flag=tp.flag) )
+        tps = self.get_trg_obj_array(frag)
+        return [ TriggerPrimitiveData(run=frh.run_number,
+                                      trigger=frh.trigger_number,
+                                      sequence=frh.sequence_number,
+                                      src_id=frh.element_id.id,
+                                      time_start=int(tp["time_start"]),
+                                      time_peak=int(tp["time_peak"]),
+                                      time_over_threshold=int(tp["time_over_threshold"]),
+                                      channel=int(tp["channel"]),
+                                      adc_integral=int(tp["adc_integral"]),
+                                      adc_peak=int(tp["adc_peak"]),
+                                      detid=int(tp["detid"]),
+                                      tp_type=int(tp["type"]),
+                                      algorithm=int(tp["algorithm"]),
+                                      flag=int(tp["flag"])) for tp in tps ]
 
 
 class DetectorFragmentUnpacker(FragmentUnpacker):
     
     is_detector_unpacker = True
 
-    def __init__(self,ana_data_prescale=1,wvfm_data_prescale=None):
+    def __init__(self,ana_data_prescale=1,wvfm_data_prescale=None,noise_spectra=None,channel_stats=None):
         super().__init__()
-        self.ana_data_prescale = None if not ana_data_prescale else int(ana_data_prescale)
-        self.wvfm_data_prescale = None if not wvfm_data_prescale else int(wvfm_data_prescale)
+        #optional run-level accumulators:
+        #noise_spectra (analysis.noise_spectra.NoiseSpectrumAccumulator) is fed on waveform-prescaled fragments,
+        #one batch per record (see flush), channel_stats (analysis.channel_stats.ChannelStatsAccumulator)
+        #on analysis-prescaled fragments
+        self.noise_spectra = noise_spectra
+        self.channel_stats = channel_stats
+        if noise_spectra is not None:
+            self.check_sampling_period(noise_spectra)
+        #(adcs, channels) of the current record, waiting to be added to noise_spectra
+        self.noise_blocks = []
+        self.noise_record = None
+        #prescales may be ints (fixed, modulo trigger number) or Prescaler objects
+        self.ana_data_prescaler = make_prescaler(ana_data_prescale)
+        self.wvfm_data_prescaler = make_prescaler(wvfm_data_prescale)
+        self.prescale_flags = (False, False)
+        #time (seconds) spent on each product of the current fragment
+        self.product_costs = { "ana": 0., "wvfm": 0. }
+
+    def check_sampling_period(self,noise_spectra):
+        #the accumulator takes the sampling period of the unpacker unless it was given one
+        sampling_period = getattr(self,"SAMPLING_PERIOD",None)
+        if noise_spectra.sampling_period is None:
+            noise_spectra.sampling_period = sampling_period
+        elif noise_spectra.sampling_period!=sampling_period:
+            raise ValueError(f"{type(self).__name__} samples every {sampling_period} ticks, "
+                             f"noise_spectra has sampling_period={noise_spectra.sampling_period}")
+
+    def add_noise_block(self,record,adcs,channels):
+        #waveforms of the same record (trigger and sequence number) are transformed together
+        if record!=self.noise_record:
+            self.flush()
+            self.noise_record = record
+        self.noise_blocks.append((adcs,channels))
+
+    def flush(self):
+        #adds the waveforms kept for the current record to noise_spectra;
+        #drivers call it at the end of each record (or at least before reading the spectra)
+        if len(self.noise_blocks)==0:
+            return
+        with self.instrumentation.stage(self,"noise_spectra",sum(b[0].nbytes for b in self.noise_blocks)):
+            self.noise_spectra.accumulate_record(self.noise_blocks)
+        self.noise_blocks = []
+
+    @property
+    def ana_data_prescale(self):
+        #prescale currently in effect (adaptive prescalers change it), None if disabled
+        return getattr(self.ana_data_prescaler,"prescale",None)
+
+    @property
+    def wvfm_data_prescale(self):
+        return getattr(self.wvfm_data_prescaler,"prescale",None)
+
+    def get_prescale_flags(self,trigger_number):
+        get_ana_data = (self.ana_data_prescaler is not None and self.ana_data_prescaler.accept(trigger_number))
+        get_wvfm_data = (self.wvfm_data_prescaler is not None and self.wvfm_data_prescaler.accept(trigger_number))
+        self.prescale_flags = (get_ana_data, get_wvfm_data)
+        return get_ana_data, get_wvfm_data
+
+    @contextlib.contextmanager
+    def product_timer(self,product):
+        #adds the time of the enclosed block to the cost of product ("ana" or "wvfm")
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.product_costs[product] += time.perf_counter()-t_start
+
+    def update_prescalers(self,cost):
+        #each prescaler is charged with its own product plus its share of the
+        #common unpacking (cost minus the time of both products)
+        n_products = sum(self.prescale_flags)
+        shared_cost = (cost-sum(self.product_costs.values()))/n_products if n_products>0 else 0.
+        if self.ana_data_prescaler is not None: self.ana_data_prescaler.update(self.product_costs["ana"]+shared_cost)
+        if self.wvfm_data_prescaler is not None: self.wvfm_data_prescaler.update(self.product_costs["wvfm"]+shared_cost)
     
     def get_daq_header_version(self,frag):
         return None
@@ -221,8 +317,17 @@ class DetectorFragmentUnpacker(FragmentUnpacker):
         return None, None
 
     def get_det_data(self,frag):
+        with self.instrumentation.stage(self,"daq_header"):
+            daq_header_data = self.get_daq_header_data(frag)
+        with self.instrumentation.stage(self,"det_header",frag.get_data_size()):
+            det_header_data = self.get_det_header_data(frag)
+        self.prescale_flags = (False, False)
+        self.product_costs["ana"] = 0.
+        self.product_costs["wvfm"] = 0.
+        t_start = time.perf_counter()
         det_ana_data, det_wvfm_data = self.get_det_data_all(frag)
-        return self.get_daq_header_data(frag), self.get_det_header_data(frag), det_ana_data, det_wvfm_data
+        self.update_prescalers(time.perf_counter()-t_start)
+        return daq_header_data, det_header_data, det_ana_data, det_wvfm_data
 
 
 class WIBEthUnpacker(DetectorFragmentUnpacker):
@@ -232,9 +337,11 @@ class WIBEthUnpacker(DetectorFragmentUnpacker):
     
     SAMPLING_PERIOD = 32
     N_CHANNELS_PER_FRAME = 64
+    ADC_BITS = 14
     
-    def __init__(self,channel_map,ana_data_prescale=1,wvfm_data_prescale=None):
-        super().__init__(ana_data_prescale=ana_data_prescale, wvfm_data_prescale=wvfm_data_prescale)
+    def __init__(self,channel_map,ana_data_prescale=1,wvfm_data_prescale=None,noise_spectra=None,channel_stats=None):
+        super().__init__(ana_data_prescale=ana_data_prescale, wvfm_data_prescale=wvfm_data_prescale,
+                         noise_spectra=noise_spectra, channel_stats=channel_stats)
         self.channel_map = detchannelmaps.make_map(channel_map)
 
     def get_n_obj(self,frag):
@@ -349,8 +456,7 @@ class WIBEthUnpacker(DetectorFragmentUnpacker):
         frh = frag.get_header()
         trigger_number = frh.trigger_number
 
-        get_ana_data = (self.ana_data_prescale is not None and (trigger_number % self.ana_data_prescale)==0)
-        get_wvfm_data = (self.wvfm_data_prescale is not None and (trigger_number % self.wvfm_data_prescale)==0)
+        get_ana_data, get_wvfm_data = self.get_prescale_flags(trigger_number)
 
         if not (get_ana_data or get_wvfm_data):
             return None,None
@@ -358,36 +464,150 @@ class WIBEthUnpacker(DetectorFragmentUnpacker):
         ana_data = None
         wvfm_data = None
         
-        adcs = self.unpacker.np_array_adc(frag)
-        _, crate, slot, stream = self.get_det_crate_slot_stream(frag)
-        channels = [ self.channel_map.get_offline_channel_from_crate_slot_stream_chan(crate, slot, stream, c) for c in range(self.N_CHANNELS_PER_FRAME) ]
-        planes = [ self.channel_map.get_plane_from_offline_channel(uc) for uc in channels ]
-        apas = [ self.channel_map.get_tpc_element_from_offline_channel(uc) for uc in channels ]
+        with self.instrumentation.stage(self,"adc_unpack",frag.get_data_size()):
+            adcs = self.unpacker.np_array_adc(frag)
+        with self.instrumentation.stage(self,"channel_map"):
+            _, crate, slot, stream = self.get_det_crate_slot_stream(frag)
+            channels = [ self.channel_map.get_offline_channel_from_crate_slot_stream_chan(crate, slot, stream, c) for c in range(self.N_CHANNELS_PER_FRAME) ]
+            planes = [ self.channel_map.get_plane_from_offline_channel(uc) for uc in channels ]
+            apas = [ self.channel_map.get_tpc_element_from_offline_channel(uc) for uc in channels ]
         wib_chans = range(self.N_CHANNELS_PER_FRAME)
         
         if get_ana_data:
-            adc_mean = np.mean(adcs,axis=0)
-            adc_rms = np.std(adcs,axis=0)
-            adc_max = np.max(adcs,axis=0)
-            adc_min = np.min(adcs,axis=0)
-            adc_median = np.median(adcs,axis=0)
-            ana_data = [ WIBEthAnalysisData(run=frh.run_number,
-                                            trigger=frh.trigger_number,
-                                            sequence=frh.sequence_number,
-                                            src_id=frh.element_id.id,
-                                            channel=channels[i_ch],
-                                            plane=planes[i_ch],
-                                            apa=apas[i_ch],
-                                            wib_chan=wib_chans[i_ch],
-                                            adc_mean=adc_mean[i_ch],
-                                            adc_rms=adc_rms[i_ch],
-                                            adc_max=adc_max[i_ch],
-                                            adc_min=adc_min[i_ch],
-                                            adc_median=adc_median[i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
+            with self.product_timer("ana"):
+                with self.instrumentation.stage(self,"adc_stats",adcs.nbytes):
+                    adc_mean = np.mean(adcs,axis=0)
+                    adc_rms = np.std(adcs,axis=0)
+                    adc_max = np.max(adcs,axis=0)
+                    adc_min = np.min(adcs,axis=0)
+                    adc_median = rawdatautils.analysis.quantiles.adc_median(adcs,axis=0,n_bits=self.ADC_BITS)
+                if self.channel_stats is not None:
+                    self.channel_stats.accumulate_stats(channels,adcs.shape[0],adc_mean,adc_rms**2,adc_min,adc_max)
+                ana_data = [ WIBEthAnalysisData(run=frh.run_number,
+                                                trigger=frh.trigger_number,
+                                                sequence=frh.sequence_number,
+                                                src_id=frh.element_id.id,
+                                                channel=channels[i_ch],
+                                                plane=planes[i_ch],
+                                                apa=apas[i_ch],
+                                                wib_chan=wib_chans[i_ch],
+                                                adc_mean=adc_mean[i_ch],
+                                                adc_rms=adc_rms[i_ch],
+                                                adc_max=adc_max[i_ch],
+                                                adc_min=adc_min[i_ch],
+                                                adc_median=adc_median[i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
         if get_wvfm_data:
-            timestamps = self.unpacker.np_array_timestamp(frag)
-            ffts = np.abs(np.fft.rfft(adcs,axis=0))
-            wvfm_data = [ WIBEthWaveformData(run=frh.run_number,
+            with self.product_timer("wvfm"):
+                timestamps = self.unpacker.np_array_timestamp(frag)
+                with self.instrumentation.stage(self,"fft",adcs.nbytes):
+                    ffts = np.abs(np.fft.rfft(adcs,axis=0))
+                if self.noise_spectra is not None:
+                    self.add_noise_block((frh.trigger_number, frh.sequence_number),adcs,channels)
+                wvfm_data = [ WIBEthWaveformData(run=frh.run_number,
+                                                 trigger=frh.trigger_number,
+                                                 sequence=frh.sequence_number,
+                                                 src_id=frh.element_id.id,
+                                                 channel=channels[i_ch],
+                                                 plane=planes[i_ch],
+                                                 apa=apas[i_ch],
+                                                 wib_chan=wib_chans[i_ch],
+                                                 timestamps=timestamps,
+                                                 adcs=adcs[:,i_ch],
+                                                 fft_mag=ffts[:,i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
+        
+        return ana_data, wvfm_data                
+
+
+class WIB2Unpacker(DetectorFragmentUnpacker):
+
+    unpacker = rawdatautils.unpack.wib2
+    frame_obj = fddetdataformats.WIB2Frame
+
+    SAMPLING_PERIOD = 32
+    N_CHANNELS_PER_FRAME = 256
+    ADC_BITS = 14
+
+    def __init__(self,channel_map,ana_data_prescale=1,wvfm_data_prescale=None,noise_spectra=None,channel_stats=None):
+        super().__init__(ana_data_prescale=ana_data_prescale, wvfm_data_prescale=wvfm_data_prescale,
+                         noise_spectra=noise_spectra, channel_stats=channel_stats)
+        self.channel_map = detchannelmaps.make_map(channel_map)
+        #(channels, planes, apas) per (crate, slot, link)
+        self.channel_info = {}
+
+    def get_n_obj(self,frag):
+        return self.unpacker.get_n_frames(frag)
+
+    def get_wib_header(self,frag):
+        return self.frame_obj(frag.get_data()).get_header()
+
+    def get_timestamp_first(self,frag):
+        return self.frame_obj(frag.get_data()).get_timestamp()
+
+    def get_det_data_version(self,frag):
+        return self.get_wib_header(frag).version
+
+    def get_det_crate_slot_stream(self,frag):
+        wh = self.get_wib_header(frag)
+        return wh.detector_id, wh.crate, wh.slot, wh.link
+
+    def get_channel_info(self,crate,slot,link):
+        key = (crate, slot, link)
+        if key not in self.channel_info:
+            channels = [ self.channel_map.get_offline_channel_from_crate_slot_fiber_chan(crate, slot, link, c) for c in range(self.N_CHANNELS_PER_FRAME) ]
+            planes = [ self.channel_map.get_plane_from_offline_channel(uc) for uc in channels ]
+            apas = [ self.channel_map.get_tpc_element_from_offline_channel(uc) for uc in channels ]
+            self.channel_info[key] = (channels, planes, apas)
+        return self.channel_info[key]
+
+    def get_det_header_data(self,frag):
+        frh = frag.get_header()
+        _, crate, slot, link = self.get_det_crate_slot_stream(frag)
+        ts_arr = self.unpacker.np_array_timestamp(frag)
+        ts_diff_change_idx, ts_diff_change_val, _ = sparsify_array_diff_locs_and_vals(np.diff(ts_arr))
+        return [ WIBHeaderData(run=frh.run_number,
+                               trigger=frh.trigger_number,
+                               sequence=frh.sequence_number,
+                               src_id=frh.element_id.id,
+                               version=self.get_det_data_version(frag),
+                               crate=crate,
+                               slot=slot,
+                               link=link,
+                               timestamp_dts_diff_vals=ts_diff_change_val, timestamp_dts_diff_idx=ts_diff_change_idx,
+                               timestamp_dts_first=ts_arr[0],
+                               n_frames=self.get_n_obj(frag),
+                               n_channels=self.N_CHANNELS_PER_FRAME,
+                               sampling_period=self.SAMPLING_PERIOD) ]
+
+    def get_det_data_all(self,frag):
+        frh = frag.get_header()
+        trigger_number = frh.trigger_number
+
+        get_ana_data, get_wvfm_data = self.get_prescale_flags(trigger_number)
+
+        if not (get_ana_data or get_wvfm_data):
+            return None,None
+
+        ana_data = None
+        wvfm_data = None
+
+        with self.instrumentation.stage(self,"adc_unpack",frag.get_data_size()):
+            adcs = self.unpacker.np_array_adc(frag)
+        with self.instrumentation.stage(self,"channel_map"):
+            _, crate, slot, link = self.get_det_crate_slot_stream(frag)
+            channels, planes, apas = self.get_channel_info(crate, slot, link)
+        wib_chans = range(self.N_CHANNELS_PER_FRAME)
+
+        if get_ana_data:
+            with self.product_timer("ana"):
+                with self.instrumentation.stage(self,"adc_stats",adcs.nbytes):
+                    adc_mean = np.mean(adcs,axis=0)
+                    adc_rms = np.std(adcs,axis=0)
+                    adc_max = np.max(adcs,axis=0)
+                    adc_min = np.min(adcs,axis=0)
+                    adc_median = rawdatautils.analysis.quantiles.adc_median(adcs,axis=0,n_bits=self.ADC_BITS)
+                if self.channel_stats is not None:
+                    self.channel_stats.accumulate_stats(channels,adcs.shape[0],adc_mean,adc_rms**2,adc_min,adc_max)
+                ana_data = [ WIBAnalysisData(run=frh.run_number,
                                              trigger=frh.trigger_number,
                                              sequence=frh.sequence_number,
                                              src_id=frh.element_id.id,
@@ -395,11 +615,51 @@ class WIBEthUnpacker(DetectorFragmentUnpacker):
                                              plane=planes[i_ch],
                                              apa=apas[i_ch],
                                              wib_chan=wib_chans[i_ch],
-                                             timestamps=timestamps,
-                                             adcs=adcs[:,i_ch],
-                                             fft_mag=ffts[:,i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
-        
-        return ana_data, wvfm_data                
+                                             adc_mean=adc_mean[i_ch],
+                                             adc_rms=adc_rms[i_ch],
+                                             adc_max=adc_max[i_ch],
+                                             adc_min=adc_min[i_ch],
+                                             adc_median=adc_median[i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
+        if get_wvfm_data:
+            with self.product_timer("wvfm"):
+                timestamps = self.unpacker.np_array_timestamp(frag)
+                with self.instrumentation.stage(self,"fft",adcs.nbytes):
+                    ffts = np.abs(np.fft.rfft(adcs,axis=0))
+                if self.noise_spectra is not None:
+                    self.add_noise_block((frh.trigger_number, frh.sequence_number),adcs,channels)
+                wvfm_data = [ WIBWaveformData(run=frh.run_number,
+                                              trigger=frh.trigger_number,
+                                              sequence=frh.sequence_number,
+                                              src_id=frh.element_id.id,
+                                              channel=channels[i_ch],
+                                              plane=planes[i_ch],
+                                              apa=apas[i_ch],
+                                              wib_chan=wib_chans[i_ch],
+                                              timestamps=timestamps,
+                                              adcs=adcs[:,i_ch],
+                                              fft_mag=ffts[:,i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
+
+        return ana_data, wvfm_data
+
+
+class WIBUnpacker(WIB2Unpacker):
+
+    #ProtoWIB frames: same layout of the unpacked data as WIB2, 25 DTS ticks (50 MHz clock) per sample
+    unpacker = rawdatautils.unpack.wib
+    frame_obj = fddetdataformats.WIBFrame
+
+    SAMPLING_PERIOD = 25
+    ADC_BITS = 12
+
+    def get_n_obj(self,frag):
+        return frag.get_data_size()//self.frame_obj.sizeof()
+
+    def get_wib_header(self,frag):
+        return self.frame_obj(frag.get_data()).get_wib_header()
+
+    def get_det_crate_slot_stream(self,frag):
+        wh = self.get_wib_header(frag)
+        return frag.get_detector_id(), wh.crate_no, wh.slot_no, wh.fiber_no
 
 
 class DAPHNEStreamUnpacker(DetectorFragmentUnpacker):
@@ -409,6 +669,7 @@ class DAPHNEStreamUnpacker(DetectorFragmentUnpacker):
 
     SAMPLING_PERIOD = 1
     N_CHANNELS_PER_FRAME = 4
+    ADC_BITS = 14
     
     def get_n_obj(self,frag):
         return self.unpacker.get_n_frames_stream(frag)
@@ -443,8 +704,7 @@ class DAPHNEStreamUnpacker(DetectorFragmentUnpacker):
         frh = frag.get_header()
         trigger_number = frh.trigger_number
 
-        get_ana_data = (self.ana_data_prescale is not None and (trigger_number % self.ana_data_prescale)==0)
-        get_wvfm_data = (self.wvfm_data_prescale is not None and (trigger_number % self.wvfm_data_prescale)==0)
+        get_ana_data, get_wvfm_data = self.get_prescale_flags(trigger_number)
 
         if not (get_ana_data or get_wvfm_data):
             return None,None
@@ -452,40 +712,51 @@ class DAPHNEStreamUnpacker(DetectorFragmentUnpacker):
         ana_data = None
         wvfm_data = None
 
-        adcs = self.unpacker.np_array_adc_stream(frag)
+        with self.instrumentation.stage(self,"adc_unpack",frag.get_data_size()):
+            adcs = self.unpacker.np_array_adc_stream(frag)
         dh = self.frame_obj(frag.get_data()).get_header()
         channels = [ dh.channel_0, dh.channel_1, dh.channel_2, dh.channel_3 ]
         daphne_chans = [ dh.channel_0, dh.channel_1, dh.channel_2, dh.channel_3 ]
 
         if get_ana_data:
-            adc_mean = np.mean(adcs,axis=0)
-            adc_rms = np.std(adcs,axis=0)
-            adc_max = np.max(adcs,axis=0)
-            adc_min = np.min(adcs,axis=0)
-            adc_median = np.median(adcs,axis=0)
-            ana_data = [ DAPHNEStreamAnalysisData(run=frh.run_number,
-                                                  trigger=frh.trigger_number,
-                                                  sequence=frh.sequence_number,
-                                                  src_id=frh.element_id.id,
-                                                  channel=channels[i_ch],
-                                                  daphne_chan=daphne_chans[i_ch],
-                                                  adc_mean=adc_mean[i_ch],
-                                                  adc_rms=adc_rms[i_ch],
-                                                  adc_max=adc_max[i_ch],
-                                                  adc_min=adc_min[i_ch],
-                                                  adc_median=adc_median[i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
+            with self.product_timer("ana"):
+                with self.instrumentation.stage(self,"adc_stats",adcs.nbytes):
+                    adc_mean = np.mean(adcs,axis=0)
+                    adc_rms = np.std(adcs,axis=0)
+                    adc_max = np.max(adcs,axis=0)
+                    adc_min = np.min(adcs,axis=0)
+                    adc_median = rawdatautils.analysis.quantiles.adc_median(adcs,axis=0,n_bits=self.ADC_BITS)
+                if self.channel_stats is not None:
+                    self.channel_stats.accumulate_stats([ (frh.element_id.id, ch) for ch in channels ],
+                                                        adcs.shape[0],adc_mean,adc_rms**2,adc_min,adc_max)
+                ana_data = [ DAPHNEStreamAnalysisData(run=frh.run_number,
+                                                      trigger=frh.trigger_number,
+                                                      sequence=frh.sequence_number,
+                                                      src_id=frh.element_id.id,
+                                                      channel=channels[i_ch],
+                                                      daphne_chan=daphne_chans[i_ch],
+                                                      adc_mean=adc_mean[i_ch],
+                                                      adc_rms=adc_rms[i_ch],
+                                                      adc_max=adc_max[i_ch],
+                                                      adc_min=adc_min[i_ch],
+                                                      adc_median=adc_median[i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
         if get_wvfm_data:
-            timestamps = self.unpacker.np_array_timestamp_stream(frag)
-            ffts = np.abs(np.fft.rfft(adcs,axis=0))
-            wvfm_data = [ DAPHNEStreamWaveformData(run=frh.run_number,
-                                                   trigger=frh.trigger_number,
-                                                   sequence=frh.sequence_number,
-                                                   src_id=frh.element_id.id,
-                                                   channel=channels[i_ch],
-                                                   daphne_chan=channels[i_ch],
-                                                   adcs=adcs[:,i_ch],
-                                                   timestamps=timestamps,
-                                                   fft_mag=ffts[:,i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
+            with self.product_timer("wvfm"):
+                timestamps = self.unpacker.np_array_timestamp_stream(frag)
+                with self.instrumentation.stage(self,"fft",adcs.nbytes):
+                    ffts = np.abs(np.fft.rfft(adcs,axis=0))
+                if self.noise_spectra is not None:
+                    #DAPHNE channel numbers are only unique within a link
+                    self.add_noise_block((frh.trigger_number, frh.sequence_number),adcs,[ (frh.element_id.id, ch) for ch in channels ])
+                wvfm_data = [ DAPHNEStreamWaveformData(run=frh.run_number,
+                                                       trigger=frh.trigger_number,
+                                                       sequence=frh.sequence_number,
+                                                       src_id=frh.element_id.id,
+                                                       channel=channels[i_ch],
+                                                       daphne_chan=channels[i_ch],
+                                                       adcs=adcs[:,i_ch],
+                                                       timestamps=timestamps,
+                                                       fft_mag=ffts[:,i_ch]) for i_ch in range(self.N_CHANNELS_PER_FRAME) ]
         return ana_data, wvfm_data
 
 
@@ -496,6 +767,7 @@ class DAPHNEUnpacker(DetectorFragmentUnpacker):
 
     SAMPLING_PERIOD = 1
     N_CHANNELS_PER_FRAME = 1
+    ADC_BITS = 14
             
     def get_n_obj(self,frag):
         return self.unpacker.get_n_frames(frag)
@@ -521,14 +793,14 @@ class DAPHNEUnpacker(DetectorFragmentUnpacker):
         trigger_number = frh.trigger_number
         wvfm_data = None
 
-        get_ana_data = (self.ana_data_prescale is not None and (trigger_number % self.ana_data_prescale)==0)
-        get_wvfm_data = (self.wvfm_data_prescale is not None and (trigger_number % self.wvfm_data_prescale)==0)
+        get_ana_data, get_wvfm_data = self.get_prescale_flags(trigger_number)
 
         if not (get_ana_data or get_wvfm_data):
             return None,None
 
         n_frames = self.get_n_obj(frag)
-        adcs = self.unpacker.np_array_adc(frag)
+        with self.instrumentation.stage(self,"adc_unpack",frag.get_data_size()):
+            adcs = self.unpacker.np_array_adc(frag)
 
         daphne_headers = [ self.frame_obj(frag.get_data(iframe*self.frame_obj.sizeof())).get_header() for iframe in range(n_frames) ]
         timestamp = self.unpacker.np_array_timestamp(frag)
@@ -537,47 +809,190 @@ class DAPHNEUnpacker(DetectorFragmentUnpacker):
             return None, None
     
         if get_ana_data:
-            ax = 1
-            adc_mean = np.mean(adcs,axis=ax)
-            adc_rms = np.std(adcs,axis=ax)
-            adc_max = np.max(adcs,axis=ax)
-            adc_min = np.min(adcs,axis=ax)
-            adc_median = np.median(adcs,axis=ax)
-            ts_max = np.argmax(adcs,axis=ax)*self.SAMPLING_PERIOD + timestamp
-            ts_min = np.argmin(adcs,axis=ax)*self.SAMPLING_PERIOD + timestamp
-
-            ana_data = [ DAPHNEAnalysisData(run=frh.run_number,
-                                            trigger=frh.trigger_number,
-                                            sequence=frh.sequence_number,
-                                            src_id=frh.element_id.id,
-                                            channel=daphne_headers[iframe].channel,
-                                            daphne_chan=daphne_headers[iframe].channel,
-                                            timestamp_dts=timestamp[iframe],
-                                            trigger_sample_value=daphne_headers[iframe].trigger_sample_value,
-                                            threshold=daphne_headers[iframe].threshold,
-                                            baseline=daphne_headers[iframe].baseline,
-                                            adc_mean=adc_mean[iframe],
-                                            adc_rms=adc_rms[iframe],
-                                            adc_max=adc_max[iframe],
-                                            adc_min=adc_min[iframe],
-                                            adc_median=adc_median[iframe],
-                                            timestamp_max_dts=ts_max[iframe],
-                                            timestamp_min_dts=ts_min[iframe]) for iframe in range(n_frames) ]
+            with self.product_timer("ana"):
+                ax = 1
+                with self.instrumentation.stage(self,"adc_stats",adcs.nbytes):
+                    adc_mean = np.mean(adcs,axis=ax)
+                    adc_rms = np.std(adcs,axis=ax)
+                    adc_max = np.max(adcs,axis=ax)
+                    adc_min = np.min(adcs,axis=ax)
+                    adc_median = rawdatautils.analysis.quantiles.adc_median(adcs,axis=ax,n_bits=self.ADC_BITS)
+                    ts_max = np.argmax(adcs,axis=ax)*self.SAMPLING_PERIOD + timestamp
+                    ts_min = np.argmin(adcs,axis=ax)*self.SAMPLING_PERIOD + timestamp
+
+                ana_data = [ DAPHNEAnalysisData(run=frh.run_number,
+                                                trigger=frh.trigger_number,
+                                                sequence=frh.sequence_number,
+                                                src_id=frh.element_id.id,
+                                                channel=daphne_headers[iframe].channel,
+                                                daphne_chan=daphne_headers[iframe].channel,
+                                                timestamp_dts=timestamp[iframe],
+                                                trigger_sample_value=daphne_headers[iframe].trigger_sample_value,
+                                                threshold=daphne_headers[iframe].threshold,
+                                                baseline=daphne_headers[iframe].baseline,
+                                                adc_mean=adc_mean[iframe],
+                                                adc_rms=adc_rms[iframe],
+                                                adc_max=adc_max[iframe],
+                                                adc_min=adc_min[iframe],
+                                                adc_median=adc_median[iframe],
+                                                timestamp_max_dts=ts_max[iframe],
+                                                timestamp_min_dts=ts_min[iframe]) for iframe in range(n_frames) ]
 
 
         if get_wvfm_data:
+            with self.product_timer("wvfm"):
+
+                wvfm_data = [ DAPHNEWaveformData(run=frh.run_number,
+                                                 trigger=frh.trigger_number,
+                                                 sequence=frh.sequence_number,
+                                                 src_id=frh.element_id.id,
+                                                 channel=daphne_headers[iframe].channel,
+                                                 daphne_chan=daphne_headers[iframe].channel,
+                                                 timestamp_dts=timestamp[iframe],
+                                                 timestamps=np.arange(np.size(adcs[:,iframe]))*self.SAMPLING_PERIOD+timestamp[iframe],
+                                                 adcs=adcs[:,iframe]) for iframe in range(n_frames) ]
+
+        return ana_data, wvfm_data
+
+
+class TDEUnpacker(DetectorFragmentUnpacker):
 
-            wvfm_data = [ DAPHNEWaveformData(run=frh.run_number,
+    unpacker = rawdatautils.unpack.tde
+    frame_obj = fddetdataformats.TDE16Frame
+
+    SAMPLING_PERIOD = 32
+    N_CHANNELS_PER_FRAME = 1
+    ADC_BITS = 12
+
+    def get_n_obj(self,frag):
+        return self.unpacker.get_n_frames(frag)
+
+    def get_timestamp_first(self,frag):
+        return self.frame_obj(frag.get_data()).get_timestamp()
+
+    def get_det_data_version(self,frag):
+        return 0
+
+    def get_det_data_all(self,frag):
+        frh = frag.get_header()
+        trigger_number = frh.trigger_number
+
+        get_ana_data, get_wvfm_data = self.get_prescale_flags(trigger_number)
+
+        if not (get_ana_data or get_wvfm_data):
+            return None,None
+
+        ana_data = None
+        wvfm_data = None
+
+        n_frames = self.get_n_obj(frag)
+        if n_frames == 0:
+            return None, None
+
+        #one channel per frame: adcs has dimensions (number of frames, samples)
+        with self.instrumentation.stage(self,"adc_unpack",frag.get_data_size()):
+            adcs = self.unpacker.np_array_adc(frag)
+        timestamp = self.unpacker.np_array_timestamp_data(frag)
+        channels = self.unpacker.np_array_channel_data(frag)
+
+        if get_ana_data:
+            with self.product_timer("ana"):
+                ax = 1
+                with self.instrumentation.stage(self,"adc_stats",adcs.nbytes):
+                    adc_mean = np.mean(adcs,axis=ax)
+                    adc_rms = np.std(adcs,axis=ax)
+                    adc_max = np.max(adcs,axis=ax)
+                    adc_min = np.min(adcs,axis=ax)
+                    adc_median = rawdatautils.analysis.quantiles.adc_median(adcs,axis=ax,n_bits=self.ADC_BITS)
+                ana_data = [ TDEAnalysisData(run=frh.run_number,
                                              trigger=frh.trigger_number,
                                              sequence=frh.sequence_number,
                                              src_id=frh.element_id.id,
-                                             channel=daphne_headers[iframe].channel,
-                                             daphne_chan=daphne_headers[iframe].channel,
+                                             channel=channels[iframe],
                                              timestamp_dts=timestamp[iframe],
-                                             timestamps=np.arange(np.size(adcs[:,iframe]))*self.SAMPLING_PERIOD+timestamp[iframe],
-                                             adcs=adcs[:,iframe]) for iframe in range(n_frames) ]
+                                             adc_mean=adc_mean[iframe],
+                                             adc_rms=adc_rms[iframe],
+                                             adc_max=adc_max[iframe],
+                                             adc_min=adc_min[iframe],
+                                             adc_median=adc_median[iframe]) for iframe in range(n_frames) ]
+
+        if get_wvfm_data:
+            with self.product_timer("wvfm"):
+                sample_times = np.arange(adcs.shape[1])*self.SAMPLING_PERIOD
+                wvfm_data = [ TDEWaveformData(run=frh.run_number,
+                                              trigger=frh.trigger_number,
+                                              sequence=frh.sequence_number,
+                                              src_id=frh.element_id.id,
+                                              channel=channels[iframe],
+                                              timestamp_dts=timestamp[iframe],
+                                              timestamps=sample_times+timestamp[iframe],
+                                              adcs=adcs[iframe]) for iframe in range(n_frames) ]
 
         return ana_data, wvfm_data
 
 
+class CRTUnpacker(DetectorFragmentUnpacker):
 
+    unpacker = rawdatautils.unpack.crt
+    frame_obj = fddetdataformats.CRTFrame
+
+    def get_n_obj(self,frag):
+        return self.unpacker.get_n_frames(frag)
+
+    def get_timestamp_first(self,frag):
+        return self.frame_obj(frag.get_data()).get_timestamp()
+
+    def get_det_data_version(self,frag):
+        return 0
+
+    def get_det_data_all(self,frag):
+        frh = frag.get_header()
+        trigger_number = frh.trigger_number
+
+        get_ana_data, get_wvfm_data = self.get_prescale_flags(trigger_number)
+
+        if not (get_ana_data or get_wvfm_data):
+            return None,None
+
+        ana_data = None
+        wvfm_data = None
+
+        n_frames = self.get_n_obj(frag)
+        if n_frames == 0:
+            return None, None
+
+        #one module hit per frame: adcs and channels have dimensions (number of frames, adcs per module)
+        with self.instrumentation.stage(self,"adc_unpack",frag.get_data_size()):
+            adcs = self.unpacker.np_array_adc(frag).reshape(n_frames,-1)
+            channels = self.unpacker.np_array_channel(frag).reshape(n_frames,-1)
+        modules = self.unpacker.np_array_modules(frag)
+        timestamp = self.unpacker.np_array_timestamp(frag)
+
+        if get_ana_data:
+            with self.product_timer("ana"):
+                with self.instrumentation.stage(self,"adc_stats",adcs.nbytes):
+                    n_hit = np.count_nonzero(adcs,axis=1)
+                    adc_sum = np.sum(adcs,axis=1,dtype=np.int64)
+                    adc_max = np.max(adcs,axis=1)
+                ana_data = [ CRTHitData(run=frh.run_number,
+                                        trigger=frh.trigger_number,
+                                        sequence=frh.sequence_number,
+                                        src_id=frh.element_id.id,
+                                        module=modules[iframe],
+                                        timestamp_dts=timestamp[iframe],
+                                        n_channels_hit=n_hit[iframe],
+                                        adc_sum=adc_sum[iframe],
+                                        adc_max=adc_max[iframe]) for iframe in range(n_frames) ]
+
+        if get_wvfm_data:
+            with self.product_timer("wvfm"):
+                wvfm_data = [ CRTWaveformData(run=frh.run_number,
+                                              trigger=frh.trigger_number,
+                                              sequence=frh.sequence_number,
+                                              src_id=frh.element_id.id,
+                                              module=modules[iframe],
+                                              timestamp_dts=timestamp[iframe],
+                                              channels=channels[iframe],
+                                              adcs=adcs[iframe]) for iframe in range(n_frames) ]
+
+        return ana_data, wvfm_data
@@ -0,0 +1,185 @@
+#general imports
+from dataclasses import dataclass
+import numpy as np
+
+#dunedaq imports
+import daqdataformats
+import fddetdataformats
+
+#unpacker imports
+import rawdatautils.unpack.wib2
+import rawdatautils.unpack.wibeth
+import rawdatautils.unpack.daphne
+import rawdatautils.unpack.crt
+
+@dataclass
+class WindowData:
+
+    #per sample for the streaming formats, per hit for CRT
+    timestamps: np.ndarray
+    #(n_samples, n_channels) for the streaming formats, (n_hits, n_adcs) for CRT
+    adcs: np.ndarray
+    #frames [first_frame, first_frame+n_frames) of the fragment were unpacked
+    first_frame: int
+    n_frames: int
+    #CRT only
+    channels: np.ndarray = None
+    modules: np.ndarray = None
+
+class FrameWindowExtractor:
+    """
+    Unpacks the samples of a fragment within a timestamp window [t_begin, t_end).
+    Frame timestamps are binary searched in place in the fragment, assuming they
+    increase monotonically, so only the frames overlapping the window are unpacked.
+    """
+
+    unpacker = None
+    frame_obj = None
+
+    #DTS ticks between consecutive samples of a frame
+    SAMPLING_PERIOD = 32
+
+    def __init__(self):
+        self.frame_size = self.frame_obj.sizeof()
+        self.samples_per_frame = None
+
+    def get_n_frames(self,frag):
+        return self.unpacker.get_n_frames(frag)
+
+    def get_frame_timestamp(self,frag,i):
+        return self.frame_obj(frag.get_data(i*self.frame_size)).get_timestamp()
+
+    def unpack_adc(self,frag,first,n):
+        return self.unpacker.np_array_adc_data(frag.get_data(first*self.frame_size),n)
+
+    def unpack_timestamp(self,frag,first,n):
+        return self.unpacker.np_array_timestamp_data(frag.get_data(first*self.frame_size),n)
+
+    def get_frame_span(self,frag):
+        #ticks from the first sample of a frame to the first sample of the next one
+        if self.samples_per_frame is None:
+            self.samples_per_frame = len(self.unpack_timestamp(frag,0,1))
+        return self.samples_per_frame*self.SAMPLING_PERIOD
+
+    def find_frames(self,frag,t_begin,t_end):
+        #returns [first, last) frame indices overlapping [t_begin, t_end)
+        n_frames = self.get_n_frames(frag)
+        if n_frames==0:
+            return 0, 0
+        span = self.get_frame_span(frag)
+
+        #first frame ending after t_begin
+        lo, hi = 0, n_frames
+        while lo < hi:
+            mid = (lo+hi)//2
+            if self.get_frame_timestamp(frag,mid)+span <= t_begin:
+                lo = mid+1
+            else:
+                hi = mid
+        first = lo
+
+        #first frame starting at or after t_end
+        hi = n_frames
+        while lo < hi:
+            mid = (lo+hi)//2
+            if self.get_frame_timestamp(frag,mid) < t_end:
+                lo = mid+1
+            else:
+                hi = mid
+        return first, lo
+
+    def extract_window(self,frag,t_begin,t_end):
+        first, last = self.find_frames(frag,t_begin,t_end)
+        n = last-first
+        if n==0:
+            return self.empty_window(first)
+        timestamps = self.unpack_timestamp(frag,first,n)
+        adcs = self.unpack_adc(frag,first,n)
+        #frames are unpacked whole; trim the samples at the edges
+        #(same dtype as the timestamps: mixing uint64 and python ints would compare as float64)
+        i_begin, i_end = np.searchsorted(timestamps,np.array([max(t_begin,0),max(t_end,0)],dtype=timestamps.dtype))
+        return WindowData(timestamps=timestamps[i_begin:i_end],
+                          adcs=adcs[i_begin:i_end],
+                          first_frame=first,
+                          n_frames=n)
+
+    def empty_window(self,first):
+        return WindowData(timestamps=np.zeros(0,dtype=np.uint64),
+                          adcs=np.zeros((0,0),dtype=np.uint16),
+                          first_frame=first,
+                          n_frames=0)
+
+class WIBEthWindowExtractor(FrameWindowExtractor):
+
+    unpacker = rawdatautils.unpack.wibeth
+    frame_obj = fddetdataformats.WIBEthFrame
+
+    SAMPLING_PERIOD = 32
+
+class WIB2WindowExtractor(FrameWindowExtractor):
+
+    unpacker = rawdatautils.unpack.wib2
+    frame_obj = fddetdataformats.WIB2Frame
+
+    SAMPLING_PERIOD = 32
+
+class DAPHNEStreamWindowExtractor(FrameWindowExtractor):
+
+    unpacker = rawdatautils.unpack.daphne
+    frame_obj = fddetdataformats.DAPHNEStreamFrame
+
+    SAMPLING_PERIOD = 1
+
+    def get_n_frames(self,frag):
+        return self.unpacker.get_n_frames_stream(frag)
+
+    def unpack_adc(self,frag,first,n):
+        return self.unpacker.np_array_adc_stream_data(frag.get_data(first*self.frame_size),n)
+
+    def unpack_timestamp(self,frag,first,n):
+        return self.unpacker.np_array_timestamp_stream_data(frag.get_data(first*self.frame_size),n)
+
+class CRTWindowExtractor(FrameWindowExtractor):
+
+    unpacker = rawdatautils.unpack.crt
+    frame_obj = fddetdataformats.CRTFrame
+
+    #one hit per frame, at the frame timestamp
+    SAMPLING_PERIOD = 1
+
+    def get_frame_span(self,frag):
+        return 1
+
+    def extract_window(self,frag,t_begin,t_end):
+        first, last = self.find_frames(frag,t_begin,t_end)
+        n = last-first
+        if n==0:
+            return self.empty_window(first)
+        ptr = frag.get_data(first*self.frame_size)
+        return WindowData(timestamps=self.unpacker.np_array_timestamp_data(ptr,n),
+                          adcs=self.unpacker.np_array_adc_data(ptr,n).reshape(n,-1),
+                          first_frame=first,
+                          n_frames=n,
+                          channels=self.unpacker.np_array_channel_data(ptr,n).reshape(n,-1),
+                          modules=self.unpacker.np_array_modules_data(ptr,n))
+
+#extractor for each supported fragment type, created on first use
+window_extractor_classes = { daqdataformats.FragmentType.kWIBEth: WIBEthWindowExtractor,
+                             daqdataformats.FragmentType.kWIB: WIB2WindowExtractor,
+                             daqdataformats.FragmentType.kDAPHNEStream: DAPHNEStreamWindowExtractor,
+                             daqdataformats.FragmentType.kCRT: CRTWindowExtractor }
+window_extractors = {}
+
+def extract_window(frag,t_begin,t_end):
+    """
+    Unpack only the samples of a WIBEth, WIB2, DAPHNEStream or CRT fragment with
+    timestamps in [t_begin, t_end), in DTS ticks. Returns a WindowData.
+    """
+    frag_type = frag.get_fragment_type()
+    extractor = window_extractors.get(frag_type)
+    if extractor is None:
+        if frag_type not in window_extractor_classes:
+            raise ValueError(f"Window extraction is not supported for fragment type {frag_type}")
+        extractor = window_extractor_classes[frag_type]()
+        window_extractors[frag_type] = extractor
+    return extractor.extract_window(frag,int(t_begin),int(t_end))
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+from rawdatautils.unpack.fragment_index import get_index, index_file_name
+
+import daqdataformats
+import time
+
+import click
+import numpy as np
+
+@click.command()
+@click.argument('filenames', nargs=-1)
+@click.option('--rebuild', is_flag=True, help='Rebuild the index even if an up-to-date one exists')
+def main(filenames, rebuild):
+    """
+Builds (or refreshes) the sidecar fragment index <file>.index.npz of each given HDF5 raw data file
+and prints a summary of the fragments in it.
+    """
+
+    for filename in filenames:
+        start = time.time()
+        index = get_index(filename, rebuild=rebuild)
+        print(f"{index_file_name(filename)}: {len(index)} fragments, {len(index.records())} records ({time.time()-start:.2f} s)")
+
+        types, counts = np.unique(index.entries["fragment_type"], return_counts=True)
+        for frag_type, count in zip(types, counts):
+            n_errors = len(index.select(fragment_type=frag_type, has_errors=True))
+            print(f"    {daqdataformats.FragmentType(int(frag_type)).name:<24} {count:>8} fragments, {n_errors:>8} with error bits set")
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,9 @@ Description: Python script to write WIB2 frames from DUNE-DAQ HDF5 files to bina
 """
 
 import argparse
+import time
 
+import h5py
 from hdf5libs import HDF5RawDataFile
 import daqdataformats
 import fddetdataformats
@@ -16,65 +18,93 @@ import fddetdataformats
 from rich import print
 
 
-def Debug(x):  
+def Debug(x):
     """ print if we are in debug mode
 
     Args:
         x (any): thing to prints
-    """      
+    """
     if debug:
         print(x)
 
 
+def wib_link_datasets(h5file, record):
+    """ dataset paths of the WIB fragments of a record, relative to the record group
+
+    Args:
+        h5file (HDF5RawDataFile): file
+        record (tuple): record id
+
+    Returns:
+        str, list: record group path and the sorted relative paths of the WIB fragments
+    """
+    group = h5file.get_record_header_dataset_path(record).rsplit("/", 1)[0]
+    fragments = [f for f in h5file.get_fragment_dataset_paths(record) if f.split("_")[-1] == "WIB"] # exclude other fragments in the record that are not WIB frames
+    return group, sorted(f[len(group):] for f in fragments)
+
+
 def main(args):
     h5file = HDF5RawDataFile(args.file_name)
 
-    total_records = len(h5file.get_all_record_ids())
+    records = sorted(h5file.get_all_record_ids())
+    total_records = len(records)
     if args.n_records == -1:
         args.n_records = total_records
     if args.n_records > total_records:
-        raise Exception(f"Number of specified records is greater than the total {total}")
-
-    n_links = len([f for f in h5file.get_fragment_dataset_paths(1) if f.split("_")[-1] == "WIB"]) # exclude other fragments in the record that are not WIB frames
-    if args.link >= n_links:
-        raise Exception(f"Link number out of range.")
-
-    out_name = f"wib_link_{args.link}.bin"
-    with open(out_name, "wb") as bf:
-        total_frames = 0
-        # loop over all triggers
-        for i in range(args.n_records):
-            header = h5file.get_record_header_dataset_path(i+1) # trigger number starts at 1
-            Debug(header)
-
-            fragments = h5file.get_fragment_dataset_paths(i+1)
-            fragments = [f for f in fragments if f.split("_")[-1] == "WIB"] # exclude other fragments in the record that are not WIB frames
-
-            Debug(f"loading fragment: {fragments[args.link]}")
-            f = h5file.get_frag(fragments[args.link])
-            
-            WIB2Frame_size = fddetdataformats.WIB2Frame.sizeof()
-
-            n_frames = (f.get_size() - f.get_header().sizeof()) // WIB2Frame_size # calculate the number of wib frames per fragment
-            for j in range(n_frames):
-                Debug(f.get_fragment_type())
-                Debug(f.get_element_id())
-
-                data = fddetdataformats.WIB2Frame(f.get_data(j * WIB2Frame_size)) # unpack fragment to WIB2Frame
-                
-                Debug(f"{data.sizeof()=}")
-                
-                bf.write(bytearray(data.get_bytes())) # write binary data to the file
-            total_frames += j
-            print(f"writing {total_frames} WIB2 frames to binary file.", "\r")
-    print(f"wrote {args.n_records} fragments from wib link {args.link} to file {out_name}.")
+        raise Exception(f"Number of specified records is greater than the total {total_records}")
+    records = records[:args.n_records]
+
+    # the links are identified in the first record and looked up by the same relative path in every other record
+    group, link_datasets = wib_link_datasets(h5file, records[0])
+    links = range(len(link_datasets)) if args.all_links else args.link
+    for link in links:
+        if link >= len(link_datasets):
+            raise Exception(f"Link number {link} out of range.")
+
+    WIB2Frame_size = fddetdataformats.WIB2Frame.sizeof()
+    header_size = h5file.get_frag(group + link_datasets[links[0]]).get_header().sizeof()
+
+    start = time.perf_counter()
+    out_files = { link : open(f"{args.output_prefix}_{link}.bin", "wb", buffering = args.buffer_size) for link in links }
+    total_frames = { link : 0 for link in links }
+    try:
+        with h5py.File(args.file_name, "r") as f:
+            # loop over all triggers
+            for r in records:
+                group = h5file.get_record_header_dataset_path(r).rsplit("/", 1)[0]
+                Debug(group)
+                for link in links:
+                    path = group + link_datasets[link]
+                    if path not in f:
+                        print(f"record {r[0]} has no dataset {link_datasets[link]}, skipping it")
+                        continue
+                    Debug(f"loading fragment: {path}")
+                    ds = f[path]
+                    n_frames = (ds.shape[0] - header_size) // WIB2Frame_size # calculate the number of wib frames per fragment
+                    # the payload of the fragment is the WIB2 frames back to back, written as a single slice
+                    out_files[link].write(memoryview(ds[header_size:header_size + n_frames * WIB2Frame_size]))
+                    total_frames[link] += n_frames
+                print(f"writing {sum(total_frames.values())} WIB2 frames to binary files.", end = "\r")
+    finally:
+        for bf in out_files.values():
+            bf.close()
+
+    elapsed = time.perf_counter() - start
+    print()
+    for link in links:
+        print(f"wrote {total_frames[link]} frames from {args.n_records} fragments of wib link {link} to file {out_files[link].name}.")
+    print(f"took {elapsed:.2f} s ({sum(total_frames.values())*WIB2Frame_size/max(elapsed, 1e-9)/1e6:.1f} MB/s)")
     return
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description = 'Python script to write WIB2 frames from DUNE-DAQ HDF5 files to binary files.')
     parser.add_argument(dest = "file_name", help = 'path to HDF5 file')
-    parser.add_argument("-l", "--link", dest = "link", type = int, help = "link number to conver to binary", required = True)
+    link_group = parser.add_mutually_exclusive_group(required = True)
+    link_group.add_argument("-l", "--link", dest = "link", type = int, nargs = "+", help = "link number(s) to convert to binary, one output file per link")
+    link_group.add_argument("--all-links", dest = "all_links", action = "store_true", help = "convert all WIB links")
     parser.add_argument('-n', '--num-of-records', dest = "n_records", type = int, help = 'specify number of records to be parsed, -1 will parse all records', default = 0, required = True)
+    parser.add_argument("-o", "--output-prefix", dest = "output_prefix", type = str, help = "output files are named <prefix>_<link>.bin", default = "wib_link")
+    parser.add_argument("--buffer-size", dest = "buffer_size", type = int, help = "write buffer size in bytes per output file", default = 16 << 20)
     parser.add_argument("--debug", dest = "debug", action = "store_true", help = "Debugging information")
     args = parser.parse_args()
     debug = args.debug
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+from hdf5libs import HDF5RawDataFile
+
+import daqdataformats
+import detdataformats
+from rawdatautils.unpack.scan import RecordScanner
+
+import click
+
+@click.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.option('--nrecords', '-n', default=-1, help='How many Trigger Records to process (default: all)')
+@click.option('--nskip', default=0, help='How many Trigger Records to skip (default: 0)')
+@click.option('--det', multiple=True, help='Only scan this subdetector, e.g. HD_TPC (repeatable, default: all)')
+@click.option('--fragment-type', multiple=True, help='Only scan this fragment type, e.g. kWIBEth (repeatable, default: all)')
+@click.option('--print-every', default=0, help='Print the summaries every N records (default: only at the end)')
+def main(filename, nrecords, nskip, det, fragment_type, print_every):
+    """
+Walks the records of FILENAME once and prints a summary per subdetector and fragment type:
+fragment counts, sizes and error bits, plus the checks of each detector format (frame counts,
+timestamp continuity, ADC pedestal/RMS, channels, TP rates).
+    """
+
+    h5_file = HDF5RawDataFile(filename)
+    records = h5_file.get_all_record_ids()
+
+    if nskip > len(records):
+        print(f'Requested records to skip {nskip} is greater than number of records {len(records)}. Exiting...')
+        return
+
+    records_to_process = records[nskip:] if nrecords<0 else records[nskip:nskip+nrecords]
+    print(f'Will process {len(records_to_process)} of {len(records)} records.')
+
+    subdetectors = [ detdataformats.DetID.string_to_subdetector(d) for d in det ] if len(det)>0 else None
+    fragment_types = [ getattr(daqdataformats.FragmentType,t) for t in fragment_type ] if len(fragment_type)>0 else None
+    scanner = RecordScanner(subdetectors=subdetectors,fragment_types=fragment_types)
+
+    for i_record, r in enumerate(records_to_process):
+        scanner.add_record(h5_file,r)
+        if print_every>0 and (i_record+1)%print_every==0 and (i_record+1)<len(records_to_process):
+            print(f'After record {r}:')
+            print("\n".join(scanner.summary_lines()))
+
+    print("\n".join(scanner.summary_lines()))
+
+if __name__ == '__main__':
+    main()
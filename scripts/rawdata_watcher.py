@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+from rawdatautils.unpack.file_watcher import FileWatcher, FileQCTask
+
+import asyncio
+import json
+import os
+import signal
+
+import click
+
+@click.command()
+@click.argument('directories', nargs=-1, required=True)
+@click.option('--pattern', default='*.hdf5', help='Glob pattern of the raw data files (default: *.hdf5)')
+@click.option('--workers', default=2, help='Number of worker processes (default: 2)')
+@click.option('--max-queue', default=16, help='Maximum number of closed files waiting for a worker (default: 16)')
+@click.option('--poll-interval', default=1., help='Seconds between directory polls (default: 1)')
+@click.option('--skip-existing', is_flag=True, help='Ignore the files already in the directories at startup')
+@click.option('--once', is_flag=True, help='Process the files already closed and exit')
+@click.option('--unpack', is_flag=True, help='Also run the Unpacker pipeline over every fragment')
+@click.option('--channel-map', default=None, help='Channel map for the TPC unpackers (default: None)')
+@click.option('--output-dir', default=None, help='Write a <file>.qc.json result per file there (default: print only)')
+@click.option('--stats-file', default=None, help='JSON file with queue depth and latencies, rewritten every poll')
+def main(directories, pattern, workers, max_queue, poll_interval, skip_existing, once, unpack, channel_map, output_dir, stats_file):
+    """
+Watches DIRECTORIES for raw data files and runs the one-pass scan (and optionally the Unpacker pipeline)
+on each file as soon as the writer has closed it, i.e. once its closing_timestamp attribute is set.
+    """
+
+    def on_result(filename, result, error):
+        if error is not None:
+            print(f'{filename}: processing failed: {error!r}')
+            return
+        print(f'{filename}: {result["n_records"]} records in {result["processing_time"]:.1f} s')
+        print("\n".join(result["summary"]))
+        if output_dir is not None:
+            out_name = os.path.join(output_dir, os.path.basename(filename) + ".qc.json")
+            try:
+                with open(out_name + ".tmp", "w") as f:
+                    json.dump(result, f, indent=1)
+                os.replace(out_name + ".tmp", out_name)
+            except OSError as e:
+                print(f'{filename}: writing {out_name} failed: {e!r}')
+                raise
+
+    watcher = FileWatcher(directories,
+                          task=FileQCTask(unpack=unpack, channel_map=channel_map),
+                          on_result=on_result,
+                          pattern=pattern,
+                          n_workers=workers,
+                          max_queue=max_queue,
+                          poll_interval=poll_interval,
+                          process_existing=not skip_existing)
+
+    async def report_stats():
+        while True:
+            await asyncio.sleep(poll_interval)
+            watcher.write_stats(stats_file)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, watcher.stop)
+        reporter = asyncio.create_task(report_stats()) if stats_file is not None else None
+        await watcher.run(stop_when_idle=once)
+        if reporter is not None:
+            reporter.cancel()
+            watcher.write_stats(stats_file)
+        print(f'Stopped: {watcher.get_stats()}')
+
+    asyncio.run(run())
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,9 @@ import detdataformats
 import fddetdataformats
 from rawdatautils.unpack.wib2 import *
 from rawdatautils.utilities.wib2 import *
+import rawdatautils.analysis.wib2
 import detchannelmaps
+from rawdatautils.analysis.timestamp_alignment import RecordAlignmentChecker
 
 import click
 import time
@@ -23,8 +25,9 @@ import numpy as np
 @click.option('--print-adc-stats', is_flag=True, help="Print ADC Pedestals/RMS")
 @click.option('--check-timestamps', is_flag=True, help="Check WIB2 Frame Timestamps")
 @click.option('--det', default='HD_TPC', help='Subdetector string (default: HD_TPC)')
+@click.option('--quiet', is_flag=True, help="Don't print the link being processed")
 
-def main(filename, nrecords, nskip, channel_map, print_headers, print_adc_stats, check_timestamps, det):
+def main(filename, nrecords, nskip, channel_map, print_headers, print_adc_stats, check_timestamps, det, quiet):
 
     h5_file = HDF5RawDataFile(filename)
 
@@ -53,10 +56,13 @@ def main(filename, nrecords, nskip, channel_map, print_headers, print_adc_stats,
     offline_ch_num_dict = {}
     offline_ch_plane_dict = {}
 
+    alignment = RecordAlignmentChecker(sample_period=32)
+
     for r in records_to_process:
 
         print(f'Processing (Record Number,Sequence Number)=({r[0],r[1]})')
         wib_geo_ids = h5_file.get_geo_ids_for_subdetector(r,detdataformats.DetID.string_to_subdetector(det))
+        alignment.begin_record(wib_geo_ids)
 
         for gid in wib_geo_ids:
             #geo_info = detchannelmaps.HardwareMapService.parse_geo_id(gid)
@@ -114,27 +120,30 @@ def main(filename, nrecords, nskip, channel_map, print_headers, print_adc_stats,
                     print(f'\t\tTimestamp diff counts: {timestamps_diff_counts}')
                     print(f'\t\tAverage diff: {np.mean(timestamps_diff)}')
 
+                alignment.add_timestamps(gid,timestamps,n_frames,frag_hdr)
+
             if print_adc_stats:
 
-                #unpack adcs into a n_frames x 256 numpy array of uint16
-                adcs = np_array_adc(frag)
-                adcs_rms = np.std(adcs,axis=0)
-                adcs_ped = np.mean(adcs,axis=0)
+                #per-channel statistics computed on the packed frames, without unpacking the adcs
+                stats = rawdatautils.analysis.wib2.adc_stats(frag)
                 
                 print('\n\t====WIB DATA====')
 
-                for ch,rms in enumerate(adcs_rms):
-                    print(f'\t\tch {offline_ch_num_dict[gid][ch]} (plane {offline_ch_plane_dict[gid][ch]}): ped = {adcs_ped[ch]:.2f}, rms = {adcs_rms[ch]:.4f}')
+                for ch,rms in enumerate(stats["rms"]):
+                    print(f'\t\tch {offline_ch_num_dict[gid][ch]} (plane {offline_ch_plane_dict[gid][ch]}): ped = {stats["mean"][ch]:.2f}, rms = {rms:.4f}, stuck codes = {stats["n_stuck"][ch]}/{stats["n_samples"]}')
 
             print("\n")
         #end gid loop
 
         if check_timestamps:
-            timestamps_frame0 = np.array([ fddetdataformats.WIB2Frame(h5_file.get_frag(r,gid).get_data()).get_timestamp() for gid in wib_geo_ids ])
-            timestamps_frame0_diff = timestamps_frame0 - timestamps_frame0[0]
-            
+            report = alignment.check()
+
             print('\n\t==== TIMESTAMP ACROSS WIBS CHECK ====')
-            print(f'\t\tTimestamp diff relative to first WIB',timestamps_frame0_diff)
+            print(f'\t\tTimestamp diff relative to first WIB',report.first_offsets)
+            print(f'\t\tLast timestamp diff relative to first WIB',report.last_offsets)
+            print(f'\t\tReadout window coverage',np.round(report.window_coverage,4))
+            if len(report.missing_links)>0:
+                print(f'\t\tMissing links (geo ids)',report.missing_links)
         
     #end record loop
 
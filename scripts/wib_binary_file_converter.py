@@ -7,9 +7,17 @@ import click
 @click.option('--fromf', type=click.Path(exists=True), help="Full path to file you want to convert from")
 @click.option('--tof', type=click.STRING, help="Full path to file you want to convert to")
 @click.option('--ftype', type=click.Choice(['wib2','wibeth','tde'], case_sensitive=True), default='wibeth', help="Format to convert to")
+@click.option('--link', type=int, multiple=True, help="HDF5 input only: link to convert, can be given several times (default: all links)")
+@click.option('--first-record', type=int, default=0, help="HDF5 input only: index of the first record to convert")
+@click.option('--n-records', type=int, default=0, help="HDF5 input only: number of records to convert, 0 for all")
 
-def main(fromf, tof, ftype):
-    """This script converts ProtoWIB binary files into either WIB2, WIBETH, or TDE format"""
+def main(fromf, tof, ftype, link, first_record, n_records):
+    """This script converts ProtoWIB binary or HDF5 files into either WIB2, WIBETH, or TDE format"""
+
+    if fromf.endswith(('.hdf5','.h5')):
+        converter = getattr(file_conversion, f'wib_hdf5_to_{ftype}_binary')
+        converter(fromf, tof, list(link), first_record, n_records)
+        return
 
     if ftype == 'wib2':
         file_conversion.wib_binary_to_wib2_binary(fromf, tof)
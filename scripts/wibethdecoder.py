@@ -8,6 +8,7 @@ import fddetdataformats
 from rawdatautils.unpack.wibeth import *
 from rawdatautils.utilities.wibeth import *
 import detchannelmaps
+from rawdatautils.analysis.timestamp_alignment import RecordAlignmentChecker
 
 import click
 import time
@@ -56,12 +57,15 @@ def main(filenames, nrecords, nskip, channel_map, print_headers, print_adc_stats
         offline_ch_num_dict = {}
         offline_ch_plane_dict = {}
 
+        alignment = RecordAlignmentChecker(sample_period=32)
+
         for r in records_to_process:
 
             if not quiet:
                 print(f'Processing (Record Number,Sequence Number)=({r[0],r[1]})')
 
             wib_geo_ids = h5_file.get_geo_ids_for_subdetector(r,detdataformats.DetID.string_to_subdetector(det))
+            alignment.begin_record(wib_geo_ids)
 
             for gid in wib_geo_ids:
                 #geo_info = detchannelmaps.HardwareMapService.parse_geo_id(gid)
@@ -122,8 +126,8 @@ def main(filenames, nrecords, nskip, channel_map, print_headers, print_adc_stats
                             print(f'\t\tTimestamp diffs: {timestamps_diff_vals}')
                             print(f'\t\tTimestamp diff counts: {timestamps_diff_counts}')
                             print(f'\t\tAverage diff: {np.mean(timestamps_diff)}')
-                            
-                            
+
+                    alignment.add_timestamps(gid,timestamps,n_frames,frag_hdr)
                             
                 if print_adc_stats:
 
@@ -141,12 +145,15 @@ def main(filenames, nrecords, nskip, channel_map, print_headers, print_adc_stats
             #end gid loop
 
             if check_timestamps:
-                timestamps_frame0 = np.array([ fddetdataformats.WIBEthFrame(h5_file.get_frag(r,gid).get_data()).get_timestamp() for gid in wib_geo_ids ])
-                timestamps_frame0_diff = timestamps_frame0 - timestamps_frame0[0]
+                report = alignment.check()
 
-                if not quiet or np.any(timestamps_frame0_diff):
+                if not quiet or not report.is_aligned():
                     print('\n\t==== TIMESTAMP ACROSS WIBS CHECK ====')
-                    print(f'\t\tTimestamp diff relative to first WIB',timestamps_frame0_diff)
+                    print(f'\t\tTimestamp diff relative to first WIB',report.first_offsets)
+                    print(f'\t\tLast timestamp diff relative to first WIB',report.last_offsets)
+                    print(f'\t\tReadout window coverage',np.round(report.window_coverage,4))
+                    if len(report.missing_links)>0:
+                        print(f'\t\tMissing links (geo ids)',report.missing_links)
         
         #end record loop
 
@@ -0,0 +1,116 @@
+/**
+ * @file FrameAnalysis_test.cxx Unit Tests for the analysis kernels on packed frames
+ *
+ * This is part of the DUNE DAQ Application Framework, copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+/**
+ * @brief Name of this test module
+ */
+#define BOOST_TEST_MODULE FrameAnalysis_test // NOLINT
+
+#include "boost/test/unit_test.hpp"
+
+#include "rawdatautils/FrameAnalysis.hpp"
+
+#include <cmath>
+#include <complex>
+#include <random>
+#include <vector>
+
+namespace dunedaq{
+namespace rawdatautils{
+
+BOOST_AUTO_TEST_SUITE(FrameAnalysis_test)
+
+std::mt19937 mt(1000007);
+
+BOOST_AUTO_TEST_CASE(FrameAnalysis_channel_stats)
+{
+  std::uniform_int_distribution<int> dist(0, 16383);
+
+  std::vector<fddetdataformats::WIBEthFrame> frames(3);
+  for (auto& fr : frames)
+    for (int s = 0; s < 64; s++)
+      for (int ch = 0; ch < 64; ch++)
+        fr.set_adc(ch, s, dist(mt));
+  // channel 5: constant stuck code, channel 6: two values
+  for (auto& fr : frames)
+    for (int s = 0; s < 64; s++) {
+      fr.set_adc(5, s, 0x40);
+      fr.set_adc(6, s, s % 2 ? 1000 : 1002);
+    }
+
+  auto stats = compute_channel_stats(frames.data(), frames.size());
+  BOOST_REQUIRE_EQUAL(stats.n_samples, 3U * 64);
+  BOOST_REQUIRE_CLOSE(stats.mean(5), 64., 1e-9);
+  BOOST_REQUIRE_SMALL(stats.rms(5), 1e-9);
+  BOOST_REQUIRE_EQUAL(stats.n_stuck[5], 3U * 64);
+  BOOST_REQUIRE_CLOSE(stats.mean(6), 1001., 1e-9);
+  BOOST_REQUIRE_CLOSE(stats.rms(6), 1., 1e-9);
+  BOOST_REQUIRE_EQUAL(stats.min[6], 1000);
+  BOOST_REQUIRE_EQUAL(stats.max[6], 1002);
+
+  for (int ch = 0; ch < 64; ch++) {
+    uint64_t sum = 0, n_stuck = 0;
+    for (auto& fr : frames)
+      for (int s = 0; s < 64; s++) {
+        sum += fr.get_adc(ch, s);
+        n_stuck += is_stuck_code(fr.get_adc(ch, s));
+      }
+    BOOST_REQUIRE_EQUAL(stats.sum[ch], sum);
+    BOOST_REQUIRE_EQUAL(stats.n_stuck[ch], n_stuck);
+  }
+  BOOST_REQUIRE(count_stuck_codes(frames.data(), frames.size()) == stats.n_stuck);
+}
+
+BOOST_AUTO_TEST_CASE(FrameAnalysis_fft_power)
+{
+  const size_t n_fft = 256;
+  const size_t bin = 10;
+
+  // a sine on channel 3 at an exact bin frequency, constant elsewhere; 2 segments plus leftovers
+  std::vector<fddetdataformats::WIB2Frame> frames(2 * n_fft + 17);
+  for (size_t i = 0; i < frames.size(); i++) {
+    for (int ch = 0; ch < 256; ch++)
+      frames[i].set_adc(ch, 900);
+    frames[i].set_adc(3, 900 + std::lround(100 * std::sin(2 * M_PI * bin * i / n_fft)));
+  }
+
+  FFTPowerAccumulator<fddetdataformats::WIB2Frame> acc(n_fft);
+  acc.add_frames(frames.data(), frames.size());
+  BOOST_REQUIRE_EQUAL(acc.get_n_segments(), 2U);
+
+  auto& power = acc.get_power_sum();
+  const double* ch3 = power.data() + 3 * acc.get_n_bins();
+  size_t peak = std::max_element(ch3, ch3 + acc.get_n_bins()) - ch3;
+  BOOST_REQUIRE_EQUAL(peak, bin);
+  // |X_k| = A*N/2 for each segment
+  BOOST_REQUIRE_CLOSE(ch3[bin], 2 * std::pow(100. * n_fft / 2, 2), 1.);
+  BOOST_REQUIRE_SMALL(power[0 * acc.get_n_bins() + bin], 1e-9);
+
+  // compare with a direct DFT
+  std::vector<std::complex<double>> x(n_fft);
+  for (size_t j = 0; j < n_fft; j++)
+    x[j] = frames[j].get_adc(3);
+  double mean = 0;
+  for (auto& v : x)
+    mean += v.real() / n_fft;
+  acc.reset();
+  acc.add_frames(frames.data(), n_fft);
+  for (size_t k = 0; k < acc.get_n_bins(); k++) {
+    std::complex<double> dft = 0;
+    for (size_t j = 0; j < n_fft; j++)
+      dft += (x[j] - mean) * std::polar(1., -2 * M_PI * double(k * j) / n_fft);
+    BOOST_REQUIRE_SMALL(acc.get_power_sum()[3 * acc.get_n_bins() + k] - std::norm(dft), 1e-6 * std::max(1., std::norm(dft)));
+  }
+
+  BOOST_REQUIRE_THROW(FFTPowerAccumulator<fddetdataformats::WIB2Frame>(100), std::invalid_argument);
+}
+
+} // namespace dunedaq
+} // namespace rawdatautils
+
+BOOST_AUTO_TEST_SUITE_END()
@@ -0,0 +1,74 @@
+/**
+ * @file WIBtoWIBEth_test.cxx Unit Tests for the WIB -> WIBEth file converter
+ *
+ * This is part of the DUNE DAQ Application Framework, copyright 2020.
+ * Licensing/copyright details are in the COPYING file that you should have
+ * received with this code.
+ */
+
+/**
+ * @brief Name of this test module
+ */
+#define BOOST_TEST_MODULE WIBtoWIBEth_test // NOLINT
+
+#include "boost/test/unit_test.hpp"
+
+#include "rawdatautils/WIBtoWIBEth.hpp"
+#include "fddetdataformats/WIBFrame.hpp"
+
+#include <filesystem>
+#include <random>
+
+namespace dunedaq{
+namespace rawdatautils{
+
+BOOST_AUTO_TEST_SUITE(WIBtoWIBEth_test)
+
+std::mt19937 mt(1000007);
+
+BOOST_AUTO_TEST_CASE(WIBtoWIBEth_streaming)
+{
+  std::uniform_int_distribution<int> dist(0, 4095);
+
+  // 5 full WIBEthFrames plus a partial one, converted in chunks smaller than the file
+  std::vector<fddetdataformats::WIBFrame> frames(64 * 5 + 10);
+  for (auto& fr : frames) {
+    for (int i = 0; i < 256; i++) {
+      fr.set_channel(i, dist(mt));
+    }
+  }
+  frames[0].set_timestamp(1000);
+
+  auto dir = std::filesystem::temp_directory_path();
+  std::string input = (dir / "WIBtoWIBEth_test_input.bin").string();
+  std::string output = (dir / "WIBtoWIBEth_test_output.bin").string();
+  {
+    std::ofstream out(input.c_str(), std::ios::binary);
+    write_frames(out, frames.data(), frames.size());
+  }
+
+  wib_binary_to_wibeth_binary(input, output, 128);
+
+  for (int g = 0; g < 4; g++) {
+    auto name = indexed_output_name(output, g);
+    BOOST_REQUIRE_EQUAL(std::filesystem::file_size(name), 5 * sizeof(fddetdataformats::WIBEthFrame));
+    std::vector<fddetdataformats::WIBEthFrame> res(5);
+    std::ifstream in(name.c_str(), std::ios::binary);
+    in.read(reinterpret_cast<char*>(res.data()), 5 * sizeof(fddetdataformats::WIBEthFrame));
+    for (int k = 0; k < 5; k++) {
+      BOOST_REQUIRE_EQUAL(res[k].get_timestamp(), 1000U + k * 32 * 64);
+      for (int j = 0; j < 64; j++) {
+        for (int i = 0; i < 64; i++) {
+          BOOST_REQUIRE_EQUAL(res[k].get_adc(i, j), frames[k * 64 + j].get_channel(g * 64 + i));
+        }
+      }
+    }
+    std::filesystem::remove(name);
+  }
+  std::filesystem::remove(input);
+}
+
+} // namespace dunedaq
+} // namespace rawdatautils
+
+BOOST_AUTO_TEST_SUITE_END()